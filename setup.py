@@ -21,6 +21,12 @@ setup(
     # include data files
     data_files=data_files,
 
+    entry_points={
+        'console_scripts': [
+            'replay-rip-changes = regions_recon_lambda.rip_ingestor.replay:main',
+        ],
+    },
+
     # set up the shebang
     options={
         # make sure the right shebang is set for the scripts - use the
@@ -1,10 +1,14 @@
 import datetime
 import os
 import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import boto3
 from boto3.dynamodb.conditions import Key
+from dateutil import parser
 from regions_recon_python_common.buildable_item import BuildableItem, BuildableService, BuildableRegion
 from regions_recon_python_common.buildables_dao_models.region_metadata import RegionMetadata
 from regions_recon_python_common.buildables_dao_models.service_metadata import ServiceMetadata
@@ -17,9 +21,17 @@ from regions_recon_python_common.utils.misc import execute_retryable_call
 
 from regions_recon_lambda.rip_ingestor.attributes_to_buildables_map import get_region_attributes_to_buildables_map, \
     get_service_attributes_to_buildables_map
+from regions_recon_lambda.rip_ingestor.idempotency_ledger import IdempotencyLedger, DEFAULT_LEDGER_TABLE_NAME
+from regions_recon_lambda.rip_ingestor.parent_dimension_cache import ParentDimensionCache
+from regions_recon_lambda.rip_ingestor.prefetched_table import PrefetchedTable
 from regions_recon_lambda.rip_ingestor.model_converters import convert_buildable_region_to_model, is_service_metadata, \
-    convert_buildable_service_metadata_to_model, is_service_plan, convert_buildable_service_plan_to_model
+    convert_buildable_service_metadata_to_model, is_service_plan, convert_buildable_service_plan_to_model, \
+    UPDATING_ATTRIBUTES
+from regions_recon_lambda.utils.aws_call_counter import AwsCallCounter
 from regions_recon_lambda.utils.dynamo_query import DynamoQuery
+from regions_recon_lambda.utils.notification_transition import NEXT_TRANSITION, get_plan_transition, get_transition_today
+from regions_recon_lambda.utils.relevant_change import RELEVANT_CHANGE_AT, RELEVANT_CHANGE_CHECKED_AT, is_relevant_change
+from regions_recon_lambda.utils.stage_timings import StageTimings
 from .rip_message_record import RipMessageRecord
 
 logger = get_logger()
@@ -40,6 +52,26 @@ PROCESS_CHANGE_TYPES = (
 # This is hardcoded for now to fix sev2 - lets go back and replace this with some calls to rip
 IGNORED_REGIONS = frozenset(("LUX", "SEA", "PEK", "KAT", "TST"))
 
+# See get_record_tier
+PARENT_TIER = 0
+COMPONENT_SERVICE_TIER = 1
+CHILD_TIER = 2
+
+# When "true", the whole SQS batch is written in one pass and failures are reported back to SQS
+# via batchItemFailures instead of deleting each message.  Requires ReportBatchItemFailures on the
+# event source mapping.
+BATCH_MODE_ENV_KEY = "RIP_INGESTOR_BATCH_MODE"
+# In batch mode, how many threads records are spread over.  Records for the same dimension share a thread.
+MAX_WORKERS_ENV_KEY = "RIP_INGESTOR_MAX_WORKERS"
+# In batch mode, when "true", changes which were already applied are acknowledged without processing them again
+IDEMPOTENCY_LEDGER_ENV_KEY = "RIP_INGESTOR_IDEMPOTENCY_LEDGER"
+LEDGER_TABLE_NAME_ENV_KEY = "RIP_INGESTOR_LEDGER_TABLE_NAME"
+
+# Module scope, so both of these are reused for as long as the Lambda container stays warm.
+# The query is per thread since boto3 resources can't be shared between threads.
+PARENT_DIMENSION_CACHE = ParentDimensionCache()
+_thread_local = threading.local()
+
 
 def ingest_rip_changes(event, context):
     try:
@@ -50,7 +82,7 @@ def ingest_rip_changes(event, context):
             event=event,
             metrics_service_name=context.function_name,
         )
-        ingestor.run_workflow()
+        return ingestor.run_workflow()
     except:
         logger.exception("Uncaught exception.  Lambda will fail.  If this message came from SQS, check the DLQ.")
         raise
@@ -64,13 +96,174 @@ def is_in_list_of_ignored_regions(region):
     return region in IGNORED_REGIONS
 
 
-def parent_object_exists(parent_dimension_type, parent_dimension_name):
-    db = DynamoQuery("buildables")
-    response = db.query(
-        key_condition=Key("artifact").eq(parent_dimension_type) & Key("instance").begins_with(parent_dimension_name + ":")
+def get_coalescing_key(message):
+    """Changes with the same key update the same buildables item.  None if the message can't be coalesced."""
+    try:
+        parent_dimension_key = message["newValue"].get("parentDimensionKey") or {}
+        return (
+            message["dimension"]["type"],
+            message["dimension"]["name"],
+            parent_dimension_key.get("type", "").upper(),
+            parent_dimension_key.get("name", "").upper(),
+        )
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
+def coalesce_records(records):
+    """
+    Keep only the newest approved change (by approvedDate) for each dimension in the batch.  It gets the
+    previousValue of the oldest change, so that transitions made along the way (e.g. going GA) still show.
+
+    Returns (records_to_process, superseded_records).  records_to_process is in its original batch order, and
+    superseded_records maps each superseded record, in batch order, to the record kept in its place.  Anything
+    which isn't an approved change we process is left alone.
+    """
+    keys = []
+    newest_index_by_key = {}
+    oldest_index_by_key = {}
+    for index, record in enumerate(records):
+        key = None
+        if record.change_type in PROCESS_CHANGE_TYPES and record.status == "APPROVED" \
+                and isinstance(record.message.get("approvedDate"), (int, float)):
+            key = get_coalescing_key(record.message)
+        keys.append(key)
+        if key is None:
+            continue
+
+        # on a tie, the later record in the batch wins
+        newest_index = newest_index_by_key.get(key)
+        if newest_index is None or record.message["approvedDate"] >= records[newest_index].message["approvedDate"]:
+            newest_index_by_key[key] = index
+        # on a tie, the earlier record in the batch is the oldest
+        oldest_index = oldest_index_by_key.get(key)
+        if oldest_index is None or record.message["approvedDate"] < records[oldest_index].message["approvedDate"]:
+            oldest_index_by_key[key] = index
+
+    records_to_process = []
+    superseded_records = {}
+    for index, record in enumerate(records):
+        if keys[index] is not None and newest_index_by_key[keys[index]] != index:
+            superseded_records[record] = records[newest_index_by_key[keys[index]]]
+        else:
+            records_to_process.append(record)
+
+    for key, newest_index in newest_index_by_key.items():
+        oldest_index = oldest_index_by_key[key]
+        if oldest_index != newest_index:
+            records[newest_index].replace_previous_value(records[oldest_index].message.get("previousValue"))
+    return records_to_process, superseded_records
+
+
+def get_record_tier(record) -> int:
+    """
+    Records are processed in tiers, so that a parent created earlier in the batch is there for the records
+    which need it: regions and services first, then component services, then services in regions.
+    """
+    key = get_coalescing_key(record.message) if record.change_type in PROCESS_CHANGE_TYPES else None
+    if key is None or not key[2]:
+        return PARENT_TIER
+    if key[2] == "SERVICE":
+        return COMPONENT_SERVICE_TIER
+    return CHILD_TIER
+
+
+def group_records_by_tier(records):
+    """Split records into their tiers, in tier order.  Within a tier, records keep their batch order."""
+    tiers = {}
+    for record in records:
+        tiers.setdefault(get_record_tier(record), []).append(record)
+    return [tiers[tier] for tier in sorted(tiers)]
+
+
+def get_batch_dimensions(records):
+    """The (type, name) of every REGION and SERVICE the batch has a change for, as parent checks look them up."""
+    dimensions = set()
+    for record in records:
+        key = get_coalescing_key(record.message) if record.change_type in PROCESS_CHANGE_TYPES else None
+        if key is None or key[0] not in ("REGION", "SERVICE"):
+            continue
+        dimensions.add((key[0], key[1].upper() if key[0] == "REGION" else key[1]))
+    return dimensions
+
+
+def get_parent_key(item):
+    """The (type, name) a parent check for this item's dimension looks for, e.g. ("REGION", "IAD") for IAD:v0."""
+    return item["artifact"], item["instance"].split(":", 1)[0]
+
+
+def partition_records(records, partition_count):
+    """
+    Split records into at most partition_count non-empty lists, by a stable hash of dimension name and parent.
+    Every record for the same dimension lands in the same list, in its original order.
+    """
+    partitions = [[] for _ in range(partition_count)]
+    for record in records:
+        # don't decode messages we're going to ignore anyway
+        key = get_coalescing_key(record.message) if record.change_type in PROCESS_CHANGE_TYPES else None
+        partition_key = "{}:{}:{}".format(key[1], key[2], key[3]) if key else str(record.message_id)
+        partitions[zlib.crc32(partition_key.encode("utf-8")) % partition_count].append(record)
+    return [partition for partition in partitions if partition]
+
+
+def get_buildables_query():
+    if getattr(_thread_local, "buildables_query", None) is None:
+        _thread_local.buildables_query = DynamoQuery("buildables")
+    return _thread_local.buildables_query
+
+
+def parent_object_exists(parent_dimension_type, parent_dimension_name, cache_miss=True):
+    """
+    Pass cache_miss=False when the parent might be created soon, e.g. it has a change in the batch being
+    processed, so that a miss isn't remembered past this check.
+    """
+    exists = PARENT_DIMENSION_CACHE.get(parent_dimension_type, parent_dimension_name)
+    if exists is None:
+        exists = lookup_parent_object(parent_dimension_type, parent_dimension_name)
+        if exists or cache_miss:
+            PARENT_DIMENSION_CACHE.put(parent_dimension_type, parent_dimension_name, exists)
+
+    return exists
+
+
+def lookup_parent_object(parent_dimension_type, parent_dimension_name):
+    """Check for any row of the parent, reading only the keys of a single item."""
+    item = get_buildables_query().query_first(
+        key_condition=Key("artifact").eq(parent_dimension_type) & Key("instance").begins_with(parent_dimension_name + ":"),
+        project_fields=["artifact", "instance"],
     )
 
-    return bool(response)
+    return item is not None
+
+
+def is_batch_mode_enabled() -> bool:
+    return os.environ.get(BATCH_MODE_ENV_KEY, "false").lower() == "true"
+
+
+def is_idempotency_ledger_enabled() -> bool:
+    return os.environ.get(IDEMPOTENCY_LEDGER_ENV_KEY, "false").lower() == "true"
+
+
+def get_ledger_table_name() -> str:
+    return os.environ.get(LEDGER_TABLE_NAME_ENV_KEY, DEFAULT_LEDGER_TABLE_NAME)
+
+
+def get_max_workers() -> int:
+    return max(1, int(os.environ.get(MAX_WORKERS_ENV_KEY, "1")))
+
+
+def is_noop_change(new_attributes, stored_item) -> bool:
+    """
+    True if writing new_attributes over stored_item wouldn't change anything but who/when it was updated.
+
+    Attributes the stored item doesn't have only count as unchanged when the new value is None.
+    """
+    for attribute, value in new_attributes.items():
+        if attribute in UPDATING_ATTRIBUTES:
+            continue
+        if stored_item.get(attribute) != value:
+            return False
+    return True
 
 
 def validate_region_item(buildable_item: BuildableItem) -> Optional[BuildableItem]:
@@ -93,8 +286,17 @@ def validate_region_item(buildable_item: BuildableItem) -> Optional[BuildableIte
 
 
 class RipChangesIngestor(BuildablesIngestor):
-    def __init__(self, metrics_service_name, event):
+    def __init__(self, metrics_service_name, event, batch_mode=None, max_workers=None):
+        self.batch_mode = is_batch_mode_enabled() if batch_mode is None else batch_mode
+        self.max_workers = get_max_workers() if max_workers is None else max_workers
+        self.ledger = IdempotencyLedger(DynamoQuery(get_ledger_table_name())) if self.batch_mode and is_idempotency_ledger_enabled() else None
         self.sqs_client = None
+        self.read_table = None
+        # dimensions with a change in this batch, and the ones with a write queued, see parent_exists
+        self.batch_dimensions = set()
+        self.pending_parents = set()
+        # the items queued for writing, as plain dicts, so later tiers of the batch can read them
+        self.pending_read_items = []
         self.sqs_queue_url = os.environ["RIP_CHANGES_QUEUE_URL"]
         self.ddb_items_to_write = []
         self.region_items_to_write = []
@@ -102,30 +304,502 @@ class RipChangesIngestor(BuildablesIngestor):
         self.service_plan_items_to_write = []
         self.metrics = {}
         self.metrics_service_name = metrics_service_name
+        self.stage_timings = StageTimings()
         if 'Records' in event:
-            self.records = [ RipMessageRecord(rec) for rec in event['Records'] ] # we're likely from SQS
+            self.records = [ self.parse_record(rec) for rec in event['Records'] ] # we're likely from SQS
         else:
-            self.records = [ RipMessageRecord(event) ] # normalize to what SQS sends if we're called directly from Lambda, for example
+            self.records = [ self.parse_record(event) ] # normalize to what SQS sends if we're called directly from Lambda, for example
+
+
+    def parse_record(self, raw_record):
+        with self.stage_timings.time("parse"):
+            return RipMessageRecord(raw_record)
+
+
+    def decode_messages(self, records):
+        """
+        Decode the RIP message of every record we'll process, so that its cost shows up as its own stage.
+
+        Returns the records whose message isn't a JSON object.  They are kept out of coalescing, tiering and
+        prefetching, which all read the message.
+        """
+        undecodable_records = []
+        for record in records:
+            if record.change_type in PROCESS_CHANGE_TYPES:
+                try:
+                    with self.stage_timings.time("decode"):
+                        message = record.message
+                except ValueError:
+                    message = None
+                if not isinstance(message, dict):
+                    logger.error(f"Unable to decode the RIP message of record {record.message_id}")
+                    self.metrics = increment_metric(self.metrics, "undecodable_record")
+                    undecodable_records.append(record)
+        return undecodable_records
 
 
     def run_workflow(self):
         logger.debug("Running workflow")
 
+        with AwsCallCounter() as aws_calls:
+            if self.batch_mode:
+                response = self.run_batch_workflow()
+            else:
+                response = self.run_record_workflow()
+
+        self.emit_stage_timings(aws_calls)
+        return response
+
+
+    def emit_stage_timings(self, aws_calls):
+        """One embedded metric format line per invocation, with the p50/p99 of every stage and the AWS calls made."""
+        for (service_name, operation_name), calls in aws_calls.calls.items():
+            self.stage_timings.count(f"{service_name}_{operation_name}_calls", calls)
+        self.stage_timings.count("dynamodb_calls", aws_calls.count("dynamodb"))
+        self.stage_timings.count("records", len(self.records))
+        self.stage_timings.emit(service_name=self.metrics_service_name)
+
+
+    def run_record_workflow(self):
+        """
+        Process and delete the records one at a time.  A superseded record is only deleted once the record kept
+        in its place has been written, as the kept record carries its previousValue; if that write raises, the
+        superseded record is redriven too.
+        """
         logger.debug("Processing {} records".format(len(self.records)))
+        undecodable_records = self.decode_messages(self.records)
+        _, superseded_records = coalesce_records([record for record in self.records if record not in undecodable_records])
         for record in self.records:
             self.metrics = {}
             self.metrics["records_processed"] = 1
 
-            if record.change_type in PROCESS_CHANGE_TYPES:
+            if record in superseded_records:
+                logger.debug(f"skipping change for {record.rip_name}, a newer one is in the same batch")
+                self.metrics = increment_metric(self.metrics, "superseded_change_skipped")
+            elif record.change_type in PROCESS_CHANGE_TYPES:
                 logger.debug("message is {}".format(record.message))
-                self.process_rip_message(message=record.message)
+                self.prefetch_record_reads(record)
+                with self.stage_timings.time("process_record"):
+                    self.process_rip_message(message=record.message)
                 self.write_to_dynamo()
             else:
                 logger.debug("ignoring change type {}".format(record.change_type))
                 self.metrics = increment_metric(self.metrics, "ignored_change_type")
 
-            self.cleanup_sqs(record)
-            submit_cloudwatch_metrics(metrics_dict=self.metrics, service_name=self.metrics_service_name)
+            if record not in superseded_records:
+                with self.stage_timings.time("sqs_cleanup"):
+                    self.cleanup_sqs(record)
+                    for superseded_record, kept_record in superseded_records.items():
+                        if kept_record is record:
+                            self.cleanup_sqs(superseded_record)
+            self.submit_metrics()
+
+
+    def run_batch_workflow(self):
+        """
+        Process every record in the batch, then flush all pending writes in one pass.
+
+        Messages are not deleted from SQS here.  Instead, the records which failed are returned in a
+        batchItemFailures response so that SQS only redrives those.
+        """
+        logger.debug("Processing {} records in batch mode".format(len(self.records)))
+        self.metrics = {"records_processed": len(self.records)}
+        # failed right away, SQS redrives them until they land in the DLQ
+        failed_records = self.decode_messages(self.records)
+        records = [record for record in self.records if record not in failed_records]
+        records_to_process = self.skip_applied_records(records)
+        records_to_process, superseded_records = coalesce_records(records_to_process)
+        if superseded_records:
+            # acknowledged with the record kept in their place, the newer change for the dimension is written instead
+            self.metrics["superseded_change_skipped"] = len(superseded_records)
+        self.prefetch_batch_reads(records_to_process)
+        self.batch_dimensions = get_batch_dimensions(records)
+
+        records_with_writes = []
+        for tier_records in group_records_by_tier(records_to_process):
+            if self.max_workers > 1:
+                tier_failed_records, tier_records_with_writes = self.process_batch_records_concurrently(tier_records)
+            else:
+                tier_failed_records, tier_records_with_writes = self.process_batch_records(tier_records)
+            failed_records += tier_failed_records
+            records_with_writes += tier_records_with_writes
+            self.read_pending_writes()
+
+        try:
+            self.write_to_dynamo()
+        except Exception:
+            logger.exception("Failed to write batch to dynamo, records with pending writes will be retried")
+            self.metrics = increment_metric(self.metrics, "batch_write_failed")
+            failed_records += records_with_writes
+
+        # the kept record carries the previousValue of the changes it superseded, so they are retried along with it
+        failed_records += [record for record, kept_record in superseded_records.items() if kept_record in failed_records]
+        self.record_applied_records(records_to_process + list(superseded_records), failed_records)
+        self.metrics["records_failed"] = len(failed_records)
+        if self.read_table is not None:
+            self.metrics["prefetch_hits"] = self.metrics.get("prefetch_hits", 0) + self.read_table.hits
+            self.read_table = None
+        self.submit_metrics()
+        return self.get_batch_item_failures_response(failed_records)
+
+
+    def submit_metrics(self):
+        submit_cloudwatch_metrics(metrics_dict=self.metrics, service_name=self.metrics_service_name)
+
+
+    def skip_applied_records(self, records):
+        """Drop records the idempotency ledger says were already applied.  They are acknowledged like any other."""
+        if self.ledger is None:
+            return records
+
+        ledger_records = [record for record in records if record.change_type in PROCESS_CHANGE_TYPES]
+        try:
+            with self.stage_timings.time("ledger"):
+                applied_keys = self.ledger.get_applied(record.idempotency_key for record in ledger_records)
+        except Exception:
+            # not fatal, we just process everything like we would without the ledger
+            logger.exception("Failed to check the idempotency ledger")
+            self.metrics = increment_metric(self.metrics, "ledger_read_failed")
+            return records
+
+        applied_records = [record for record in ledger_records if record.idempotency_key in applied_keys]
+        if applied_records:
+            logger.info(f"Skipping {len(applied_records)} redelivered RIP changes")
+            self.metrics["duplicate_delivery_skipped"] = len(applied_records)
+        return [record for record in records if record not in applied_records]
+
+
+    def record_applied_records(self, records, failed_records):
+        if self.ledger is None:
+            return
+
+        applied_keys = [record.idempotency_key for record in records
+                        if record.change_type in PROCESS_CHANGE_TYPES and record not in failed_records]
+        try:
+            with self.stage_timings.time("ledger"):
+                already_recorded = self.ledger.record_applied(applied_keys)
+        except Exception:
+            # the changes are applied either way, a redelivery would just be processed again
+            logger.exception("Failed to record applied changes in the idempotency ledger")
+            self.metrics = increment_metric(self.metrics, "ledger_write_failed")
+            return
+
+        if already_recorded:
+            self.metrics["concurrent_duplicate_applied"] = already_recorded
+
+
+    def process_batch_records(self, records):
+        """
+        Process records in order, queueing their writes on this ingestor.
+
+        Returns (failed_records, records_with_writes).
+        """
+        failed_records = []
+        records_with_writes = []
+
+        for record in records:
+            if record.change_type not in PROCESS_CHANGE_TYPES:
+                logger.debug("ignoring change type {}".format(record.change_type))
+                self.metrics = increment_metric(self.metrics, "ignored_change_type")
+                self.check_non_sqs_record(record)
+                continue
+
+            if self.is_stale_change(record.message):
+                logger.info(f"Skipping change for {record.rip_name}, it is older than what is already stored")
+                self.metrics = increment_metric(self.metrics, "stale_change_skipped")
+                self.check_non_sqs_record(record)
+                continue
+
+            pending_counts = self.get_pending_write_counts()
+            pending_read_item_count = len(self.pending_read_items)
+            try:
+                logger.debug("message is {}".format(record.message))
+                with self.stage_timings.time("process_record"):
+                    self.process_rip_message(message=record.message)
+            except Exception:
+                logger.exception(f"Failed to process record {record.message_id}, it will be retried")
+                self.metrics = increment_metric(self.metrics, "record_processing_failed")
+                self.discard_pending_writes(pending_counts)
+                del self.pending_read_items[pending_read_item_count:]
+                failed_records.append(record)
+                continue
+
+            if self.get_pending_write_counts() != pending_counts:
+                records_with_writes.append(record)
+            self.check_non_sqs_record(record)
+
+        return failed_records, records_with_writes
+
+
+    def process_batch_records_concurrently(self, records):
+        """
+        Spread records over a thread pool, keeping every record for the same dimension (and parent) on the
+        same worker so that they are still processed in order.  Each worker queues writes and counts metrics
+        on its own ingestor, which are merged back into this one for the single write at the end of the batch.
+        """
+        partitions = partition_records(records, self.max_workers)
+        workers = [self.create_worker() for _ in partitions]
+        with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+            results = list(executor.map(lambda worker, partition: worker.process_batch_records(partition), workers, partitions))
+
+        failed_records = []
+        records_with_writes = []
+        for worker, (worker_failed_records, worker_records_with_writes) in zip(workers, results):
+            self.merge_worker(worker)
+            failed_records += worker_failed_records
+            records_with_writes += worker_records_with_writes
+
+        self.metrics["batch_workers"] = len(workers)
+        return failed_records, records_with_writes
+
+
+    def create_worker(self):
+        worker = type(self)(
+            event={"Records": []},
+            metrics_service_name=self.metrics_service_name,
+            batch_mode=True,
+            max_workers=1,
+        )
+        if self.read_table is not None:
+            # share the prefetched items, but not the boto3 resource - those aren't thread safe
+            worker.read_table = PrefetchedTable(
+                table=worker.get_table(),
+                prefetched_keys=self.read_table.prefetched_keys,
+                items=self.read_table.items,
+            )
+        worker.batch_dimensions = self.batch_dimensions
+        worker.pending_parents = self.pending_parents
+        return worker
+
+
+    def merge_worker(self, worker):
+        self.ddb_items_to_write += worker.ddb_items_to_write
+        self.region_items_to_write += worker.region_items_to_write
+        self.service_metadata_items_to_write += worker.service_metadata_items_to_write
+        self.service_plan_items_to_write += worker.service_plan_items_to_write
+        self.pending_read_items += worker.pending_read_items
+        self.metrics = merge_metrics_dicts(merge_to=self.metrics, merge_from=worker.metrics)
+        self.stage_timings.merge(worker.stage_timings)
+        if worker.read_table is not None:
+            self.metrics["prefetch_hits"] = self.metrics.get("prefetch_hits", 0) + worker.read_table.hits
+
+
+    def prefetch_batch_reads(self, records):
+        """
+        Load every item the batch will backfill from, plus the service metadata used for parent plans, with
+        BatchGetItem.  Reads for those keys are then answered from memory by get_read_table().
+        """
+        keys = []
+        for record in records:
+            if record.change_type in PROCESS_CHANGE_TYPES:
+                try:
+                    keys += self.get_prefetch_keys(record.message)
+                except (KeyError, TypeError, AttributeError):
+                    logger.debug(f"Not prefetching for malformed record {record.message_id}")
+
+        if not keys:
+            return
+
+        try:
+            with self.stage_timings.time("prefetch"):
+                items = get_buildables_query().batch_get_items(keys, consistent_read=True)
+        except Exception:
+            # not fatal, every read just goes to the table on its own like it used to
+            logger.exception("Failed to prefetch items for batch")
+            self.metrics = increment_metric(self.metrics, "prefetch_failed")
+            return
+
+        self.metrics["prefetched_keys"] = len(set(keys))
+        self.read_table = PrefetchedTable(table=self.get_table(), prefetched_keys=keys, items=items)
+
+
+    def prefetch_record_reads(self, record):
+        """
+        Per-record mode prefetches just this record's reads, so that the no-op check and the backfill share a
+        single read of the stored item instead of the check costing one of its own.
+        """
+        self.read_table = None
+        self.prefetch_batch_reads([record])
+
+
+    def read_pending_writes(self):
+        """
+        Serve the writes queued so far from the read table, as if they had been written already, so that the
+        next tier of the batch backfills from them and finds the parents they create.
+        """
+        if not self.pending_read_items:
+            return
+
+        if self.read_table is None:
+            self.read_table = PrefetchedTable(table=self.get_table(), prefetched_keys=[], items={})
+        self.read_table.add_items(self.pending_read_items)
+        self.pending_parents.update(get_parent_key(item) for item in self.pending_read_items)
+        self.pending_read_items = []
+
+
+    def parent_exists(self, parent_dimension_type, parent_dimension_name):
+        """
+        Parents with a write queued earlier in the batch exist.  Misses for parents with a change in the batch
+        aren't cached, the change might be about to create them.
+        """
+        if (parent_dimension_type, parent_dimension_name) in self.pending_parents:
+            self.metrics = increment_metric(self.metrics, "pending_parent_found")
+            return True
+
+        cache_miss = (parent_dimension_type, parent_dimension_name) not in self.batch_dimensions
+        return parent_object_exists(parent_dimension_type, parent_dimension_name, cache_miss=cache_miss)
+
+
+    def get_prefetch_keys(self, message):
+        """Return the (artifact, instance) keys process_rip_message will read for this message."""
+        if message["status"] != "APPROVED":
+            return []
+
+        dimension_type = message["dimension"]["type"]
+        rip_name = message["dimension"]["name"]
+        if dimension_type == "REGION":
+            if is_in_list_of_ignored_regions(rip_name):
+                return []
+            return [("REGION", self.get_region_instance_value(region_ac=rip_name, version=0))]
+
+        if dimension_type != "SERVICE":
+            return []
+
+        parent_dimension_key = message["newValue"].get("parentDimensionKey")
+        if not parent_dimension_key:
+            return [("SERVICE", self.get_service_instance_value(rip_name=rip_name, version=0))]
+
+        parent_dimension_type = parent_dimension_key["type"].upper()
+        if parent_dimension_type == "REGION":
+            parent_dimension_name = parent_dimension_key["name"].upper()
+            return [
+                ("SERVICE", self.get_serviceinstance_instance_value(rip_name=rip_name, version=0, dimension_name=parent_dimension_name)),
+                ("SERVICE", rip_name + ":v0"),
+            ]
+        if parent_dimension_type == "SERVICE":
+            return [("SERVICE", self.get_service_instance_value(rip_name=rip_name, version=0))]
+        return []
+
+
+    def is_stale_change(self, message):
+        """
+        True if the item this message updates was last written by this ingestor from a newer RIP change.
+
+        Only prefetched items are checked, so this never costs an extra read.  Items last written by
+        anything else (RMS, blueprint...) are never considered newer than a RIP change.
+        """
+        if self.read_table is None:
+            return False
+
+        try:
+            keys = self.get_prefetch_keys(message)
+            approved_date = self.get_date_iso_string_from_epoch_milliseconds_timestamp(timestamp=message["approvedDate"])
+        except (KeyError, TypeError, AttributeError):
+            return False
+        if not keys:
+            return False
+
+        stored_item = self.read_table.get_prefetched_item(keys[0])
+        if not stored_item or stored_item.get("updating_agent") != self.get_updating_agent_value().get("updating_agent"):
+            return False
+
+        try:
+            return parser.isoparse(approved_date) < parser.isoparse(stored_item.get("updated"))
+        except (TypeError, ValueError, OverflowError):
+            return False
+
+
+    def is_noop_write(self, buildable_item):
+        """
+        Diff the attributes from the RIP change against the stored item.  Only prefetched items are checked,
+        so this never costs an extra read - the backfill reads the same prefetched item.
+        """
+        if self.read_table is None:
+            return False
+
+        key = (buildable_item.local_item.get("artifact"), buildable_item.local_item.get("instance"))
+        stored_item = self.read_table.get_prefetched_item(key)
+        if not stored_item:
+            return False
+        return is_noop_change(buildable_item.local_item, stored_item)
+
+
+    def get_stored_item(self, buildable_item):
+        """
+        The item as it is before this change, {} if there is none, or None if it can't be read.  Prefetched
+        items are served from memory, and the backfill right after reads the same key.
+        """
+        key = {"artifact": buildable_item.local_item.get("artifact"), "instance": buildable_item.local_item.get("instance")}
+        try:
+            return self.get_read_table().get_item(Key=key).get("Item", {})
+        except Exception:
+            logger.exception(f"Unable to read {key} to check for relevant changes")
+            return None
+
+
+    def stamp_relevant_change(self, buildable_item, stored_item):
+        """
+        Set relevant_change_at on a plan when this change is one the service update mailer sends mail about.
+        Otherwise the stamp backfilled from the stored item is kept.  If the stored item couldn't be read,
+        the change is stamped so that the mailer checks its history as it always has.
+
+        Either way relevant_change_checked_at records the updated the stamp was checked against, so the mailer
+        can tell when another writer has changed the plan since and the stamp no longer covers it.
+        """
+        updated = buildable_item.local_item.get("updated")
+        if stored_item is None or is_relevant_change(buildable_item.local_item, stored_item or None):
+            buildable_item.local_item[RELEVANT_CHANGE_AT] = updated
+            self.metrics = increment_metric(self.metrics, "relevant_change_stamped")
+        buildable_item.local_item[RELEVANT_CHANGE_CHECKED_AT] = updated
+
+
+    def set_next_notification_transition(self, buildable_item):
+        """
+        Keep next_notification_transition in step with the plan's date and status, so that the delivery date
+        mailer finds the plan through its sparse index.  Plans which won't need mail again lose it.
+        """
+        try:
+            transition = get_plan_transition(buildable_item.local_item, get_transition_today())
+        except ValueError:
+            logger.warning(f"Unable to work out the next notification transition for {buildable_item.local_item.get('instance')}")
+            transition = None
+        buildable_item.local_item[NEXT_TRANSITION] = transition
+
+
+    def get_read_table(self):
+        """The table buildable items backfill from - the prefetched batch if there is one."""
+        if self.read_table is not None:
+            return self.read_table
+        return self.get_table()
+
+
+    @staticmethod
+    def get_batch_item_failures_response(failed_records):
+        batch_item_failures = []
+        for record in failed_records:
+            if record.message_id is None:
+                # nothing for SQS to redrive, so fail the invocation like the non-batch workflow would
+                raise RuntimeError(f"Failed to process record for '{record.rip_name}' which was not sent by SQS")
+            batch_item_failures.append({"itemIdentifier": record.message_id})
+        return {"batchItemFailures": batch_item_failures}
+
+
+    def get_pending_write_counts(self):
+        return (
+            len(self.ddb_items_to_write),
+            len(self.region_items_to_write),
+            len(self.service_metadata_items_to_write),
+            len(self.service_plan_items_to_write),
+        )
+
+
+    def discard_pending_writes(self, pending_counts):
+        """Drop anything a failed record queued up, so that only successful records are flushed."""
+        ddb_count, region_count, service_metadata_count, service_plan_count = pending_counts
+        del self.ddb_items_to_write[ddb_count:]
+        del self.region_items_to_write[region_count:]
+        del self.service_metadata_items_to_write[service_metadata_count:]
+        del self.service_plan_items_to_write[service_plan_count:]
 
 
     def process_rip_message(self, message):
@@ -152,25 +826,40 @@ class RipChangesIngestor(BuildablesIngestor):
         if buildable_item is None:
             return
 
-        buildable_item.backfill_item_with_ddb_data()
+        if self.is_noop_write(buildable_item):
+            logger.info(f"Skipping write for {message['dimension']['name']}, no buildables attributes changed")
+            self.metrics = increment_metric(self.metrics, "noop_write_skipped")
+            return
+
+        with self.stage_timings.time("backfill"):
+            stored_item = self.get_stored_item(buildable_item) if is_service_plan(buildable_item) else None
+            buildable_item.backfill_item_with_ddb_data()
         buildable_item.local_item.update(self.get_updating_agent_value())
 
+        if is_service_plan(buildable_item):
+            self.stamp_relevant_change(buildable_item, stored_item)
+            self.set_next_notification_transition(buildable_item)
+
         if dimension_type == "REGION":
             buildable_item = validate_region_item(buildable_item)
 
         self.metrics = merge_metrics_dicts(merge_to=self.metrics, merge_from=buildable_item.metrics)
 
-        if dimension_type == "REGION":
-            self.region_items_to_write.append(convert_buildable_region_to_model(buildable_item))
+        if self.batch_mode and buildable_item.local_item.get("artifact") and buildable_item.local_item.get("instance"):
+            self.pending_read_items.append(dict(buildable_item.local_item))
 
-        elif is_service_metadata(buildable_item):
-            self.service_metadata_items_to_write.append(convert_buildable_service_metadata_to_model(buildable_item))
+        with self.stage_timings.time("convert"):
+            if dimension_type == "REGION":
+                self.region_items_to_write.append(convert_buildable_region_to_model(buildable_item))
 
-        elif is_service_plan(buildable_item):
-            self.service_plan_items_to_write.append(convert_buildable_service_plan_to_model(buildable_item))
+            elif is_service_metadata(buildable_item):
+                self.service_metadata_items_to_write.append(convert_buildable_service_metadata_to_model(buildable_item))
 
-        else:
-            self.ddb_items_to_write += buildable_item.items_pending_write
+            elif is_service_plan(buildable_item):
+                self.service_plan_items_to_write.append(convert_buildable_service_plan_to_model(buildable_item))
+
+            else:
+                self.ddb_items_to_write += buildable_item.items_pending_write
 
     def get_buildable_region(self, message):
         """
@@ -209,7 +898,7 @@ class RipChangesIngestor(BuildablesIngestor):
 
 
         instance = self.get_region_instance_value(region_ac=region_ac, version=0)
-        buildable_item = BuildableRegion(instance=instance, table=self.get_table(), **item_attrs)
+        buildable_item = BuildableRegion(instance=instance, table=self.get_read_table(), **item_attrs)
         self.metrics = increment_metric(self.metrics, "region_change")
         return buildable_item
 
@@ -238,7 +927,8 @@ class RipChangesIngestor(BuildablesIngestor):
                 item_attrs["belongs_to_instance"] = parent_dimension_name
                 logger.info(f"Ingesting new service in region combo -> '{rip_name}' in '{parent_dimension_name}'")
 
-                parent_exists = parent_object_exists(parent_dimension_type, parent_dimension_name)
+                with self.stage_timings.time("parent_check"):
+                    parent_exists = self.parent_exists(parent_dimension_type, parent_dimension_name)
 
                 if not parent_exists:
                     logger.warning(f"Service in region is in a test, retail, or closed region and is not tracked. Parent region '{parent_dimension_name}' does not exist in database.")
@@ -251,7 +941,8 @@ class RipChangesIngestor(BuildablesIngestor):
                 ))
 
                 # we must guarantee all new service_instance objects have the same "plan" aka category as their parent MD object
-                service_metadata_object = self.get_service_metadata(rip_name)
+                with self.stage_timings.time("backfill"):
+                    service_metadata_object = self.get_service_metadata(rip_name)
                 if service_metadata_object:
                     parent_plan = service_metadata_object.get("plan")
                     if parent_plan:
@@ -277,7 +968,8 @@ class RipChangesIngestor(BuildablesIngestor):
                 item_attrs["belongs_to_instance"] = parent_dimension_name
                 logger.info(f"Ingesting new component service '{rip_name}' for parent '{parent_dimension_name}'")
 
-                parent_exists = parent_object_exists(parent_dimension_type, parent_dimension_name)
+                with self.stage_timings.time("parent_check"):
+                    parent_exists = self.parent_exists(parent_dimension_type, parent_dimension_name)
                 if not parent_exists:
                     logger.error(f"Component Services parent was not found in ddb. Parent name '{parent_dimension_name}'.")
                     return None
@@ -299,7 +991,7 @@ class RipChangesIngestor(BuildablesIngestor):
 
         item_attrs["updated"] = self.get_date_iso_string_from_epoch_milliseconds_timestamp(timestamp=message["approvedDate"])
         item_attrs["updater"] = message["registrant"]
-        buildable_item = BuildableService(instance=instance, table=self.get_table(), **item_attrs)
+        buildable_item = BuildableService(instance=instance, table=self.get_read_table(), **item_attrs)
         self.metrics = increment_metric(self.metrics, "service_change")
         return buildable_item
 
@@ -315,7 +1007,7 @@ class RipChangesIngestor(BuildablesIngestor):
             }
         }
 
-        service_metadata_response = execute_retryable_call(client=self.get_table(), operation="get_item", **params)
+        service_metadata_response = execute_retryable_call(client=self.get_read_table(), operation="get_item", **params)
         logger.debug("service_metadata_response from ddb: {}".format(service_metadata_response))
         try:
             service_metadata = service_metadata_response["Item"]
@@ -339,7 +1031,13 @@ class RipChangesIngestor(BuildablesIngestor):
     def cleanup_sqs(self, record):
         if record.receipt_handle:
             self.delete_sqs_message(handle=record.receipt_handle)
-        elif not is_in_list_of_ignored_services(record.rip_name):
+        else:
+            self.check_non_sqs_record(record)
+
+    def check_non_sqs_record(self, record):
+        if record.receipt_handle:
+            return
+        if not is_in_list_of_ignored_services(record.rip_name):
             logger.error(f"lambda was not invoked by sqs and service/region {record.rip_name} not in ignored allowlist")
             self.metrics = increment_metric(self.metrics, "lambda_not_invoked_by_sqs_or_tests")
         else:
@@ -347,6 +1045,15 @@ class RipChangesIngestor(BuildablesIngestor):
 
 
     def write_to_dynamo(self):
+        with self.stage_timings.time("write"):
+            self.write_pending_items()
+
+        for parent_dimension_type, parent_dimension_name in self.pending_parents:
+            # written now, so a miss cached before the batch mustn't hide them
+            PARENT_DIMENSION_CACHE.put(parent_dimension_type, parent_dimension_name, True)
+        self.pending_parents = set()
+
+    def write_pending_items(self):
         with self.get_table().batch_writer() as batch:
             for ddb_item in self.ddb_items_to_write:
                 logger.debug("Writing item to dynamo: {}".format(ddb_item))
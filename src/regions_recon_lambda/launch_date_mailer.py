@@ -5,24 +5,39 @@ from regions_recon_python_common.buildables_dao_models.region_metadata import Re
 from regions_recon_python_common.query_utils.region_metadata_query_utils import get_region_metadata
 from regions_recon_python_common.utils.log import get_logger
 from regions_recon_python_common.utils.misc import execute_retryable_call
-from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, increment_metric
-from regions_recon_python_common.message_multiplexer_helper import MessageMultiplexerHelper, get_mm_endpoint
+from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, increment_metric, \
+    merge_metrics_dicts
 from regions_recon_python_common.utils.rms_managed_regions import get_regions_within_ninety_business_days_post_launch
 
+from regions_recon_lambda.utils.aws_call_counter import AwsCallCounter
+from regions_recon_lambda.utils.dry_run import DryRunTable, DryRunMessageMultiplexer
+from regions_recon_lambda.utils.dynamo_query import batch_get_table_items
+from regions_recon_lambda.utils.mm_dispatcher import MMDispatcher, as_mm_dispatcher, get_mm_dispatcher
+from regions_recon_lambda.utils.mm_target_cache import MMTargetCache, get_target_params_hash
+from regions_recon_lambda.utils.notification_transition import NEXT_TRANSITION, get_plan_transition, get_transition_today
+from regions_recon_lambda.utils.stage_timings import StageTimings
+from regions_recon_lambda.utils.update_buffer import UpdateBuffer
 from regions_recon_lambda.utils.launch_date_mailer_templates import (get_14_days_template, get_0_days_template,
                                                                      get_past_1_days_template, get_past_4_days_template,
-                                                                     get_fallback_header)
+                                                                     get_fallback_header, get_digest_template,
+                                                                     get_digest_instructions)
 from boto3.dynamodb.conditions import Key, Attr
 from datetime import datetime, timezone, timedelta, date
 from dateutil import parser
 from traceback import format_exc
 from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from functools import partial
 import pytz
 import boto3
+from botocore.config import Config
 import json
 import os
 import coral
 import copy
+import time
+import zlib
 
 logger = get_logger()
 
@@ -36,6 +51,34 @@ VP_ALIAS = "vp"
 GM_NAME = "gm_name"
 VP_NAME = "vp_name"
 MAX_MSG_GROUP_LENGTH = 511
+# BatchGetItem calls of 100 keys each made at once when looking up contacts
+CONTACT_FETCH_WORKERS = 4
+
+# Stop sending this long before the Lambda timeout, leaving time to hand the rest to a follow-up invocation
+DEADLINE_MARGIN_MILLIS = 60 * 1000
+# How many follow-up invocations a single run may chain, in case something keeps running out of time
+MAX_FOLLOW_UP_INVOCATIONS = 5
+FOLLOW_UP = "follow_up"
+# How many shards the services due mail are split into.  With more than one, the scheduled invocation only
+# coordinates: each shard is sent by its own worker invocation, and any of them may invoke a follow-up, so
+# they need reserved concurrency of at least (shards + 1) * 2.
+SHARD_COUNT_ENV_KEY = "DELIVERY_DATE_MAILER_SHARDS"
+SHARD = "shard"
+SHARD_READ_TIMEOUT_SECONDS = 900
+
+# When "true", only plans whose next_notification_transition is today or earlier (or which were updated
+# recently) are read, through a sparse GSI, instead of every plan in the SERVICE partition
+TRANSITION_INDEX_ENV_KEY = "DELIVERY_DATE_MAILER_TRANSITION_INDEX"
+NEXT_TRANSITION_INDEX = "artifact-next-notification-transition-index"
+# Runs are daily, this leaves room for one that failed
+RECENTLY_UPDATED_DAYS = 2
+
+# Pass {"dryrun": true} to only report what would be sent and written, see simulate_notification_mailer
+DRY_RUN = "dryrun"
+
+# When "true", everything due to the same contacts goes out as one digest mail instead of one per service and state
+DIGEST_MODE_ENV_KEY = "DELIVERY_DATE_MAILER_DIGEST"
+DIGEST_GROUP_PREFIX = "delivery-date-digest"
 
 # These are the same but not dependent on each other
 CC_TEAM_2 = "delivery-date-awareness"
@@ -51,6 +94,10 @@ class NotificationState(Enum):
     PAST_4x = 5
 
 
+# Module scope so that it's reused while the Lambda container stays warm; persisted once given the table
+MM_TARGET_CACHE = MMTargetCache()
+
+
 TO_FALLBACK_ORDER = {
     NotificationState.LEFT_14.value: [NOTIFS, GM_ALIAS, VP_ALIAS],
     NotificationState.LEFT_7.value: [NOTIFS, GM_ALIAS, VP_ALIAS],
@@ -72,9 +119,7 @@ TEMPLATE_MAP = {
 # Entry point
 def notification_mailer(event, context):
     ddb = boto3.resource("dynamodb", region_name='us-east-1').Table(os.environ["BUILDABLES_TABLE_NAME"])
-    mm_helper = MessageMultiplexerHelper(endpoint=get_mm_endpoint(os.environ["MM_STAGE"]),
-                                         own_account_number=os.environ["ACCOUNT_ID"])
-    notification_mailer_internal(event, context, ddb, mm_helper)
+    return notification_mailer_internal(event, context, ddb, get_mm_dispatcher())
 
 # The "true" portion of the script.  Took a page out of the backend's book for "request_handling"
 # Having an internal handler helps with not mucking up unit testing more
@@ -82,6 +127,64 @@ def notification_mailer_internal(event, context, ddb, mm_helper):
     logger.info("event: {}".format(event))
     logger.info("context: {}".format(context.__dict__))
 
+    if isinstance(event, dict) and bool(event.get(DRY_RUN)):
+        return simulate_notification_mailer(event, context, ddb, mm_helper)
+
+    MM_TARGET_CACHE.use_table(ddb)
+    mm_dispatcher = as_mm_dispatcher(mm_helper)
+    stage_timings = StageTimings()
+    try:
+        metrics = _notification_mailer(event, context, ddb, mm_dispatcher, stage_timings)
+    finally:
+        stage_timings.merge(mm_dispatcher.take_timings())
+    stage_timings.emit(context.function_name)
+    return metrics
+
+
+# Runs everything against the table and MM, but only records the writes, MM setup and mail a real run would make
+def simulate_notification_mailer(event, context, ddb, mm_helper):
+    global MM_TARGET_CACHE
+    dry_run_table = DryRunTable(ddb)
+    dry_run_mm_helper = DryRunMessageMultiplexer(mm_helper)
+    # a dispatcher of its own, so that the shared one's send timings stay the real runs'
+    dry_run_mm_dispatcher = MMDispatcher(dry_run_mm_helper)
+    stage_timings = StageTimings()
+
+    # targets the simulation "sets up" mustn't be remembered by real runs in this container
+    live_mm_target_cache = MM_TARGET_CACHE
+    MM_TARGET_CACHE = MMTargetCache(dry_run_table)
+    try:
+        with AwsCallCounter() as aws_calls:
+            metrics = _notification_mailer(event, context, dry_run_table, dry_run_mm_dispatcher, stage_timings, dry_run=True)
+    finally:
+        MM_TARGET_CACHE = live_mm_target_cache
+    stage_timings.merge(dry_run_mm_dispatcher.take_timings())
+
+    return {
+        "dryrun": True,
+        "metrics": metrics,
+        "messages": [operation for operation in dry_run_mm_helper.operations if operation["operation"] == "send_message"],
+        "mm_setup": [operation for operation in dry_run_mm_helper.operations if operation["operation"] != "send_message"],
+        "notification_updates": [write for write in dry_run_table.writes if write.get("Key", {}).get("artifact") == "NOTIFICATION"],
+        "other_writes": [write for write in dry_run_table.writes if write.get("Key", {}).get("artifact") != "NOTIFICATION"],
+        "dynamodb_calls": aws_calls.count("dynamodb"),
+        "dynamodb_calls_by_operation": {operation: calls for (service, operation), calls in aws_calls.calls.items()
+                                        if service == "dynamodb"},
+        "dynamodb_write_calls_skipped": dict(dry_run_table.write_calls),
+        "mm_calls": sum(dry_run_mm_helper.calls.values()),
+        "mm_calls_by_operation": dict(dry_run_mm_helper.calls),
+        "stage_timings_ms": stage_timings.summary(),
+    }
+
+
+def _submit_metrics(metrics, context, dry_run):
+    if dry_run:
+        logger.info("CloudWatch metrics (not sent because dryrun): {}".format(metrics))
+    else:
+        submit_cloudwatch_metrics(metrics_dict=metrics, service_name=context.function_name)
+
+
+def _notification_mailer(event, context, ddb, mm_dispatcher, stage_timings, dry_run=False):
     metrics = {
         "message_send_success": 0,
         "message_send_failure": 0
@@ -90,43 +193,318 @@ def notification_mailer_internal(event, context, ddb, mm_helper):
     notifications = {}
     services = {}
 
-    notifications = _get_notifications(ddb, notifications)
-
-    regions = get_recon_managed_regions()
-
-    services = _get_services(ddb, services, notifications, regions)
+    follow_up = event.get(FOLLOW_UP) if isinstance(event, dict) else None
+    shard = event.get(SHARD) if isinstance(event, dict) else None
+    assigned_work = follow_up or shard
+    transition_index_enabled = is_transition_index_enabled()
+    today = get_transition_today()
+
+    # Every plan is read once and shared, rather than querying for each notification's plan
+    history_instances = []
+    with stage_timings.time("read_plans"):
+        if assigned_work and "plan_instances" in assigned_work:
+            plans = _get_plans_by_instance(ddb, assigned_work["plan_instances"])
+        elif transition_index_enabled:
+            plans, history_instances = _get_due_plans(ddb, today)
+        else:
+            plans = _get_plans(ddb)
+
+    if history_instances:
+        with stage_timings.time("update_transitions"):
+            metrics = _remove_history_transitions(ddb, history_instances, metrics)
+
+    notification_writes = UpdateBuffer(ddb)
+    with stage_timings.time("read_notifications"):
+        if assigned_work and "plan_instances" in assigned_work:
+            notification_items = _get_notification_items_by_plan_instance(ddb, assigned_work["plan_instances"])
+        else:
+            notification_items = _query_notifications(ddb)
+        if transition_index_enabled and not assigned_work:
+            # a failed send is retried the next day, whatever the plan's transition date says
+            plans.update(_get_plans_by_instance(ddb, _get_retry_plan_instances(notification_items, plans)))
+
+        notifications = _get_notifications(ddb, notifications, plans, notification_items, notification_writes)
+        # written before anything else reads them: shards, follow-ups and the next run
+        metrics = _flush_notification_writes(notification_writes, metrics)
+
+    with stage_timings.time("read_regions"):
+        if assigned_work and "regions" in assigned_work:
+            regions = assigned_work["regions"]
+        else:
+            regions = get_recon_managed_regions()
+
+    with stage_timings.time("compute_services"):
+        services = _get_services(ddb, services, notifications, regions, plans)
+
+        if assigned_work and services:
+            services = _filter_services_to_work_items(services, assigned_work["work_items"])
 
     # No services need notifying so submit 0-0 metrics and end
     if not services:
-        submit_cloudwatch_metrics(metrics_dict=metrics, service_name=context.function_name)
+        if not assigned_work:
+            with stage_timings.time("update_transitions"):
+                metrics = _update_notification_transitions(ddb, plans, today, metrics)
+        _submit_metrics(metrics, context, dry_run)
+        return metrics
+
+    # a dry run sends everything itself, so that it can record everything
+    shard_count = get_shard_count()
+    if shard_count > 1 and not assigned_work and not dry_run:
+        with stage_timings.time("send"):
+            metrics, held_back = _run_shards(context, services, shard_count, regions, metrics)
+        with stage_timings.time("update_transitions"):
+            metrics = _update_notification_transitions(ddb, plans, today, metrics, held_back)
+        _submit_metrics(metrics, context, dry_run)
+        return metrics
+
+    deadline_millis = shard.get("deadline_millis") if shard else None
+
+    with stage_timings.time("read_contacts"):
+        # remove feature flag after these are done: RECON-6219 and RECON-6220
+        if os.environ["MM_STAGE"] != "prod" and os.environ["MM_STAGE"] != "gamma":
+            services = _get_contacts_beta(ddb, services)
+        else:
+            services = _get_contacts_prod(ddb, services)
+
+    # Most urgent mail first, so if we run out of time it's the least urgent that waits for the follow-up
+    work_items = _get_work_items(services)
+    for service, state in work_items:
+        _check_state_in_range(services[service], services[service]["states"][state])
+
+    # the plans of work items whose mail wasn't sent or recorded here keep their transition date, so that
+    # tomorrow's run still finds them
+    held_back = set()
+    digest_mode_enabled = is_digest_mode_enabled()
+    if digest_mode_enabled:
+        dispatches = _group_into_digests(services, work_items)
+        dispatched_work_items = {work_item for dispatch in dispatches for work_item in dispatch}
+        held_back.update(_get_plan_instances(services, [work_item for work_item in work_items if work_item not in dispatched_work_items]))
+    else:
+        dispatches = [[work_item] for work_item in work_items]
+
+    # Sends are recorded in the order they were submitted, once they finish.  No more are left in flight than
+    # there are MM workers, so that running out of time never leaves many of them unrecorded.
+    in_flight = deque()
+    try:
+        for index, dispatch in enumerate(dispatches):
+            if _is_near_deadline(context, deadline_millis):
+                remaining_work_items = [work_item for remaining_dispatch in dispatches[index:] for work_item in remaining_dispatch]
+                logger.warning("Running out of time, handing {} notifications to a follow-up invocation".format(len(remaining_work_items)))
+                metrics["notifications_deferred"] = len(remaining_work_items)
+                held_back.update(_get_plan_instances(services, remaining_work_items))
+                # the follow-up reads the NOTIFICATIONs to work out what is still due
+                metrics = _record_sends(in_flight, metrics)
+                metrics = _flush_notification_writes(notification_writes, metrics)
+                if not dry_run:
+                    _invoke_follow_up(event, context, remaining_work_items, _get_plan_instances(services, remaining_work_items), regions)
+                break
+
+            with stage_timings.time("send"):
+                if digest_mode_enabled:
+                    send = _submit_digest(services, dispatch, mm_dispatcher)
+                    in_flight.append(partial(_record_digest, notification_writes, notifications, services, dispatch, mm_dispatcher, send))
+                else:
+                    service, state = dispatch[0]
+                    state_dict = services[service]["states"][state]
+                    contact, template, endpoint_params = _get_contact_template_endpoint(services[service], state_dict)
+
+                    if contact:
+                        send = _submit_mail(services[service], state_dict, contact, template, endpoint_params, mm_dispatcher)
+                        in_flight.append(partial(_record_mail, notification_writes, notifications, services[service], state_dict,
+                                                 contact, template, mm_dispatcher, send))
+                    else:
+                        held_back.update(_get_plan_instances(services, dispatch))
+
+                while len(in_flight) > mm_dispatcher.max_workers:
+                    metrics = in_flight.popleft()(metrics)
+    finally:
+        # whatever was sent has to be recorded, even if something went wrong part way
+        with stage_timings.time("send"):
+            metrics = _record_sends(in_flight, metrics)
+        with stage_timings.time("write_notifications"):
+            metrics = _flush_notification_writes(notification_writes, metrics)
+
+    if not assigned_work:
+        with stage_timings.time("update_transitions"):
+            metrics = _update_notification_transitions(ddb, plans, today, metrics, held_back)
+
+    # a shard's metrics are merged into the coordinator's, which submits them
+    if not shard:
+        _submit_metrics(metrics, context, dry_run)
+    return metrics
+
+
+def _record_sends(in_flight, metrics):
+    while in_flight:
+        metrics = in_flight.popleft()(metrics)
+    return metrics
+
+
+def _check_state_in_range(service, state_dict):
+    if state_dict["value"] == 0:
+        logger.error("A service that did not need to send mail was about to send mail!")
+        logger.error("Service: {}".format(service))
+        raise Exception("Service with NOT_NOTIFIED state tried to send mail!")
+    if state_dict["value"] < 0 or state_dict["value"] > 5:
+        logger.error("Service: {}".format(service))
+        raise Exception("A service's notification state fell out of range!")
+
+
+# (rip, state name) pairs ordered by urgency: PAST_4x, PAST_1, LEFT_0, LEFT_7 then LEFT_14
+def _get_work_items(services):
+    work_items = [(service, state) for service in services for state in services[service]["states"]]
+    return sorted(work_items, key=lambda work_item: services[work_item[0]]["states"][work_item[1]]["value"], reverse=True)
+
+
+# A follow-up invocation only sends what the invocation before it didn't get to
+def _filter_services_to_work_items(services, work_items):
+    work_items = {(service, state) for service, state in work_items}
+    filtered_services = {}
+    for service in services:
+        states = {state: state_dict for state, state_dict in services[service]["states"].items() if (service, state) in work_items}
+        if states:
+            filtered_services[service] = dict(services[service], states=states)
+    return filtered_services
+
+
+def _is_near_deadline(context, deadline_millis=None):
+    # a shard also has to finish before the coordinator waiting on it times out
+    if deadline_millis is not None and deadline_millis - _now_millis() < DEADLINE_MARGIN_MILLIS:
+        return True
+    # contexts which don't come from Lambda (tests, local runs) have no deadline
+    get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+    return get_remaining_time_in_millis is not None and get_remaining_time_in_millis() < DEADLINE_MARGIN_MILLIS
+
+
+def _now_millis():
+    return int(time.time() * 1000)
+
+
+# The plans a follow-up or shard needs, so that it can read just those (and their NOTIFICATIONs) instead of
+# finding them again
+def _get_plan_instances(services, work_items):
+    return [
+        "{}:v0:{}".format(services[service]["rip"], region)
+        for service, state in work_items
+        for region in services[service]["states"][state]["regions"]
+    ]
+
+
+def _invoke_follow_up(event, context, work_items, plan_instances, regions):
+    previous_follow_up = event.get(FOLLOW_UP) if isinstance(event, dict) else None
+    depth = previous_follow_up["depth"] + 1 if previous_follow_up else 1
+    if depth > MAX_FOLLOW_UP_INVOCATIONS:
+        logger.error("Not invoking another follow-up after {} of them, dropping: {}".format(MAX_FOLLOW_UP_INVOCATIONS, work_items))
         return
 
-    # remove feature flag after these are done: RECON-6219 and RECON-6220
-    if os.environ["MM_STAGE"] != "prod" and os.environ["MM_STAGE"] != "gamma":
-        services = _get_contacts_beta(ddb, services)
+    payload = {FOLLOW_UP: {"depth": depth, "work_items": [list(work_item) for work_item in work_items],
+                           "plan_instances": plan_instances, "regions": regions}}
+    try:
+        boto3.client("lambda").invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps(payload)
+        )
+        logger.info("Invoked follow-up {} with {} notifications".format(depth, len(work_items)))
+    except Exception as e:
+        logger.exception("Unable to invoke follow-up, dropping: {}".format(work_items))
+
+
+def get_shard_count():
+    return max(1, int(os.environ.get(SHARD_COUNT_ENV_KEY, "1")))
+
+
+def get_shard_index(rip, shard_count):
+    # crc32 rather than hash(), which is salted differently in every process
+    return zlib.crc32(rip.encode("utf-8")) % shard_count
+
+
+# Split work items by service, keeping each shard in urgency order
+def _split_into_shards(work_items, shard_count):
+    shards = [[] for _ in range(shard_count)]
+    for work_item in work_items:
+        shards[get_shard_index(work_item[0], shard_count)].append(work_item)
+    return [shard for shard in shards if shard]
+
+
+def _run_shards(context, services, shard_count, regions, metrics):
+    """
+    Send every shard from its own worker and merge their metrics into ours.  In Lambda the workers are
+    invocations of this function, anywhere else (local runs) they are processes.  Each worker is handed the
+    regions and the plans in its shard, and reads only those plans and their NOTIFICATIONs.
+
+    Returns the metrics and the plan instances of every shard which failed or handed work to a follow-up, as
+    those may not have been mailed about.
+    """
+    work_items = _get_work_items(services)
+    get_remaining_time_in_millis = getattr(context, "get_remaining_time_in_millis", None)
+    # workers stop sending in time for us to collect their metrics before we time out ourselves
+    deadline_millis = _now_millis() + get_remaining_time_in_millis() - DEADLINE_MARGIN_MILLIS if get_remaining_time_in_millis else None
+
+    shard_events = [
+        {SHARD: {"index": index, "count": shard_count, "deadline_millis": deadline_millis,
+                 "work_items": [list(work_item) for work_item in shard],
+                 "plan_instances": _get_plan_instances(services, shard), "regions": regions}}
+        for index, shard in enumerate(_split_into_shards(work_items, shard_count))
+    ]
+    logger.info("Sending {} notifications across {} shards".format(len(work_items), len(shard_events)))
+    metrics["shards_invoked"] = len(shard_events)
+
+    function_arn = getattr(context, "invoked_function_arn", None)
+    if function_arn:
+        with ThreadPoolExecutor(max_workers=len(shard_events)) as executor:
+            shard_results = list(executor.map(lambda shard_event: _invoke_shard(function_arn, shard_event), shard_events))
     else:
-        services = _get_contacts_prod(ddb, services)
+        with ProcessPoolExecutor(max_workers=len(shard_events)) as executor:
+            shard_results = list(executor.map(_run_shard_locally, shard_events))
+
+    held_back = set()
+    for shard_event, shard_metrics in zip(shard_events, shard_results):
+        if shard_metrics is None:
+            metrics = increment_metric(metrics, "shard_failed")
+        else:
+            metrics = merge_metrics_dicts(merge_to=metrics, merge_from=shard_metrics)
+        if shard_metrics is None or shard_metrics.get("notifications_deferred"):
+            held_back.update(shard_event[SHARD]["plan_instances"])
+    return metrics, held_back
+
+
+def _invoke_shard(function_arn, shard_event):
+    shard = shard_event[SHARD]
+    try:
+        response = _get_shard_lambda_client().invoke(
+            FunctionName=function_arn,
+            InvocationType="RequestResponse",
+            Payload=json.dumps(shard_event)
+        )
+        payload = json.loads(response["Payload"].read())
+        if response.get("FunctionError"):
+            logger.error("Shard {} failed: {}".format(shard["index"], payload))
+            return None
+        return payload
+    except Exception as e:
+        logger.exception("Unable to invoke shard {} with {} notifications".format(shard["index"], len(shard["work_items"])))
+        return None
 
-    for service in services:
-        for state in services[service]["states"]:
 
-            state_dict = services[service]["states"][state]
+def _get_shard_lambda_client():
+    # the default 60s read timeout would retry, and so duplicate, any shard that takes longer than that
+    return boto3.client("lambda", config=Config(read_timeout=SHARD_READ_TIMEOUT_SECONDS, retries={"max_attempts": 0}))
 
-            if state_dict["value"] == 0:
-                logger.error("A service that did not need to send mail was about to send mail!")
-                logger.error("Service: {}".format(services[service]))
-                raise Exception("Service with NOT_NOTIFIED state tried to send mail!")
-            if state_dict["value"] < 0 or state_dict["value"] > 5:
-                logger.error("Service: {}".format(services[service]))
-                raise Exception("A service's notification state fell out of range!")
 
-            contact, template, endpoint_params = _get_contact_template_endpoint(services[service], state_dict)
+def _run_shard_locally(shard_event):
+    context = LocalContext()
+    context.function_name = "DeliveryDateMailerShard{}".format(shard_event[SHARD]["index"])
+    try:
+        return notification_mailer(shard_event, context)
+    except Exception as e:
+        logger.exception("Shard {} failed".format(shard_event[SHARD]["index"]))
+        return None
 
-            if contact:
-                metrics = _send_mail(ddb, notifications, services[service], state_dict, contact, template,
-                                     endpoint_params, mm_helper, metrics)
 
-    submit_cloudwatch_metrics(metrics_dict=metrics, service_name=context.function_name)
+class LocalContext(object):
+    """Stands in for the Lambda context when shards run as local processes."""
+    pass
 
 
 def get_rip_name_from_notification_instance(instance):
@@ -137,77 +515,199 @@ def get_region_from_notification_instance(instance):
     return instance.split("-")[3]
 
 
-def get_corresponding_plan(ddb, notification_instance):
+def get_corresponding_plan(plans, notification_instance):
     rip = get_rip_name_from_notification_instance(notification_instance)
     region = get_region_from_notification_instance(notification_instance)
     plan_instance = "{}:v0:{}".format(rip, region)
 
+    return plans.get(plan_instance, {})
+
+
+# Gather every dated v0 SERVICE item in one pass, indexed by instance
+def _get_plans(ddb):
     query_params = {
         "ConsistentRead": False,
-        "KeyConditionExpression": Key("artifact").eq("SERVICE") & Key("instance").eq(plan_instance)
+        "KeyConditionExpression": Key("artifact").eq("SERVICE"),
+        "FilterExpression": Attr("version_instance").eq(0) & Attr("date").exists()
     }
     items = _query_ddb(ddb, query_params)
 
-    if len(items) > 0:
-        return items[0]
+    return {item["instance"]: item for item in items}
 
-    return {}
 
-
-def dates_equal(plan_date, notification_date):
-    return (datetime.strptime(plan_date, CONDENSED_DATE_FORMAT).date() - datetime.strptime(notification_date, CONDENSED_DATE_FORMAT).date()).days == 0
+def is_transition_index_enabled():
+    return os.environ.get(TRANSITION_INDEX_ENV_KEY, "false").lower() == "true"
 
 
-def update_notification_as_not_notified(ddb, notification_instance, plan_date):
+# Only the plans whose notification state may be different today: their transition date has come, or someone
+# changed them recently (writers other than the RIP ingestor and this mailer drop the transition date).  Until
+# the sparse index exists on the table, every plan is read.
+#
+# Also returns the instances of history versions which came up.  Versioned saves copy the transition date of
+# v0 into the history row they write, where nothing ever moves it on again, so those are taken out of the index
+# the first time they come due rather than being read on every run after.
+def _get_due_plans(ddb, today):
+    due_query_params = {
+        "IndexName": NEXT_TRANSITION_INDEX,
+        "KeyConditionExpression": Key("artifact").eq("SERVICE") & Key(NEXT_TRANSITION).lte(today.isoformat())
+    }
+    updated_query_params = {
+        "IndexName": "artifact-updated-index",
+        "KeyConditionExpression": (
+            Key("artifact").eq("SERVICE") &
+            Key("updated").gte((datetime.utcnow() - timedelta(days=RECENTLY_UPDATED_DAYS)).isoformat())
+        ),
+        "FilterExpression": Attr("version_instance").eq(0) & Attr("date").exists()
+    }
     try:
+        due_items = _query_ddb(ddb, due_query_params)
+    except Exception as e:
+        logger.exception("Unable to query {}, reading every plan instead: ".format(NEXT_TRANSITION_INDEX))
+        return _get_plans(ddb), []
+    items = [item for item in due_items if item.get("version_instance") == 0]
+    history_instances = [item["instance"] for item in due_items if item.get("version_instance") not in (None, 0)]
+    items += _query_ddb(ddb, updated_query_params)
+
+    return {item["instance"]: item for item in items}, history_instances
+
+
+# Takes history versions out of the sparse index, leaving anything that became v0 since alone
+def _remove_history_transitions(ddb, history_instances, metrics):
+    for instance in history_instances:
+        try:
+            ddb.update_item(
+                Key={"artifact": "SERVICE", "instance": instance},
+                UpdateExpression="remove #n",
+                ExpressionAttributeNames={"#n": NEXT_TRANSITION},
+                ConditionExpression=Attr("version_instance").exists() & Attr("version_instance").ne(0)
+            )
+            metrics = increment_metric(metrics, "history_transitions_removed")
+        except Exception as e:
+            logger.exception("Unable to remove the notification transition of history version {}: ".format(instance))
+    return metrics
+
+
+def _get_plans_by_instance(ddb, plan_instances):
+    items = batch_get_table_items(ddb, [("SERVICE", instance) for instance in plan_instances])
+
+    return {instance: item for (_, instance), item in items.items() if "date" in item}
+
+
+def _get_retry_plan_instances(notification_items, plans):
+    plan_instances = []
+    for item in notification_items:
+        if int(item.get("retries", 0)) > 0:
+            plan_instance = "{}:v0:{}".format(get_rip_name_from_notification_instance(item["instance"]),
+                                              get_region_from_notification_instance(item["instance"]))
+            if plan_instance not in plans:
+                plan_instances.append(plan_instance)
+    return plan_instances
+
+
+# Keep next_notification_transition up to date on every plan we read.  Plans that won't need mail again
+# lose the attribute, which takes them out of the sparse index.  Held back plans had mail due which wasn't
+# sent or recorded (a failed shard, work handed to a follow-up), so they keep their transition date until it is.
+def _update_notification_transitions(ddb, plans, today, metrics, held_back=()):
+    for plan in plans.values():
+        if plan["instance"] in held_back:
+            metrics = increment_metric(metrics, "notification_transitions_held_back")
+            continue
+
+        try:
+            transition = get_plan_transition(plan, today)
+        except ValueError:
+            logger.warning("Unable to work out the next notification transition for {}".format(plan["instance"]))
+            continue
+
+        if transition == plan.get(NEXT_TRANSITION):
+            continue
+
         params = dict(
-            Key={
-                "artifact": "NOTIFICATION",
-                "instance": notification_instance
-            },
-            UpdateExpression="set #s=:s, #l=:l",
-            ExpressionAttributeNames={
-                "#s": "state",
-                "#l": "last_known_launch_date"
-            },
-            ExpressionAttributeValues={
-                ":s": "NOT_NOTIFIED",
-                ":l": plan_date
-            },
-            ReturnValues="UPDATED_NEW"
+            Key={"artifact": "SERVICE", "instance": plan["instance"]},
+            ExpressionAttributeNames={"#n": NEXT_TRANSITION},
+            # never recreate a plan which was deleted since we read it
+            ConditionExpression=Attr("instance").exists()
         )
-        response = ddb.update_item(**params)
-        logger.info("Successfully updated NOTIFICATION entry with {}: {}".format(params, response))
+        if transition:
+            params["UpdateExpression"] = "set #n=:n"
+            params["ExpressionAttributeValues"] = {":n": transition}
+        else:
+            params["UpdateExpression"] = "remove #n"
+
+        try:
+            ddb.update_item(**params)
+            metrics = increment_metric(metrics, "notification_transitions_updated")
+        except Exception as e:
+            logger.exception("Unable to update notification transition with '{}': ".format(params))
+    return metrics
 
-    except Exception as e:
-        logger.exception("Unable to update notification with '{}': ".format(params))
 
+def dates_equal(plan_date, notification_date):
+    return (datetime.strptime(plan_date, CONDENSED_DATE_FORMAT).date() - datetime.strptime(notification_date, CONDENSED_DATE_FORMAT).date()).days == 0
+
+
+def update_notification_as_not_notified(notification_writes, notification_instance, plan_date):
+    key = {
+        "artifact": "NOTIFICATION",
+        "instance": notification_instance
+    }
+    attributes = {
+        "state": "NOT_NOTIFIED",
+        "last_known_launch_date": plan_date
+    }
+    notification_writes.update(key, attributes)
+    logger.info("Buffered NOTIFICATION update of {} with {}".format(notification_instance, attributes))
 
-def check_date_slip(ddb, notification):
+
+def check_date_slip(notification_writes, notification, plans):
     notification_date = notification["last_known_launch_date"]
-    plan = get_corresponding_plan(ddb, notification["instance"])
+    plan = get_corresponding_plan(plans, notification["instance"])
     plan_date = plan.get("date", None)
 
     if plan_date and not dates_equal(plan_date, notification_date):
         logger.info("Notification object {} has an old date: {}, new date is: {} and needs to be updated".format(notification["instance"], notification_date, plan_date))
-        update_notification_as_not_notified(ddb, notification["instance"], plan_date)
+        update_notification_as_not_notified(notification_writes, notification["instance"], plan_date)
         return True
 
     return False
 
 
-# Gather all NOTIFICATION artifacts from ddb related to delivery dates
-def _get_notifications(ddb, notifications):
+def _query_notifications(ddb):
     query_params = {
         "ConsistentRead": False,
         "KeyConditionExpression": Key("artifact").eq("NOTIFICATION"),
         "FilterExpression": Attr("type").eq("delivery")
     }
-    items = _query_ddb(ddb, query_params)
+    return _query_ddb(ddb, query_params)
+
+
+def get_notification_instance_from_plan_instance(plan_instance):
+    rip, _, region = plan_instance.split(":")
+    return "delivery-date-{}-{}".format(rip, region)
+
+
+# Just the NOTIFICATIONs of these plans, for a follow-up or shard which was handed them
+def _get_notification_items_by_plan_instance(ddb, plan_instances):
+    keys = [("NOTIFICATION", get_notification_instance_from_plan_instance(instance)) for instance in plan_instances]
+    items = batch_get_table_items(ddb, keys)
+
+    return [item for item in items.values() if item.get("type") == "delivery"]
+
+
+# Gather all NOTIFICATION artifacts from ddb related to delivery dates
+def _get_notifications(ddb, notifications, plans=None, items=None, notification_writes=None):
+    if plans is None:
+        plans = _get_plans(ddb)
+    if items is None:
+        items = _query_notifications(ddb)
+
+    owns_notification_writes = notification_writes is None
+    if owns_notification_writes:
+        notification_writes = UpdateBuffer(ddb)
 
     try:
         for item in items:
-            if not check_date_slip(ddb, item):
+            if not check_date_slip(notification_writes, item, plans):
                 notification = {
                     "instance": item["instance"],
                     "updated": item["updated"],
@@ -222,6 +722,17 @@ def _get_notifications(ddb, notifications):
     except Exception as e:
         logger.exception("Zero or incorrect NOTIFICATION items were returned from query: ")
 
+    finally:
+        if owns_notification_writes:
+            notification_writes.flush()
+
+
+def _flush_notification_writes(notification_writes, metrics):
+    failed_keys = notification_writes.flush()
+    if failed_keys:
+        metrics["notification_write_failure"] = metrics.get("notification_write_failure", 0) + len(failed_keys)
+    return metrics
+
 
 def get_airport_codes(region_metadata_items: List[RegionMetadata]):
     return [region.airport_code for region in region_metadata_items]
@@ -236,18 +747,11 @@ def get_recon_managed_regions():
 
 
 # Gather all relevant service instances, checking when their delivery date is, comparing to related NOTIFICATION
-def _get_services(ddb, services, notifications, regions):
-    query_params = {
-        "ConsistentRead": False,
-        "KeyConditionExpression": Key("artifact").eq("SERVICE"),
-        "FilterExpression": (
-            Attr("version_instance").eq(0) &
-            Attr("status").ne("GA") &
-            Attr("status").ne("NOT_PLANNED") &
-            Attr("date").exists()
-        )
-    }
-    items = _query_ddb(ddb, query_params)
+def _get_services(ddb, services, notifications, regions, plans=None):
+    if plans is None:
+        plans = _get_plans(ddb)
+
+    items = [plan for plan in plans.values() if plan.get("status") not in ("GA", "NOT_PLANNED")]
 
     try:
         for item in items:
@@ -272,11 +776,26 @@ def _get_services(ddb, services, notifications, regions):
         logger.exception("Zero or incorrect SERVICE items were returned from query: ")
 
 
-def _get_contacts_prod(ddb, services):
+# Fetch the SERVICE (and CONTACTS) metadata items of every service at once, instead of a get_item each
+def _prefetch_contact_items(ddb, services, artifacts=("SERVICE", "CONTACTS")):
+    keys = [
+        (artifact, "{}:v0".format(services[service]["rip"]))
+        for service in services
+        for artifact in artifacts
+    ]
+    return batch_get_table_items(ddb, keys, max_workers=CONTACT_FETCH_WORKERS)
+
+
+def _get_contacts_prod(ddb, services, contact_items=None):
+    if contact_items is None:
+        contact_items = _prefetch_contact_items(ddb, services, artifacts=("SERVICE",))
+
     for service in services:
         instance_name = "{}:v0".format(services[service]["rip"])
-        response = ddb.get_item(Key={"artifact": "SERVICE", "instance": instance_name})
-        item = response["Item"]
+        item = contact_items.get(("SERVICE", instance_name))
+        if item is None:
+            logger.error("No SERVICE metadata item found for {}".format(instance_name))
+            continue
 
         try:
             # Get name for prettier emails since some teams do not go by their RIP ID
@@ -297,16 +816,20 @@ def _get_contacts_prod(ddb, services):
     return services
 
 
-def _get_contacts_beta(ddb, services):
+def _get_contacts_beta(ddb, services, contact_items=None):
+    if contact_items is None:
+        contact_items = _prefetch_contact_items(ddb, services)
+
     for service in services:
         instance_name = "{}:v0".format(services[service]["rip"])
 
-        response = ddb.get_item(Key={"artifact": "CONTACTS", "instance": instance_name})
-        contact_item = response.get('Item')
+        contact_item = contact_items.get(("CONTACTS", instance_name))
         contacts = format_contacts(contact_item) if contact_item else {}
 
-        response = ddb.get_item(Key={"artifact": "SERVICE", "instance": instance_name})
-        service_item = response["Item"]
+        service_item = contact_items.get(("SERVICE", instance_name))
+        if service_item is None:
+            logger.error("No SERVICE metadata item found for {}".format(instance_name))
+            continue
 
         try:
             # Get name for prettier emails since some teams do not go by their RIP ID
@@ -346,8 +869,8 @@ def format_contacts(contact_item):
 
     return contacts
 
-def create_msg_group_name(contact):
-    grp_name = GROUP_PREFIX + "-to-" + contact["TO"][0]
+def create_msg_group_name(contact, prefix=GROUP_PREFIX):
+    grp_name = prefix + "-to-" + contact["TO"][0]
     if len(contact["CC"]) > 0:
         grp_name += "-cc-"
         for alias in contact["CC"]:
@@ -369,11 +892,16 @@ def get_contact_names(contacts):
 
 
 # Attempts to send one contact one template style of mail
-def _send_mail(ddb, notifications, service, state, contact, template, endpoint_params, mm_helper, metrics):
-    msg_group_name = create_msg_group_name(contact)
-    message_group_arn = mm_helper.get_own_message_group_arn(message_group_name=msg_group_name)
+def _send_mail(notification_writes, notifications, service, state, contact, template, endpoint_params, mm_helper, metrics):
+    mm_dispatcher = as_mm_dispatcher(mm_helper)
+    send = _submit_mail(service, state, contact, template, endpoint_params, mm_dispatcher)
+    return _record_mail(notification_writes, notifications, service, state, contact, template, mm_dispatcher, send, metrics)
 
-    _prepare_mm_target(message_group_arn, contact, endpoint_params, msg_group_name, template, mm_helper)
+
+# The target is set up on the message group's worker, so that nothing else sent to the group can change it in between
+def _submit_mail(service, state, contact, template, endpoint_params, mm_dispatcher):
+    msg_group_name = create_msg_group_name(contact)
+    message_group_arn = mm_dispatcher.get_own_message_group_arn(message_group_name=msg_group_name)
 
     regions = []
     for region in state["regions"].values():
@@ -392,24 +920,136 @@ def _send_mail(ddb, notifications, service, state, contact, template, endpoint_p
         })
     }
 
-    try:
+    def deliver():
+        _prepare_mm_target(message_group_arn, contact, endpoint_params, msg_group_name, template, mm_dispatcher)
         logger.info("sending message to {} stage with payload: {} ".format(contact, params))
-        response = mm_helper.perform_operation(operation="send_message", params=params, convert_message_group_name=True)
+        return mm_dispatcher.perform_operation(operation="send_message", params=params, convert_message_group_name=True)
+
+    return mm_dispatcher.submit(msg_group_name, deliver)
+
+
+def _record_mail(notification_writes, notifications, service, state, contact, template, mm_dispatcher, send, metrics):
+    try:
+        response = send.result()
 
         logger.info("sent mail! {}".format(response))
         metrics = increment_metric(metrics, "message_send_success")
 
         for region in state["regions"]:
-            _update_notification(ddb, service, state, state["regions"][region], 0)
+            _update_notification(notification_writes, service, state, state["regions"][region], 0)
 
     except Exception as e:
-        logger.exception("unable to send message: '{}': ".format(params))
+        logger.exception("unable to send {} mail about {} to {}: ".format(state["name"], service["rip"], contact))
         metrics = increment_metric(metrics, "message_send_failure")
-        if notification["retries"]+1 >= 3:
-            metrics = _send_fallback(service, state, contact, template, mm_helper, metrics)
+        # the target may have been changed or removed outside of this mailer, so set it up again next time
+        MM_TARGET_CACHE.invalidate(mm_dispatcher.get_own_message_group_arn(message_group_name=create_msg_group_name(contact)))
+        retries = _get_next_retries(notifications, service, state)
+        if max(retries.values(), default=0) >= 3:
+            metrics = _send_fallback(service, state, contact, template, mm_dispatcher, metrics)
         for region in state["regions"]:
-            notification = notifications["delivery-date-{}-{}".format(service["rip"], region)]
-            _update_notification(ddb, service, state, state["regions"][region], notification["retries"]+1)
+            _update_notification(notification_writes, service, state, state["regions"][region], retries[region])
+    return metrics
+
+
+def _get_next_retries(notifications, service, state):
+    return {
+        region: notifications.get("delivery-date-{}-{}".format(service["rip"], region), {}).get("retries", 0) + 1
+        for region in state["regions"]
+    }
+
+
+def is_digest_mode_enabled():
+    return os.environ.get(DIGEST_MODE_ENV_KEY, "false").lower() == "true"
+
+
+# Group work items by who they would be mailed to, most urgent group first.  Work items nobody would be
+# mailed about are left out, as they are when mailing one service and state at a time.
+def _group_into_digests(services, work_items):
+    digests = {}
+    for service, state in work_items:
+        contact, _, _ = _get_contact_template_endpoint(services[service], services[service]["states"][state])
+        if contact:
+            digests.setdefault(json.dumps(contact, sort_keys=True), []).append((service, state))
+    return list(digests.values())
+
+
+def _get_digest_sections(services, work_items):
+    sections = []
+    for service, state in work_items:
+        state_dict = services[service]["states"][state]
+        gm, vp = get_contact_names(services[service]["contacts"])
+        sections.append({
+            "name_rip": services[service]["rip"],
+            "name_long": services[service]["name"],
+            "state": state_dict["name"],
+            "instructions": get_digest_instructions(state_dict["value"], gm, vp),
+            "regions": sorted(state_dict["regions"].values(), key=lambda item: item["region"])
+        })
+    return sections
+
+
+# Sends every service and state in work_items, which all go to the same contacts, as one mail
+def _send_digest(notification_writes, notifications, services, work_items, mm_helper, metrics):
+    mm_dispatcher = as_mm_dispatcher(mm_helper)
+    send = _submit_digest(services, work_items, mm_dispatcher)
+    return _record_digest(notification_writes, notifications, services, work_items, mm_dispatcher, send, metrics)
+
+
+def _get_digest_contact(services, work_items):
+    first_service, first_state = work_items[0]
+    contact, _, endpoint_params = _get_contact_template_endpoint(services[first_service], services[first_service]["states"][first_state])
+    if os.environ["MM_STAGE"] == "prod":
+        endpoint_params = dict(endpoint_params, EMAIL_SUBJECT="Action Requested for Scheduled Launches")
+    return contact, endpoint_params
+
+
+def _submit_digest(services, work_items, mm_dispatcher):
+    contact, endpoint_params = _get_digest_contact(services, work_items)
+    template = get_digest_template()
+    msg_group_name = create_msg_group_name(contact, prefix=DIGEST_GROUP_PREFIX)
+    message_group_arn = mm_dispatcher.get_own_message_group_arn(message_group_name=msg_group_name)
+
+    params = {
+        "message_group_name": msg_group_name,
+        "params": json.dumps({"sections": _get_digest_sections(services, work_items)})
+    }
+
+    def deliver():
+        _prepare_mm_target(message_group_arn, contact, endpoint_params, msg_group_name, template, mm_dispatcher)
+        logger.info("sending digest of {} notifications to {} with payload: {} ".format(len(work_items), contact, params))
+        return mm_dispatcher.perform_operation(operation="send_message", params=params, convert_message_group_name=True)
+
+    return mm_dispatcher.submit(msg_group_name, deliver)
+
+
+def _record_digest(notification_writes, notifications, services, work_items, mm_dispatcher, send, metrics):
+    try:
+        response = send.result()
+
+        logger.info("sent mail! {}".format(response))
+        metrics = increment_metric(metrics, "message_send_success")
+        metrics["digest_notifications_sent"] = metrics.get("digest_notifications_sent", 0) + len(work_items)
+
+        for service, state in work_items:
+            state_dict = services[service]["states"][state]
+            for region in state_dict["regions"]:
+                _update_notification(notification_writes, services[service], state_dict, state_dict["regions"][region], 0)
+
+    except Exception as e:
+        contact, _ = _get_digest_contact(services, work_items)
+        logger.exception("unable to send digest of {} notifications to {}: ".format(len(work_items), contact))
+        metrics = increment_metric(metrics, "message_send_failure")
+        msg_group_name = create_msg_group_name(contact, prefix=DIGEST_GROUP_PREFIX)
+        MM_TARGET_CACHE.invalidate(mm_dispatcher.get_own_message_group_arn(message_group_name=msg_group_name))
+
+        for service, state in work_items:
+            state_dict = services[service]["states"][state]
+            retries = _get_next_retries(notifications, services[service], state_dict)
+            if max(retries.values(), default=0) >= 3:
+                state_contact, state_template, _ = _get_contact_template_endpoint(services[service], state_dict)
+                metrics = _send_fallback(services[service], state_dict, state_contact, state_template, mm_dispatcher, metrics)
+            for region in state_dict["regions"]:
+                _update_notification(notification_writes, services[service], state_dict, state_dict["regions"][region], retries[region])
     return metrics
 
 
@@ -465,6 +1105,20 @@ def _prepare_mm_target(message_group_arn, contact, endpoint_params, msg_group_na
         "message_template_name": target_name,
         "message_template": template
     }
+    params_hash = get_target_params_hash(target_params)
+
+    cached_target = MM_TARGET_CACHE.get(message_group_arn)
+    if cached_target and cached_target["target_name"] == target_name:
+        if cached_target["params_hash"] == params_hash:
+            logger.debug("target {} is unchanged, skipping MM setup".format(target_name))
+            return
+        if cached_target.get("target_arn"):
+            target_params["target_arn"] = cached_target["target_arn"]
+            logger.warning("UPDATING target {} with params {}".format(target_name, target_params))
+            mm_helper.perform_operation(operation="update_target", params=target_params)
+            MM_TARGET_CACHE.put(message_group_arn, target_name, cached_target["target_arn"], params_hash)
+            return
+
     existing_target_arn = None
     try:
         mm_helper.perform_operation(operation="get_message_group", params={"message_group_arn": message_group_arn})
@@ -486,7 +1140,10 @@ def _prepare_mm_target(message_group_arn, contact, endpoint_params, msg_group_na
     else:
         target_params["target_name"] = target_name
         logger.warning("CREATING target {} with params {}".format(target_name, target_params))
-        mm_helper.perform_operation(operation="create_target", params=target_params)
+        response = mm_helper.perform_operation(operation="create_target", params=target_params)
+        existing_target_arn = getattr(response, "target_arn", None)
+
+    MM_TARGET_CACHE.put(message_group_arn, target_name, existing_target_arn, params_hash)
 
 
 def format_endpoint(contact):
@@ -559,33 +1216,21 @@ def add_aliases_to_cc(notif_state, contacts_dict, contact):
     return contact
 
 
-def _update_notification(ddb, service, state, region, retries):
-    try:
-        params = dict(
-            Key={
-                "artifact": "NOTIFICATION",
-                "instance": "delivery-date-{}-{}".format(service["rip"], region["region"])
-            },
-            UpdateExpression="set updated=:u, #s=:s, #t=:t, retries=:r, #l=:l",
-            ExpressionAttributeNames={
-                "#s": "state",
-                "#t": "type",
-                "#l": "last_known_launch_date"
-            },
-            ExpressionAttributeValues={
-                ":u": datetime.now(timezone.utc).strftime(NORMALIZED_DATE_FORMAT_WITH_SEC),
-                ":s": state["name"],
-                ":t": "delivery",
-                ":r": retries,
-                ":l": region["date"]
-            },
-            ReturnValues="UPDATED_NEW"
-        )
-        response = ddb.update_item(**params)
-        logger.info("Successfully updated NOTIFICATION entry with {}: {}".format(params, response))
-
-    except Exception as e:
-        logger.exception("Unable to update notifications with '{}': ".format(params))
+# Written when notification_writes is flushed, together with the rest of the run's NOTIFICATION updates
+def _update_notification(notification_writes, service, state, region, retries):
+    key = {
+        "artifact": "NOTIFICATION",
+        "instance": "delivery-date-{}-{}".format(service["rip"], region["region"])
+    }
+    attributes = {
+        "updated": datetime.now(timezone.utc).strftime(NORMALIZED_DATE_FORMAT_WITH_SEC),
+        "state": state["name"],
+        "type": "delivery",
+        "retries": retries,
+        "last_known_launch_date": region["date"]
+    }
+    notification_writes.update(key, attributes)
+    logger.info("Buffered NOTIFICATION update of {} with {}".format(key["instance"], attributes))
 
 
 def _determine_state(days_left):
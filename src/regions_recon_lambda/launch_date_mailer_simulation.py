@@ -0,0 +1,69 @@
+"""
+Run the delivery date mailer as a dry run, outside of Lambda, and print what it would have done.
+
+Reads go to the buildables table (or a local copy of it in DynamoDB Local), nothing is written or sent.
+The report lists every message and NOTIFICATION update a real run would make, the DynamoDB and Message
+Multiplexer calls it would take, and how long each phase took.
+
+Examples:
+  python -m regions_recon_lambda.launch_date_mailer_simulation --stage prod --account-id 123456789012
+  python -m regions_recon_lambda.launch_date_mailer_simulation --stage beta --account-id 123456789012 \\
+      --endpoint-url http://localhost:8000 --output report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+class SimulationContext():
+    """Stands in for the Lambda context, without a deadline."""
+    function_name = "DeliveryDateMailerSimulation"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dry run the delivery date mailer and report what it would do.")
+    parser.add_argument("--stage", required=True, help="MM stage to look message groups up in, e.g. beta or prod")
+    parser.add_argument("--account-id", required=True, help="account the mailer's message groups belong to")
+    parser.add_argument("--endpoint-url",
+                        help="send DynamoDB calls here instead, e.g. http://localhost:8000 for a snapshot in DynamoDB Local")
+    parser.add_argument("--table-name", default="buildables", help="buildables table name (default buildables)")
+    parser.add_argument("--output", help="write the report here (default stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.endpoint_url:
+        # picked up by every botocore client, including the ones PynamoDB creates
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint_url
+    os.environ.setdefault("BUILDABLES_TABLE_NAME", args.table_name)
+    os.environ["MM_STAGE"] = args.stage
+    os.environ["ACCOUNT_ID"] = args.account_id
+
+    # imported here so that --endpoint-url is in the environment before any boto3 resources are created
+    import boto3
+    from regions_recon_python_common.message_multiplexer_helper import MessageMultiplexerHelper, get_mm_endpoint
+    from regions_recon_lambda.launch_date_mailer import simulate_notification_mailer
+
+    ddb = boto3.resource("dynamodb", region_name="us-east-1").Table(os.environ["BUILDABLES_TABLE_NAME"])
+    mm_helper = MessageMultiplexerHelper(endpoint=get_mm_endpoint(args.stage), own_account_number=args.account_id)
+
+    start = time.monotonic()
+    report = simulate_notification_mailer({"dryrun": True}, SimulationContext(), ddb, mm_helper)
+    report["elapsed_seconds"] = round(time.monotonic() - start, 3)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        json.dump(report, output, indent=2, default=str)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
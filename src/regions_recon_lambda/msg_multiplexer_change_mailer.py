@@ -1,11 +1,13 @@
-from typing import Dict
+from collections import Counter
+from typing import Dict, Set, Tuple
 
 from regions_recon_python_common.utils.log import get_logger
 from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, merge_metrics_dicts, increment_metric
-from regions_recon_python_common.message_multiplexer_helper import MessageMultiplexerHelper, get_mm_endpoint
 from regions_recon_python_common.utils.misc import get_rip_name_from_instance_field
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer
 from datetime import datetime, timezone, timedelta
+from functools import partial
 from dateutil import parser
 from traceback import format_exc
 import pytz
@@ -14,6 +16,12 @@ import json
 import os
 
 from regions_recon_python_common.utils.object_utils import deep_get
+from regions_recon_lambda.utils.dynamo_query import DynamoQuery, batch_get_table_items
+from regions_recon_lambda.utils.mm_dispatcher import get_mm_dispatcher
+from regions_recon_lambda.utils.plan_history import PlanHistoryReader
+from regions_recon_lambda.utils.relevant_change import RELEVANT_CHANGE_AT, RELEVANT_CHANGE_ATTRIBUTES, RELEVANT_CHANGE_CHECKED_AT, \
+    has_current_relevant_change_stamp, is_relevant_change
+from regions_recon_lambda.utils.update_buffer import UpdateBuffer
 
 logger = get_logger()
 
@@ -23,6 +31,15 @@ CONDENSED_DATE_FORMAT = "%Y-%m-%d"
 NORMALIZED_DATE_FORMAT = "%Y-%m-%d %H:%M %Z"
 NORMALIZED_DATE_FORMAT_WITH_SEC = "%Y-%m-%d %H:%M:%S %Z"
 MM_STAGE = os.environ["MM_STAGE"]
+SERVICE_NAME_ATTRIBUTES = ("instance", "name_sortable", "name_sales", "name_marketing", "name_long")
+
+# How classify_update sorts the rows updated in the window
+UPDATE_NOT_CATEGORIZED = "not_categorized"
+UPDATE_SERVICE_SPECIFIC = "service_specific"
+UPDATE_UNCONFIGURED_REGION = "unconfigured_region"
+UPDATE_ALREADY_NOTIFIED = "already_notified"
+UPDATE_NOT_RELEVANT = "not_relevant"
+UPDATE_TRIGGERED = "triggered"
 
 def belongs_to_region(item):
     return item.get("belongs_to_artifact", {}).get("S") == "REGION"
@@ -98,7 +115,6 @@ def has_relevant_changes(history: Dict[any, any]) -> bool:
     # Will be tested in beta to try to remove the "changed_attributes" field
     # Unit tests will come after the beta flag is removed
 
-    relevant_changes = ("date", "confidence", "note")
     latest_version: int
 
     try:
@@ -110,24 +126,291 @@ def has_relevant_changes(history: Dict[any, any]) -> bool:
     if not previous_item:
         return False
 
-    current_item = history[0]
-
-    has_relevant_field_change = any(
-                                     deep_get(current_item, (change, "S")) != deep_get(previous_item, (change, "S"))
-                                     for change in relevant_changes
-                                 )
-
-    current_status = deep_get(current_item, ("status", "S"))
-
-    has_status_change_to_GA = current_status != deep_get(previous_item, ("status", "S")) and current_status == "GA"
+    return is_relevant_change(get_plain_attributes(history[0]), get_plain_attributes(previous_item))
+
+
+def get_plain_attributes(item) -> Dict[str, str]:
+    return {attribute: deep_get(item, (attribute, "S")) for attribute in RELEVANT_CHANGE_ATTRIBUTES + ("status",)}
+
+
+def get_categorized_services(ddb, table) -> Set[str]:
+    """
+    The RIP names of services with categories, i.e. with a non-regional v0 row in the sparse plan index.
+    Only the instance is projected, rows are dropped a page at a time.
+    """
+    args = dict(
+        TableName=table,
+        IndexName="artifact-plan-index",
+        KeyConditionExpression="artifact = :service",
+        FilterExpression="version_instance = :zero AND (attribute_not_exists(belongs_to_artifact) OR belongs_to_artifact <> :region)",
+        ProjectionExpression="instance",
+        ExpressionAttributeValues={":service": {"S": "SERVICE"}, ":zero": {"N": "0"}, ":region": {"S": "REGION"}}
+    )
+
+    categorized_services = set()
+    for page in _query_pages(ddb, args):
+        categorized_services.update(get_rip_name_from_instance_field(item["instance"]["S"]) for item in page)
+
+    # There are some services without categories set on their non-regional instances. These are typically deprecated.
+    # They never make it into the set, as it's unclear how to "patch" the data in a way that is helpful to the customer.
+    return categorized_services
+
+
+def get_update_notifications(ddb, table):
+    """
+    Every NOTIFICATION of type "update", one per region.  The type is only filtered on after each page is read,
+    so the other mailers' NOTIFICATIONs can fill whole pages; all of them are read.
+    """
+    args = dict(
+        TableName=table,
+        KeyConditions={"artifact": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "NOTIFICATION"}]}},
+        QueryFilter={
+            "type": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "update"}]}
+        }
+    )
+    return [item for page in _query_pages(ddb, args) for item in page]
+
+
+def classify_update(item, categorized_services, notifications) -> str:
+    """Why a v0 row updated in the window does or doesn't need mail: one of the UPDATE_* values."""
+    rip = (item["instance"]["S"].split(":"))[0]
+    if rip not in categorized_services:
+        return UPDATE_NOT_CATEGORIZED
+    if "belongs_to_instance" not in item:
+        return UPDATE_SERVICE_SPECIFIC
+    if item["belongs_to_instance"]["S"] not in notifications:
+        return UPDATE_UNCONFIGURED_REGION
+    if get_updated_date(item) < notifications[item["belongs_to_instance"]["S"]]["updated"]:
+        return UPDATE_ALREADY_NOTIFIED
+    if has_current_relevant_change_stamp({name: deep_get(item, (name, "S")) for name in item}) \
+            and get_updated_date(item, RELEVANT_CHANGE_AT) < notifications[item["belongs_to_instance"]["S"]]["updated"]:
+        # the ingestor saw nothing mail is sent about change since the last notification, and no one wrote the plan since
+        return UPDATE_NOT_RELEVANT
+    return UPDATE_TRIGGERED
+
+
+def get_updated_date(item, attribute="updated"):
+    return parser.parse(item[attribute]["S"]).replace(tzinfo=pytz.UTC)
+
+
+def get_triggered_changes(ddb, table, categorized_services, notifications, oldest_update, now) -> Dict[Tuple[str, str], datetime]:
+    """
+    Classify every SERVICE v0 row updated since oldest_update as its page arrives, keeping only the
+    (service, region) pairs whose change hasn't been mailed yet, with when they changed.
+
+    Rows stamped with a relevant_change_at older than every notification are dropped by DynamoDB, as long as
+    the stamp was checked against the row's current updated.  Rows without one (written before the ingestor
+    stamped them) or written since by another writer are all kept, for the history check.
+    """
+    args = dict(
+        TableName=table,
+        IndexName="artifact-updated-index",
+        KeyConditionExpression="artifact = :service AND #updated BETWEEN :oldest AND :now",
+        FilterExpression="version_instance = :zero AND (attribute_not_exists(#relevant) OR #relevant >= :oldest "
+                         "OR attribute_not_exists(#checked) OR #checked <> #updated)",
+        ProjectionExpression="instance, belongs_to_instance, #updated, #relevant, #checked",
+        ExpressionAttributeNames={"#updated": "updated", "#relevant": RELEVANT_CHANGE_AT, "#checked": RELEVANT_CHANGE_CHECKED_AT},
+        ExpressionAttributeValues={
+            ":service": {"S": "SERVICE"},
+            ":oldest": {"S": oldest_update.isoformat()},
+            ":now": {"S": now.isoformat()},
+            ":zero": {"N": "0"}
+        }
+    )
+
+    changes = {}
+    counts = Counter()
+    unconfig_regions = set()
+    for page in _query_pages(ddb, args):
+        logger.info("STEP 3: reviewing a batch of {} service updates since {}".format(len(page), oldest_update.strftime(NORMALIZED_DATE_FORMAT)))
+        for item in page:
+            classification = classify_update(item, categorized_services, notifications)
+            counts[classification] += 1
+
+            if classification == UPDATE_UNCONFIGURED_REGION and item["belongs_to_instance"]["S"] not in unconfig_regions:
+                unconfig_regions.add(item["belongs_to_instance"]["S"])
+                logger.warn("no NOTIFICATION configured for region {}".format(item["belongs_to_instance"]["S"]))
+                logger.warn("EXAMPLE of WEIRD instance: {}".format(item))
+            elif classification == UPDATE_TRIGGERED:
+                rip = (item["instance"]["S"].split(":"))[0]
+                changes[(rip, item["belongs_to_instance"]["S"])] = get_updated_date(item)
+
+    logger.info("SKIPPED UPDATES: {} were for services that are not categorized, {} were for regions for which we are not configured to send updates, {} were service-specific (non-regional) updates, {} were already mailed about, {} had no relevant changes".format(
+        counts[UPDATE_NOT_CATEGORIZED], counts[UPDATE_UNCONFIGURED_REGION], counts[UPDATE_SERVICE_SPECIFIC], counts[UPDATE_ALREADY_NOTIFIED],
+        counts[UPDATE_NOT_RELEVANT]))
+    logger.info("{} updates are possibly relevant".format(len(changes)))
+    return changes
+
+
+def get_service_names(table, service_keys) -> Dict[str, str]:
+    """Display names of just the services that changed, read with BatchGetItem through the table resource."""
+    items = batch_get_table_items(table, [("SERVICE", "{}:v0".format(service_key)) for service_key in sorted(service_keys)],
+                                  project_fields=SERVICE_NAME_ATTRIBUTES)
+
+    # get_service_name reads items in the low-level client's format, as the rest of this mailer does
+    serializer = TypeSerializer()
+    return {
+        get_rip_name_from_instance_field(instance): get_service_name({name: serializer.serialize(value) for name, value in item.items()})
+        for (_, instance), item in items.items()
+    }
+
+
+def get_service_histories(history_reader, service_regions) -> Dict[Tuple[str, str], Dict[int, dict]]:
+    """
+    Every version of each (service, region) plan, as version -> item in the low-level client's format.
+    The current versions are read first, for version_latest, then all the older ones at once.
+    """
+    service_regions = list(service_regions)
+    current = history_reader.get_versions((service_key, region_key, [0]) for service_key, region_key in service_regions)
+
+    previous = history_reader.get_versions(
+        (service_key, region_key, range(1, int(history[0].get("version_latest", 0)) + 1))
+        for (service_key, region_key), history in current.items() if 0 in history
+    )
+
+    serializer = TypeSerializer()
+    histories = {}
+    for key in service_regions:
+        versions = dict(current[key])
+        versions.update(previous.get(key, {}))
+        histories[key] = {version: {name: serializer.serialize(value) for name, value in item.items()} for version, item in versions.items()}
+    return histories
+
+
+def get_message_service(service_key, region_key, history, region_updated_date, service_name, past_system_event_threshold):
+    """What the mail for region_key says about service_key, or None if its latest change isn't worth a mail."""
+    if not history:
+        logger.info("no service history items.  wtf.")
+        return None
+
+    logger.info("STEP 4.a.1: {} service history in {} contains {} items".format(service_key, region_key, len(history)))
+
+    if 0 not in history:
+        logger.info("no current service item for {} in {}".format(service_key, region_key))
+        return None
+
+    logger.info("{} in {} has {} versions".format(service_key, region_key, len(history)))
+    logger.info("most recent instance is: {}".format(history[0]))
+
+    new_confidence = "({})".format(get_confidence(history[0]))
+
+    new_date = "See Note"
+    if "date" in history[0]:
+        new_date = condense_date_text(history[0]["date"]["S"])
+    else:
+        if "updated" in history[0]:
+            new_date = condense_date_text(history[0]["updated"]["S"])
+        else:
+            # Give up. Uncertain how to report on this if we don't know when it happened.
+            logger.error("NO UPDATED DATE: {}".format(history))
+            return None
+
+    # The bare minimum requirements to generate an email are a change to date, confidence, note, or status.
+    # Most specifically, this will exclude changes to only the category since those aren't noted in the email
+    # (an email based soley on a category change would, confusingly, contain no changed information).
+    # See https://sim.amazon.com/issues/RECON-4560.
+
+    if not has_relevant_changes(history):
+        # To determine if we are accurately determine which services were updated
+        logger.warn(f"IGNORING update with no relevant changes to date, note, or confidence and no status change to GA: {history}")
+        return None
+
+    if "updater" in history[0]:
+        if ((history[0]["updater"]["S"] == "system") or (history[0]["updater"]["S"] == "RIPScorecardListener")):
+            logger.warn("IGNORING SYSTEM UPDATE: {}".format(history[0]))
+
+    # Sometimes we get system updates for things in the past. I don't know why. Sure, I'd like to know.
+    # But figuring things like that out take time and I have to finish this report RIGHT NOW. Maybe
+    # there will be time in the future to look into this.
+    #
+    # So, let's not send mail about past updates so we don't get questions about it from users.
+    if ("date" in history[0]) and ("updated" in history[0]):
+        difference = (parser.parse(history[0]["updated"]["S"]).replace(tzinfo=pytz.UTC) - parser.parse(history[0]["date"]["S"]).replace(tzinfo=pytz.UTC)).days
+        logger.warn("POTENTIAL OLD event for {} in {}, difference: {}".format(service_key, region_key, difference))
+        if difference > past_system_event_threshold:
+            logger.error("IGNORING an update about a past event for {} in {} {} days ago: {}".format(service_key, region_key, difference, history))
+            return None
+
+    updater = ""
+    if "updater" in history[0]:
+        updater = history[0]["updater"]["S"]
+
+    note = ""
+    if "note" in history[0]:
+        note = history[0]["note"]["S"]
+
+    if ("date" not in history[0]) and ("confidence" not in history[0]):
+        if ("status" not in history[0]) or (len(history[0]["status"]["S"]) == 0):
+            # This is another case where we have nothing to report if there's no date, status, or confidence change.
+            # Just abort.
+            logger.error("IGNORING an update with no date, status, or confidence change for {} in {}: {}".format(service_key, region_key, history))
+            return None
+        if (("status" in history[0]) and (history[0]["status"]["S"] == "GA")):
+            # Only send these on GA/Complete. Otherwise, we send redundant updates about build status changes which RMS
+            # (presumably) is already sending.
+            pass
+        else:
+            return None
 
-    result = has_relevant_field_change or has_status_change_to_GA
-#     for debugging uncomment
-#     print(f"Result of fields check : {has_relevant_field_change}")
-#     print(f"Result of has_status_change_to_GA : {has_status_change_to_GA}")
-#     print(f"Result of relevant_changes : {result}")
-    
-    return result
+    # De-dupe.
+    i = 1
+    previous_dates = []
+    end = len(history) - 1
+    tup = ( ("date", new_date), ("confidence", new_confidence) )
+    seen = set()
+    seen.add(tup)
+    while i < end:
+        previous = {}
+        # versions can be missing, e.g. after the reaper has been through
+        if "date" in history.get(i, {}):
+            previous = {"date": condense_date_text(history[i]["date"]["S"]), "confidence": ""}
+            if "confidence" in history[i]:
+                previous["confidence"] = "(" + history[i]["confidence"]["S"] + ")"
+            tup = ( ("date", previous["date"]), ("confidence", previous["confidence"]) )
+
+            logger.warn("TUP COMPARE: look for '{}' in '{}'".format(tup, seen))
+
+            if tup not in seen:
+                seen.add(tup)
+                previous_dates.append(previous)
+        i += 1
+
+    # Sort.
+    previous_dates = sorted(previous_dates, key=lambda item: item["date"], reverse=True)
+
+    # Add visual separators.
+    i = 0
+    end = len(previous_dates)
+    while i < end:
+        separator = ""
+        if i + 1 < end:
+            separator = ","
+        previous_dates[i]["separator"] = separator
+        i += 1
+
+    if (updater == "") and (note == ""):
+        note = "automated update"
+
+    return dict(
+        rip=service_key,
+        service_name=service_name or get_service_name({"instance": {"S": service_key}}),
+        new_date=new_date,
+        new_confidence=new_confidence,
+        previous=previous_dates,
+        note=note,
+        changed_on_date=region_updated_date.strftime(NORMALIZED_DATE_FORMAT),
+        actor_username=updater if updater != "system" else ""
+    )
+
+
+def _query_pages(ddb, args):
+    while True:
+        response = ddb.query(**args)
+        yield response.get("Items", [])
+
+        if "LastEvaluatedKey" not in response:
+            return
+        args = dict(args, ExclusiveStartKey=response["LastEvaluatedKey"])
 
 
 # Entry Point - Lambda starts here
@@ -143,6 +426,8 @@ def send_updates_mail(event, context):
     metrics["message_send_failure"] = 0
 
     ddb = boto3.client("dynamodb", region_name='us-east-1')
+    buildables_table = boto3.resource("dynamodb", region_name='us-east-1').Table(os.environ["BUILDABLES_TABLE_NAME"])
+    notification_writes = UpdateBuffer(buildables_table)
 
     now = datetime.now(timezone.utc)
     notifications = {}
@@ -150,21 +435,12 @@ def send_updates_mail(event, context):
     oldest_update = now
     table = os.environ["BUILDABLES_TABLE_NAME"]
     items = []
-    services = {}
 
     try:
-        response = ddb.query(
-            TableName=table,
-            KeyConditions={"artifact": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "NOTIFICATION"}]}},
-            QueryFilter={
-                "type": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "update"}]}
-            }
-        )
+        items = get_update_notifications(ddb, table)
 
-        if "Items" not in response.keys():
+        if not items:
             logger.error("no NOTIFICATION artifacts are configured in the database, bozo")
-        else:
-            items = response["Items"]
 
         logger.info("STEP 1: regain our memory about the state of notifications")
         for item in items:
@@ -197,306 +473,38 @@ def send_updates_mail(event, context):
 
         logger.info("STEP 2: get list of services that have categories")
         try:
-            total = 0
-            args = dict(
-                TableName=table,
-                IndexName="artifact-plan-index",
-                KeyConditions={
-                    "artifact": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "SERVICE"}]},
-                },
-                QueryFilter={
-                    "version_instance": {"ComparisonOperator": "EQ", "AttributeValueList": [{"N": "0"}]}
-                }
-            )
-
-            while True:
-                response = ddb.query(**args)
-
-                if "Items" not in response:
-                    logger.error("no SERVICE instances returned")
-                else:
-                    items = response["Items"]
-                    for item in items:
-                        rip = (item["instance"]["S"].split(":"))[0]
-                        if rip not in services:
-                            services[rip] = dict(
-                                # Raw items about each region for which we have data about this service.
-                                regions={},
-
-                                # Raw items about this service's non-regional data.
-                                instances={}
-                            )
-
-                        if belongs_to_region(item):
-                            # This is a region-specific item.
-                            region = item["belongs_to_instance"]["S"]
-                            if region in notifications:
-                                if region not in services[rip]["regions"]:
-                                    services[rip]["regions"][region] = dict(
-                                        history={0: item},
-                                        notification=notifications[region]
-                                    )
-                                services[rip]["regions"][region]["history"][int(item["version_instance"]["N"])] = item
-                        else:
-                            services[rip]["instances"][item["version_instance"]["N"]] = item
-
-                    total += len(items)
-
-                    if "LastEvaluatedKey" in response:
-                        args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-                    else:
-                        break
-
-            # DATA CLEANUP
-            # There are some services without categories set on their non-regional instances. These are typically deprecated.
-            # for now, we need to remove these as they will wreck the code later on and it's unclear how to "patch" the data
-            # in an automated way that is helpful to the customer.
-            delete = [key for key in services if len(services[key]["instances"]) == 0]
-            logger.warn("CLEANUP: eliding services which lack proper category settings: {}".format(delete))
-            for key in delete:
-                del services[key]
-
-            logger.info("{} SERVICES: {}".format(len(services), sorted(services.keys())))
+            categorized_services = get_categorized_services(ddb, table)
+            logger.info("{} SERVICES: {}".format(len(categorized_services), sorted(categorized_services)))
 
             try:
-                args = dict(
-                    TableName=table,
-                    IndexName="artifact-updated-index",
-                    KeyConditions={
-                        "artifact": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "SERVICE"}]},
-                        "updated": {"ComparisonOperator": "BETWEEN", "AttributeValueList": [{"S": oldest_update.isoformat()}, {"S": now.isoformat()}]}
-                    },
-                    QueryFilter={
-                        "version_instance": {"ComparisonOperator": "EQ", "AttributeValueList": [{"N": "0"}]},
-                    }
-                )
-
-                no_cat = 0
-                service_specific = 0
-                unconfig_region = 0
-                unconfig_regions = []
-                possibly_relevant = 0
-                while True:
-                    response = ddb.query(**args)
-
-                    if "Items" not in response:
-                        logger.info("STEP 3: no service updates since {}".format(oldest_update.strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)))
-                    else:
-                        items = response["Items"]
-                        logger.info("STEP 3: reviewing a batch of {} service updates since {}".format(len(items), oldest_update.strftime(NORMALIZED_DATE_FORMAT)))
-
-                        for item in items:
-                            # Skip everything that's not categorized.
-                            rip = (item["instance"]["S"].split(":"))[0]
-                            if rip not in services:
-                                no_cat += 1
-                            else:
-                                # Service-specific row.
-                                if "belongs_to_instance" not in item:
-                                    services[rip]["instances"][item["version_instance"]["N"]] = item
-                                    service_specific += 1
-                                else:
-                                    # Service-in-region row.
-                                    region = item["belongs_to_instance"]["S"]
-                                    if region not in notifications:
-                                        unconfig_region += 1
-                                        if region not in unconfig_regions:
-                                            unconfig_regions.append(region)
-                                            logger.warn("no NOTIFICATION configured for region {}".format(item["belongs_to_instance"]["S"]))
-                                            logger.warn("EXAMPLE of WEIRD instance: {}".format(item))
-                                    else:
-                                        possibly_relevant += 1
-                                        logger.info("adding history for {} in {}".format(rip, region))
-                                        if region not in services[rip]["regions"]:
-                                            logger.info("adding history for {} in {}".format(rip, region))
-                                            services[rip]["regions"][region] = dict(
-                                                history={0: item},
-                                                notification=notifications[region]
-                                            )
-                                        else:
-                                            services[rip]["regions"][region]["history"][int(item["version_instance"]["N"])] = item
-
-                    if "LastEvaluatedKey" in response:
-                        args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-                    else:
-                        break
-
-                logger.info("SKIPPED UPDATES: {} were for services that are not categorized, {} were for regions for which we are not configured to send updates, {} were service-specific (non-regional) updates".format(no_cat, unconfig_region, service_specific))
-                logger.info("{} updates are possibly relevant".format(possibly_relevant))
-
-                # Now we're ready to start matching up the service information we have with the messages that need sending.
+                changes = get_triggered_changes(ddb, table, categorized_services, notifications, oldest_update, now)
+
+                # Now we're ready to start matching up the changes with the messages that need sending.
+                service_names = get_service_names(buildables_table, {service_key for service_key, _ in changes})
+                histories = get_service_histories(PlanHistoryReader(DynamoQuery(table)), changes.keys())
                 messages = {}
-                for service_key in services:
-                    service = services[service_key]
-                    for region_key in service["regions"]:
-
-                        # # # # HACK # # # #
-                        # remove_system_updates(service, region_key)
-                        # # # # HACK # # # #
-
-                        service_in_region = service["regions"][region_key]
-                        if (region_key in notifications) and ("history" in service_in_region) and (len(service_in_region["history"]) > 0):
-                            notification = notifications[region_key]
-                            if 'updated' in service_in_region["history"][0] and 'S' in service_in_region["history"][0]['updated']:
-                                region_updated_date = parser.parse(service_in_region["history"][0]["updated"]["S"]).replace(tzinfo=pytz.UTC)
-                                # logger.info("STEP 4 (loop): compare dates: {} last updated on {}, region {} last notification was {}".format(service_key, region_updated_date, region_key, notification["updated"]))
-                                if region_updated_date >= notification["updated"]:
-                                    logger.info("STEP 4.a: TRIGGERED {} in {} last updated on {}, last notification sent on {}".format(service_key, region_key, region_updated_date, notification["updated"]))
-
-                                    previous_dates = []
-                                    try:
-                                        response = ddb.query(
-                                            TableName=table,
-                                            KeyConditions={
-                                                "artifact": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": "SERVICE"}]},
-                                                "instance": {"ComparisonOperator": "BEGINS_WITH", "AttributeValueList": [{"S": service_key}]}
-                                            },
-                                            QueryFilter={
-                                                "belongs_to_instance": {"ComparisonOperator": "EQ", "AttributeValueList": [{"S": region_key}]}
-                                            }
-                                        )
-
-                                        if "Items" not in response.keys():
-                                            logger.info("no service history items.  wtf.")
-                                        else:
-                                            items = response["Items"]
-                                            logger.info("STEP 4.a.1: {} service history in {} response contains {} items".format(service_key, region_key, len(items)))
-
-                                            for item in items:
-                                                index = int(item["version_instance"]["N"])
-                                                service_in_region["history"][index] = item
-
-                                            # # # # HACK # # # #
-                                            # remove_system_updates(service, region_key)
-                                            # # # # HACK # # # #
-
-                                            history = service_in_region["history"]
-                                            logger.info("{} in {} has {} versions".format(service_key, region_key, len(history)))
-                                            logger.info("most recent instance is: {}".format(history[0]))
-
-                                            new_confidence = "({})".format(get_confidence(history[0]))
-
-                                            new_date = "See Note"
-                                            if "date" in history[0]:
-                                                new_date = condense_date_text(history[0]["date"]["S"])
-                                            else:
-                                                if "updated" in history[0]:
-                                                    new_date = condense_date_text(history[0]["updated"]["S"])
-                                                else:
-                                                    # Give up. Uncertain how to report on this if we don't know when it happened.
-                                                    logger.error("NO UPDATED DATE: {}".format(history))
-                                                    break
-
-                                            # The bare minimum requirements to generate an email are a change to date, confidence, note, or status.
-                                            # Most specifically, this will exclude changes to only the category since those aren't noted in the email
-                                            # (an email based soley on a category change would, confusingly, contain no changed information).
-                                            # See https://sim.amazon.com/issues/RECON-4560.
-
-                                            if not has_relevant_changes(history):
-                                                # To determine if we are accurately determine which services were updated
-                                                logger.warn(f"IGNORING update with no relevant changes to date, note, or confidence and no status change to GA: {history}")
-                                                break
-
-                                            if "updater" in history[0]:
-                                                if ((history[0]["updater"]["S"] == "system") or (history[0]["updater"]["S"] == "RIPScorecardListener")):
-                                                    logger.warn("IGNORING SYSTEM UPDATE: {}".format(history[0]))
-
-                                            # Sometimes we get system updates for things in the past. I don't know why. Sure, I'd like to know.
-                                            # But figuring things like that out take time and I have to finish this report RIGHT NOW. Maybe
-                                            # there will be time in the future to look into this.
-                                            #
-                                            # So, let's not send mail about past updates so we don't get questions about it from users.
-                                            if ("date" in history[0]) and ("updated" in history[0]):
-                                                difference = (parser.parse(history[0]["updated"]["S"]).replace(tzinfo=pytz.UTC) - parser.parse(history[0]["date"]["S"]).replace(tzinfo=pytz.UTC)).days
-                                                logger.warn("POTENTIAL OLD event for {} in {}, difference: {}".format(service_key, region_key, difference))
-                                                if difference > PAST_SYSTEM_EVENT_THRESHOLD:
-                                                    logger.error("IGNORING an update about a past event for {} in {} {} days ago: {}".format(service_key, region_key, difference, history))
-                                                    break
-
-                                            updater = ""
-                                            if "updater" in history[0]:
-                                                updater = history[0]["updater"]["S"]
-
-                                            note = ""
-                                            if "note" in history[0]:
-                                                note = history[0]["note"]["S"]
-
-                                            if ("date" not in history[0]) and ("confidence" not in history[0]):
-                                                if ("status" not in history[0]) or (len(history[0]["status"]["S"]) == 0):
-                                                    # This is another case where we have nothing to report if there's no date, status, or confidence change.
-                                                    # Just abort.
-                                                    logger.error("IGNORING an update with no date, status, or confidence change for {} in {}: {}".format(service_key, region_key, history))
-                                                    break
-                                                if (("status" in history[0]) and (history[0]["status"]["S"] == "GA")):
-                                                    # Only send these on GA/Complete. Otherwise, we send redundant updates about build status changes which RMS
-                                                    # (presumably) is already sending.
-                                                    pass
-                                                else:
-                                                    break
-
-                                            # De-dupe.
-                                            i = 1
-                                            previous_dates = []
-                                            end = len(history) - 1
-                                            tup = ( ("date", new_date), ("confidence", new_confidence) )
-                                            seen = set()
-                                            seen.add(tup)
-                                            while i < end:
-                                                previous = {}
-                                                if "date" in history[i]:
-                                                    previous = {"date": condense_date_text(history[i]["date"]["S"]), "confidence": ""}
-                                                    if "confidence" in history[i]:
-                                                        previous["confidence"] = "(" + history[i]["confidence"]["S"] + ")"
-                                                    tup = ( ("date", previous["date"]), ("confidence", previous["confidence"]) )
-
-                                                    logger.warn("TUP COMPARE: look for '{}' in '{}'".format(tup, seen))
-
-                                                    if tup not in seen:
-                                                        seen.add(tup)
-                                                        previous_dates.append(previous)
-                                                i += 1
-
-                                            # Sort.
-                                            previous_dates = sorted(previous_dates, key=lambda item: item["date"], reverse=True)
-
-                                            # Add visual separators.
-                                            i = 0
-                                            end = len(previous_dates)
-                                            while i < end:
-                                                separator = ""
-                                                if i + 1 < end:
-                                                    separator = ","
-                                                previous_dates[i]["separator"] = separator
-                                                i += 1
-
-                                            name = get_service_name(service["instances"]["0"])
-
-                                            if region_key not in messages:
-                                                messages[region_key] = {"services": []}
-
-                                            if (updater == "") and (note == ""):
-                                                note = "automated update"
-
-                                            messages[region_key]["services"].append(dict(
-                                                rip=service_key,
-                                                service_name=name,
-                                                new_date=new_date,
-                                                new_confidence=new_confidence,
-                                                previous=previous_dates,
-                                                note=note,
-                                                changed_on_date=region_updated_date.strftime(NORMALIZED_DATE_FORMAT),
-                                                actor_username=updater if updater != "system" else ""
-                                            ))
-                                            messages[region_key]["last_sent_date"] = notification["updated"].strftime(NORMALIZED_DATE_FORMAT)
-                                            messages[region_key]["airport_code"] = notification["region"]
-
-                                    except Exception as e:
-                                        logger.error("unable to fetch history in region for {} because {}\n{}".format(service_key, repr(e), format_exc()))
-                                else:
-                                    pass
-                                    # logger.info("STEP 4.b: we've already sent mail about {} in {}".format(service_key, notification["region"]))
+                for (service_key, region_key), region_updated_date in changes.items():
+                    notification = notifications[region_key]
+                    logger.info("STEP 4.a: TRIGGERED {} in {} last updated on {}, last notification sent on {}".format(service_key, region_key, region_updated_date, notification["updated"]))
+
+                    try:
+                        message_service = get_message_service(service_key, region_key, histories[(service_key, region_key)], region_updated_date,
+                                                              service_names.get(service_key), PAST_SYSTEM_EVENT_THRESHOLD)
+                    except Exception as e:
+                        logger.error("unable to build message in region for {} because {}\n{}".format(service_key, repr(e), format_exc()))
+                        continue
+
+                    if message_service:
+                        if region_key not in messages:
+                            messages[region_key] = {"services": []}
+                        messages[region_key]["services"].append(message_service)
+                        messages[region_key]["last_sent_date"] = notification["updated"].strftime(NORMALIZED_DATE_FORMAT)
+                        messages[region_key]["airport_code"] = notification["region"]
 
                 logger.info("STEP 5: preparing to send {} messages".format(len(messages)))
+                # every region has its own message group, so they're all sent at once
+                mm_dispatcher = get_mm_dispatcher(MM_STAGE)
+                sends = {}
                 for message_key in messages.keys():
                     service_list = sorted(messages[message_key]["services"], key=lambda item: item["service_name"])
 
@@ -509,37 +517,32 @@ def send_updates_mail(event, context):
                         })
                     }
 
+                    logger.info("sending message to {} stage with payload: {} ".format(MM_STAGE, params))
+                    sends[message_key] = (params, mm_dispatcher.submit(params["message_group_name"], partial(
+                        mm_dispatcher.perform_operation, operation="send_message", params=params, convert_message_group_name=True)))
+
+                for message_key, (params, send) in sends.items():
                     try:
-                        logger.info("sending message to {} stage with payload: {} ".format(MM_STAGE, params))
-                        mm_helper = MessageMultiplexerHelper(endpoint=get_mm_endpoint(MM_STAGE), own_account_number=os.environ["ACCOUNT_ID"])
-                        response = mm_helper.perform_operation(operation="send_message", params=params, convert_message_group_name=True)
+                        response = send.result()
 
                         logger.info("sent mail! {}".format(response))
                         metrics = increment_metric(metrics, "message_send_success")
 
-                        try:
-                            params = dict(
-                                TableName=table,
-                                Key={
-                                    "artifact": {"S": "NOTIFICATION"},
-                                    "instance": {"S": notifications[message_key]["instance"]}
-                                },
-                                AttributeUpdates={
-                                    "updated": {
-                                        "Action": "PUT",
-                                        "Value": {"S": now.strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)}
-                                    }
-                                })
-                            response = ddb.update_item(**params)
-                            logger.info("STEP 5: successfully updated NOTIFICATION entry with {}: {}".format(params, response))
-
-                        except Exception as e:
-                            logger.error("unable to update notifications with '{}' because {} \n{}".format(params, repr(e), format_exc()))
+                        notification_writes.update(
+                            {"artifact": "NOTIFICATION", "instance": notifications[message_key]["instance"]},
+                            {"updated": now.strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)}
+                        )
 
                     except Exception as e:
                         logger.error("unable to send message: {}, because {} \n{}".format(params, repr(e), format_exc()))
                         metrics = increment_metric(metrics, "message_send_failure")
 
+                logger.info("STEP 6: updating {} NOTIFICATION entries".format(len(notification_writes)))
+                for artifact, instance in notification_writes.flush():
+                    logger.error("unable to update NOTIFICATION entry {}".format(instance))
+                    metrics = increment_metric(metrics, "notification_write_failure")
+                mm_dispatcher.take_timings().emit(context.function_name)
+
             except Exception as e:
                 logger.error("unable to query for updates: {} \n{}".format(repr(e), format_exc()))
 
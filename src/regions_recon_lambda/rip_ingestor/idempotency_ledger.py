@@ -0,0 +1,64 @@
+import time
+from typing import Iterable, Set
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from regions_recon_python_common.utils.log import get_logger
+
+LEDGER_ARTIFACT = "RIP_LEDGER"
+# SQS keeps messages for at most 14 days, so nothing older than that can be redelivered
+LEDGER_TTL_SECONDS = 14 * 24 * 60 * 60
+# needs to match the TTL attribute configured on the ledger table (RipIngestorLedgerTable)
+LEDGER_TTL_ATTRIBUTE = "expires_at"
+DEFAULT_LEDGER_TABLE_NAME = "rip_ingestor_ledger"
+
+logger = get_logger()
+
+
+class IdempotencyLedger():
+    """
+    Remembers which RIP changes have been applied, so that SQS redeliveries can be acknowledged without
+    being processed again.
+
+    Entries live in their own table, keyed like buildables so that DynamoQuery can read it, under the
+    RIP_LEDGER artifact.  There's one per SNS MessageId (or content hash), and they expire through DynamoDB TTL.
+    """
+    def __init__(self, ledger_query, ttl_seconds: int = LEDGER_TTL_SECONDS):
+        self.ledger_query = ledger_query
+        self.ttl_seconds = ttl_seconds
+
+
+    def get_applied(self, idempotency_keys: Iterable[str]) -> Set[str]:
+        """Return the keys which are already in the ledger, with one BatchGetItem per 100 keys."""
+        keys = [(LEDGER_ARTIFACT, idempotency_key) for idempotency_key in idempotency_keys]
+        if not keys:
+            return set()
+        items = self.ledger_query.batch_get_items(keys, project_fields=[LEDGER_TTL_ATTRIBUTE])
+        now = time.time()
+        # TTL deletes lag behind, so expired entries can still be read
+        return {instance for (_, instance), item in items.items() if item.get(LEDGER_TTL_ATTRIBUTE, now + 1) > now}
+
+
+    def record_applied(self, idempotency_keys: Iterable[str]) -> int:
+        """
+        Add the keys to the ledger with a conditional put, so an entry is never overwritten.
+        Returns how many were already there, which means another invocation applied the same change.
+        """
+        already_recorded = 0
+        expires_at = int(time.time()) + self.ttl_seconds
+        for idempotency_key in idempotency_keys:
+            try:
+                self.ledger_query.table.put_item(
+                    Item={
+                        "artifact": LEDGER_ARTIFACT,
+                        "instance": idempotency_key,
+                        LEDGER_TTL_ATTRIBUTE: expires_at,
+                    },
+                    ConditionExpression=Attr("instance").not_exists(),
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                logger.info(f"RIP change {idempotency_key} was already in the ledger")
+                already_recorded += 1
+        return already_recorded
@@ -1,5 +1,6 @@
 from typing import TypeVar, Type
 
+from pynamodb.attributes import UnicodeAttribute
 from regions_recon_python_common.buildable_item import BuildableRegion, BuildableItem, BuildableService
 from regions_recon_python_common.buildables_dao_models.buildables_item import INSTANCE_DELIMITER, BuildablesItem
 from regions_recon_python_common.buildables_dao_models.buildables_versioned_item import BuildablesVersionedItem
@@ -7,6 +8,9 @@ from regions_recon_python_common.buildables_dao_models.region_metadata import Re
 from regions_recon_python_common.buildables_dao_models.service_metadata import ServiceMetadata
 from regions_recon_python_common.buildables_dao_models.service_plan import ServicePlan
 
+from regions_recon_lambda.utils.notification_transition import NEXT_TRANSITION
+from regions_recon_lambda.utils.relevant_change import RELEVANT_CHANGE_AT, RELEVANT_CHANGE_CHECKED_AT
+
 
 SERVICE_METADATA_DELIMITER_COUNT = 1
 SERVICE_PLAN_DELIMITER_COUNT = 2
@@ -18,6 +22,18 @@ V = TypeVar('V', bound=BuildablesVersionedItem)
 UPDATING_ATTRIBUTES = frozenset(("updated", "updater", "updating_agent"))
 
 
+class IngestedServicePlan(ServicePlan):
+    """
+    A ServicePlan which also keeps relevant_change_at, relevant_change_checked_at and next_notification_transition,
+    so that maintaining them costs no extra write.  Writers using ServicePlan itself drop them: the service update
+    mailer takes a missing or outdated stamp as "might be relevant", and the delivery date mailer reads recently
+    updated plans anyway.
+    """
+    relevant_change_at = UnicodeAttribute(attr_name=RELEVANT_CHANGE_AT, null=True)
+    relevant_change_checked_at = UnicodeAttribute(attr_name=RELEVANT_CHANGE_CHECKED_AT, null=True)
+    next_notification_transition = UnicodeAttribute(attr_name=NEXT_TRANSITION, null=True)
+
+
 def _convert_buildable_item_to_model(buildable_item: BuildableItem, model_type: Type[T]) -> T:
     return model_type.create_and_backfill(**{
         attribute: buildable_item.local_item[attribute]
@@ -53,7 +69,7 @@ def convert_buildable_service_metadata_to_model(buildable_service: BuildableServ
 
 
 def convert_buildable_service_plan_to_model(buildable_service: BuildableService) -> ServicePlan:
-    return _convert_buildable_item_to_versioned_model(buildable_service, ServicePlan)
+    return _convert_buildable_item_to_versioned_model(buildable_service, IngestedServicePlan)
 
 
 def is_service(buildable_item: BuildableItem):
@@ -0,0 +1,48 @@
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Parents (REGION/SERVICE rows) are almost never deleted, so known parents can live for a while.
+DEFAULT_POSITIVE_TTL_SECONDS = 900
+# Missing parents are usually test/retail/closed regions, but a new region can show up at any time.
+DEFAULT_NEGATIVE_TTL_SECONDS = 60
+
+
+class ParentDimensionCache():
+    """
+    Remembers whether a parent dimension exists in the buildables table.
+
+    Instances are meant to live at module scope so that they survive across invocations of a warm
+    Lambda container.  Both hits and misses are cached, each with its own TTL.
+    """
+    def __init__(self, positive_ttl_seconds: int = DEFAULT_POSITIVE_TTL_SECONDS,
+                 negative_ttl_seconds: int = DEFAULT_NEGATIVE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.positive_ttl_seconds = positive_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.clock = clock
+        self._entries: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+
+
+    def get(self, dimension_type: str, dimension_name: str) -> Optional[bool]:
+        """Return the cached existence of the parent, or None if it is unknown or expired."""
+        key = (dimension_type, dimension_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        exists, expires_at = entry
+        if self.clock() >= expires_at:
+            # other threads may be expiring the same entry
+            self._entries.pop(key, None)
+            return None
+        return exists
+
+
+    def put(self, dimension_type: str, dimension_name: str, exists: bool) -> None:
+        ttl = self.positive_ttl_seconds if exists else self.negative_ttl_seconds
+        self._entries[(dimension_type, dimension_name)] = (exists, self.clock() + ttl)
+
+
+    def clear(self) -> None:
+        self._entries = {}
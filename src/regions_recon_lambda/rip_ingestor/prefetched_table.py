@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class PrefetchedTable():
+    """
+    Wraps a boto3 Table so that get_item calls for prefetched keys are answered from memory.
+
+    Keys which were prefetched but don't exist in the table are answered with an empty response, the same
+    as DynamoDB would.  Anything else (other keys, queries, batch writers...) goes to the wrapped table.
+    """
+    def __init__(self, table, prefetched_keys: Iterable[Tuple[str, str]], items: Dict[Tuple[str, str], dict]):
+        self.table = table
+        self.prefetched_keys = set(prefetched_keys)
+        self.items = items
+        self.hits = 0
+
+
+    def get_item(self, Key, **kwargs):
+        key = (Key["artifact"], Key["instance"])
+        if key not in self.prefetched_keys:
+            return self.table.get_item(Key=Key, **kwargs)
+
+        self.hits += 1
+        item = self.items.get(key)
+        return {"Item": dict(item)} if item is not None else {}
+
+
+    def get_prefetched_item(self, key: Tuple[str, str]) -> Optional[dict]:
+        """The prefetched item for key, without counting a hit.  None if it is missing or wasn't prefetched."""
+        return self.items.get(key)
+
+
+    def add_items(self, items: Iterable[dict]) -> None:
+        """Answer reads for these items from memory from now on, e.g. writes which haven't been flushed yet."""
+        for item in items:
+            key = (item["artifact"], item["instance"])
+            self.prefetched_keys.add(key)
+            self.items[key] = item
+
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
@@ -0,0 +1,218 @@
+"""
+Replay RIP change messages from files through RipChangesIngestor, without going through SQS.
+
+Used to re-ingest RIP changes after an outage.  Input files can be:
+  * JSONL, one per line: a RIP message, an SNS notification ({"Message": ..., "MessageAttributes": ...}),
+    or an SQS record ({"body": ...})
+  * JSON SNS dumps: a list of any of the above, or a Lambda SNS/SQS event ({"Records": [...]})
+
+Examples:
+  python -m regions_recon_lambda.rip_ingestor.replay changes.jsonl --workers 8
+  python -m regions_recon_lambda.rip_ingestor.replay dump.json --dry-run --output items.jsonl
+  python -m regions_recon_lambda.rip_ingestor.replay changes.jsonl --endpoint-url http://localhost:8000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterable, Iterator, List
+
+from regions_recon_python_common.utils.cloudwatch_metrics_utils import merge_metrics_dicts
+from regions_recon_python_common.utils.log import get_logger
+
+from regions_recon_lambda.utils.aws_call_counter import AwsCallCounter
+from regions_recon_lambda.utils.stage_timings import StageTimings
+
+logger = get_logger()
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_WORKERS = 4
+# RIP messages don't carry their change type, only the SNS attributes do
+DEFAULT_CHANGE_TYPE = "DimensionChange"
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+
+
+def to_sqs_record(entry: dict, message_id: str, default_change_type: str = DEFAULT_CHANGE_TYPE) -> dict:
+    """Normalize a RIP message, SNS notification or SQS/SNS Lambda record into what SQS sends the ingestor."""
+    if "body" in entry:
+        return dict(entry, messageId=entry.get("messageId", message_id))
+
+    notification = entry.get("Sns", entry)  # Lambda SNS event records wrap the notification
+    if "Message" in notification:
+        message = notification["Message"]
+        change_type = notification.get("MessageAttributes", {}).get("changeType", {}).get("Value", default_change_type)
+        message_id = notification.get("MessageId", message_id)
+    else:
+        message = entry
+        change_type = default_change_type
+
+    return {
+        "messageId": message_id,
+        "body": {
+            "Message": message,
+            "MessageAttributes": {"changeType": {"Type": "String", "Value": change_type}},
+        },
+    }
+
+
+def read_entries(filename: str) -> Iterator[dict]:
+    """Yield every entry in a file.  JSONL files are streamed a line at a time, anything else is read as one JSON document."""
+    with open(filename, "r") as input_file:
+        if filename.endswith(JSONL_EXTENSIONS):
+            for line in input_file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        content = json.load(input_file)
+        yield from (content.get("Records", [content]) if isinstance(content, dict) else content)
+
+
+def read_sqs_records(filenames: Iterable[str], default_change_type: str = DEFAULT_CHANGE_TYPE) -> Iterator[dict]:
+    for filename in filenames:
+        for index, entry in enumerate(read_entries(filename)):
+            yield to_sqs_record(entry, "{}:{}".format(os.path.basename(filename), index), default_change_type)
+
+
+def batched(records: Iterable[dict], batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _replay_ingestor_class():
+    # imported here so that --endpoint-url is in the environment before any boto3 resources are created
+    from regions_recon_lambda.ingest_rip_changes import RipChangesIngestor
+
+    class ReplayIngestor(RipChangesIngestor):
+        """A batch mode ingestor which collects metrics instead of publishing them, and can skip writes."""
+        def __init__(self, metrics_service_name, event, batch_mode=True, max_workers=None, dry_run=False):
+            super().__init__(metrics_service_name=metrics_service_name, event=event, batch_mode=True, max_workers=max_workers)
+            self.dry_run = dry_run
+            self.dry_run_items = []
+
+        def check_non_sqs_record(self, record):
+            pass  # replayed records never come from SQS
+
+        def submit_metrics(self):
+            pass  # collected by replay() instead
+
+        def emit_stage_timings(self, aws_calls):
+            pass  # collected by replay() instead
+
+        def write_to_dynamo(self):
+            if not self.dry_run:
+                return super().write_to_dynamo()
+
+            self.dry_run_items += self.ddb_items_to_write
+            for model in self.region_items_to_write + self.service_metadata_items_to_write + self.service_plan_items_to_write:
+                self.dry_run_items.append(model.attribute_values)
+            self.ddb_items_to_write = []
+            self.region_items_to_write = []
+            self.service_metadata_items_to_write = []
+            self.service_plan_items_to_write = []
+
+    return ReplayIngestor
+
+
+def replay(sqs_records: Iterable[dict], batch_size: int = DEFAULT_BATCH_SIZE, workers: int = DEFAULT_WORKERS,
+           dry_run: bool = False, output=None) -> dict:
+    """Run the records through the ingestor in batches.  Returns a report of what happened."""
+    ingestor_class = _replay_ingestor_class()
+    metrics = {}
+    stage_timings = StageTimings()
+    failed_message_ids = []
+    record_count = 0
+    start = time.monotonic()
+
+    with AwsCallCounter() as call_counter:
+        for batch in batched(sqs_records, batch_size):
+            ingestor = ingestor_class(
+                metrics_service_name="RipChangesReplay",
+                event={"Records": batch},
+                max_workers=workers,
+                dry_run=dry_run,
+            )
+            response = ingestor.run_workflow()
+            record_count += len(batch)
+            failed_message_ids += [failure["itemIdentifier"] for failure in response["batchItemFailures"]]
+            metrics = merge_metrics_dicts(merge_to=metrics, merge_from=ingestor.metrics)
+            stage_timings.merge(ingestor.stage_timings)
+            if output is not None:
+                for item in ingestor.dry_run_items:
+                    output.write(json.dumps(item, default=str) + "\n")
+            logger.info(f"Replayed {record_count} records, {len(failed_message_ids)} failed so far")
+
+    elapsed_seconds = time.monotonic() - start
+    dynamodb_calls = call_counter.count("dynamodb")
+    return {
+        "records": record_count,
+        "failed_records": len(failed_message_ids),
+        "failed_message_ids": failed_message_ids,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        "records_per_second": round(record_count / elapsed_seconds, 1) if elapsed_seconds else None,
+        "dynamodb_calls": dynamodb_calls,
+        "dynamodb_calls_per_record": round(dynamodb_calls / record_count, 2) if record_count else None,
+        "dynamodb_calls_by_operation": {operation: calls for (service, operation), calls in call_counter.calls.items()
+                                        if service == "dynamodb"},
+        "metrics": metrics,
+        "stage_timings_ms": stage_timings.summary(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay RIP change messages through the RIP changes ingestor.")
+    parser.add_argument("files", nargs="+", help="JSONL (.jsonl/.ndjson) or JSON SNS dump files holding RIP change messages")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"records handed to the ingestor at once (default {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"threads records in a batch are spread over (default {DEFAULT_WORKERS})")
+    parser.add_argument("--change-type", default=DEFAULT_CHANGE_TYPE,
+                        help=f"change type for messages which don't carry SNS attributes (default {DEFAULT_CHANGE_TYPE})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="read from DynamoDB and compute the resulting items, but don't write them")
+    parser.add_argument("--output", help="with --dry-run, write the resulting items here as JSONL (default stdout)")
+    parser.add_argument("--endpoint-url",
+                        help="send DynamoDB calls here instead, e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument("--table-name", default="buildables", help="buildables table name (default buildables)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.endpoint_url:
+        # picked up by every botocore client, including the ones PynamoDB creates
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.endpoint_url
+    os.environ.setdefault("BUILDABLES_TABLE_NAME", args.table_name)
+    os.environ.setdefault("RIP_CHANGES_QUEUE_URL", "")  # nothing is deleted from SQS on replay
+
+    output = None
+    if args.dry_run:
+        output = open(args.output, "w") if args.output else sys.stdout
+
+    try:
+        report = replay(
+            sqs_records=read_sqs_records(args.files, args.change_type),
+            batch_size=args.batch_size,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            output=output,
+        )
+    finally:
+        if output not in (None, sys.stdout):
+            output.close()
+
+    print(json.dumps(report, indent=2, default=str), file=sys.stderr)
+    return 1 if report["failed_records"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,16 @@
+import hashlib
 import json
 
+try:
+    # optional, roughly 2-3x faster than the standard library for RIP sized messages
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+
+_NOT_DECODED = object()
+
+
 def safeget(dct, keys, validate=False):
     for key in keys.split('.'):
         if key in dct:
@@ -15,17 +26,65 @@ def safeget(dct, keys, validate=False):
 
 
 class RipMessageRecord():
+    """
+    An SQS record holding a RIP change that was sent through SNS.
+
+    The SNS envelope (body) is decoded up front so that change_type can be read from its MessageAttributes.
+    The RIP change itself (message) is only decoded the first time something asks for it, so records
+    with a change type we ignore never pay for it.
+    """
+    __slots__ = ("_raw_message", "_message", "_idempotency_key", "change_type", "receipt_handle", "message_id", "sns_message_id")
+
     def __init__(self, raw_json_record):
         body = safeget(raw_json_record, 'body', validate=True)
         if isinstance(body, str):
-            body = json.loads(body)
+            body = json_loads(body)
 
-        self.message = safeget(body, 'Message', validate=True)
-        if isinstance(self.message, str):
-            self.message = json.loads(self.message)
+        self._raw_message   = safeget(body, 'Message', validate=True)
+        self._message       = _NOT_DECODED
+        self._idempotency_key = None
 
         self.change_type    = safeget(body, 'MessageAttributes.changeType.Value')
         self.receipt_handle = safeget(raw_json_record, 'receiptHandle')
+        self.message_id     = safeget(raw_json_record, 'messageId')
+        self.sns_message_id = safeget(body, 'MessageId')
 
-        self.rip_name       = safeget(self.message, 'dimension.name')
-        self.status         = safeget(self.message, 'status')
+    @property
+    def message(self):
+        if self._message is _NOT_DECODED:
+            message = self._raw_message
+            self._message = json_loads(message) if isinstance(message, str) else message
+            self._raw_message = None
+        return self._message
+
+    @property
+    def rip_name(self):
+        return safeget(self.message, 'dimension.name')
+
+    @property
+    def status(self):
+        return safeget(self.message, 'status')
+
+    @property
+    def idempotency_key(self):
+        """The SNS MessageId, which stays the same across SQS redeliveries, or a hash of the message without one."""
+        if self._idempotency_key is None:
+            if self.sns_message_id:
+                self._idempotency_key = self.sns_message_id
+            else:
+                content = json.dumps(self.message, sort_keys=True, separators=(',', ':'))
+                self._idempotency_key = "sha256:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return self._idempotency_key
+
+    def replace_previous_value(self, previous_value):
+        """
+        Swap in another previousValue, e.g. the one from the oldest of the changes this record supersedes.
+        The message is copied, and the idempotency key stays the one of the message as it was delivered.
+        """
+        self.idempotency_key
+        message = dict(self.message)
+        if previous_value is None:
+            message.pop("previousValue", None)
+        else:
+            message["previousValue"] = previous_value
+        self._message = message
@@ -0,0 +1,237 @@
+import datetime
+import os
+from typing import Dict, Optional, Tuple
+
+from dateutil import parser, tz
+from regions_recon_python_common.buildables_dao_models.buildables_versioned_item import BuildablesVersionedItem
+from regions_recon_python_common.buildables_dao_models.region_metadata import RegionMetadata
+from regions_recon_python_common.buildables_dao_models.service_metadata import ServiceMetadata
+from regions_recon_python_common.buildables_ingestor import BuildablesIngestor
+from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, increment_metric
+from regions_recon_python_common.utils.log import get_logger
+
+from regions_recon_lambda.ingest_rip_changes import get_buildables_query, is_in_list_of_ignored_regions, \
+    is_in_list_of_ignored_services
+from regions_recon_lambda.rip_ingestor.attributes_to_buildables_map import get_region_attributes_to_buildables_map, \
+    get_service_attributes_to_buildables_map
+from regions_recon_lambda.rip_ingestor.model_converters import UPDATING_ATTRIBUTES
+from regions_recon_lambda.utils.aws_call_counter import AwsCallCounter
+from regions_recon_lambda.utils.rip_helpers import get_rip_snapshot, get_rip_snapshot_build_time
+from regions_recon_lambda.utils.stage_timings import StageTimings
+
+logger = get_logger()
+
+RECONCILER_UPDATER = "RipSnapshotReconciler"
+UNTRACKED_ACCESSIBILITY_ATTRIBUTES = frozenset(("TEST", "RETAIL", "CLOSING"))
+# Only "false" lets the scheduled run write, anything else just reports the drift
+DRY_RUN_ENV_KEY = "RIP_RECONCILER_DRY_RUN"
+
+
+def reconcile_rip_snapshot(event, context):
+    """
+    Scheduled entry point.  Only reports the drift unless RIP_RECONCILER_DRY_RUN is "false".  Pass
+    {"dryrun": true} or {"dryrun": false} to override that for one run.
+    """
+    if isinstance(event, dict) and 'dryrun' in event:
+        dryrun = bool(event['dryrun'])
+    else:
+        dryrun = is_dry_run_enabled()
+    reconciler = RipSnapshotReconciler(metrics_service_name=context.function_name, dry_run=dryrun)
+    return reconciler.run_workflow()
+
+
+def is_dry_run_enabled() -> bool:
+    return os.environ.get(DRY_RUN_ENV_KEY, "true").lower() != "false"
+
+
+def is_updated_after(stored_item, moment: datetime.datetime) -> bool:
+    """
+    True if the stored item was updated after moment (naive UTC), e.g. by the RIP changes ingestor applying a
+    change the snapshot doesn't have yet.  An updated value we can't read counts as after, so it isn't touched.
+    """
+    updated = stored_item.get("updated")
+    if not updated:
+        return False
+    try:
+        updated_at = parser.isoparse(updated)
+    except (TypeError, ValueError, OverflowError):
+        return True
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(tz.UTC).replace(tzinfo=None)
+    return updated_at > moment
+
+
+def get_model_type(artifact):
+    """The model the RIP changes ingestor writes v0 SERVICE and REGION metadata items with."""
+    return ServiceMetadata if artifact == "SERVICE" else RegionMetadata
+
+
+def map_attributes(map_of_attr_names, new_value) -> dict:
+    return {
+        buildable_item_key: new_value[rip_attribute]
+        for rip_attribute, buildable_item_key in map_of_attr_names.items()
+        if rip_attribute in new_value
+    }
+
+
+def normalize_value(value):
+    """Lists and sets compare by their members, DynamoDB hands back sets for some of what RIP sends as lists."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted(str(item) for item in value)
+    return value
+
+
+def get_attribute_deltas(new_attributes, stored_item) -> dict:
+    """Return the attributes whose snapshot value differs from the stored item."""
+    return {
+        attribute: value
+        for attribute, value in new_attributes.items()
+        if attribute not in UPDATING_ATTRIBUTES and normalize_value(stored_item.get(attribute)) != normalize_value(value)
+    }
+
+
+def is_tracked_region(airport_code, new_value) -> bool:
+    """Same rules the RIP changes ingestor applies before writing a REGION."""
+    if is_in_list_of_ignored_regions(airport_code):
+        return False
+    accessibility_attrs = new_value.get("accessibilityAttributes") or []
+    return not any(item in UNTRACKED_ACCESSIBILITY_ATTRIBUTES for item in accessibility_attrs)
+
+
+class RipSnapshotReconciler(BuildablesIngestor):
+    """
+    Repairs drift between the local RIP snapshot and the buildables SERVICE and REGION metadata items,
+    e.g. after RIP change messages were lost.
+
+    Every item is read with BatchGetItem and diffed on the attributes the RIP changes ingestor maps and its
+    models keep.  Items updated after the snapshot was built are reported, never written, and so is everything
+    when the snapshot doesn't say when it was built.  Otherwise the attributes which differ are saved through
+    the same ServiceMetadata and RegionMetadata models the ingestor writes with, so a repair leaves a version
+    history row like any other change.  Items whose updated changed since we read them, e.g. by a concurrent
+    ingestor write, are left alone.  Items RIP has but buildables doesn't are counted and logged, not created -
+    creating them needs more than the snapshot has (dates, parents).
+    """
+    def __init__(self, metrics_service_name, dry_run=True, snapshot=None, snapshot_built_at=None):
+        self.metrics_service_name = metrics_service_name
+        self.dry_run = dry_run
+        self.snapshot = snapshot
+        self.snapshot_built_at = snapshot_built_at
+        self.metrics = {}
+        self.stage_timings = StageTimings()
+        # (key, attributes to set, the updated value we read)
+        self.items_to_update = []
+        self.drift = []
+
+
+    def run_workflow(self):
+        with AwsCallCounter() as aws_calls:
+            with self.stage_timings.time("load_snapshot"):
+                services, regions = self.load_snapshot()
+                if self.snapshot_built_at is None:
+                    self.snapshot_built_at = get_rip_snapshot_build_time()
+
+            service_keys = {
+                ("SERVICE", self.get_service_instance_value(rip_name=rip_name, version=0)): new_value
+                for rip_name, new_value in services.items()
+                if not is_in_list_of_ignored_services(rip_name)
+            }
+            region_keys = {
+                ("REGION", self.get_region_instance_value(region_ac=airport_code, version=0)): new_value
+                for airport_code, new_value in regions.items()
+                if is_tracked_region(airport_code, new_value)
+            }
+
+            with self.stage_timings.time("read"):
+                stored_items = get_buildables_query().batch_get_items(list(service_keys) + list(region_keys))
+
+            with self.stage_timings.time("diff"):
+                for key, new_value in service_keys.items():
+                    self.reconcile_item(key, map_attributes(get_service_attributes_to_buildables_map(), new_value),
+                                        stored_items.get(key))
+                for key, new_value in region_keys.items():
+                    self.reconcile_item(key, map_attributes(get_region_attributes_to_buildables_map(), new_value),
+                                        stored_items.get(key))
+
+            if not self.dry_run:
+                with self.stage_timings.time("write"):
+                    self.write_to_dynamo()
+
+        self.metrics["items_checked"] = len(service_keys) + len(region_keys)
+        self.metrics["items_drifted"] = len(self.drift)
+        submit_cloudwatch_metrics(metrics_dict=self.metrics, service_name=self.metrics_service_name)
+        self.stage_timings.count("dynamodb_calls", aws_calls.count("dynamodb"))
+        self.stage_timings.emit(self.metrics_service_name)
+
+        logger.info(f"Reconciled {self.metrics['items_checked']} items, {len(self.drift)} drifted (dry run: {self.dry_run})")
+        return {"dryrun": self.dry_run, "metrics": self.metrics, "drift": self.drift}
+
+
+    def load_snapshot(self) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+        if self.snapshot is not None:
+            return self.snapshot
+        return get_rip_snapshot(
+            service_attribute_names=get_service_attributes_to_buildables_map().keys(),
+            region_attribute_names=get_region_attributes_to_buildables_map().keys(),
+        )
+
+
+    def reconcile_item(self, key, new_attributes, stored_item: Optional[dict]):
+        artifact, instance = key
+        model_attributes = get_model_type(artifact).get_attributes()
+        new_attributes = {attribute: value for attribute, value in new_attributes.items() if attribute in model_attributes}
+        if stored_item is None:
+            logger.warning(f"{artifact} '{instance}' is in the RIP snapshot but not in buildables")
+            self.metrics = increment_metric(self.metrics, "missing_in_buildables")
+            return
+
+        deltas = get_attribute_deltas(new_attributes, stored_item)
+        if not deltas:
+            self.metrics = increment_metric(self.metrics, "item_in_sync")
+            return
+
+        drift = {
+            "artifact": artifact,
+            "instance": instance,
+            "changes": {attribute: {"buildables": stored_item.get(attribute), "rip": value} for attribute, value in deltas.items()},
+        }
+        self.drift.append(drift)
+
+        if self.snapshot_built_at is None:
+            logger.info(f"{artifact} '{instance}' differs from RIP, but the snapshot's build time is unknown: {deltas}")
+            drift["skipped"] = "snapshot_build_time_unknown"
+            self.metrics = increment_metric(self.metrics, "snapshot_build_time_unknown")
+            return
+
+        if is_updated_after(stored_item, self.snapshot_built_at):
+            logger.info(f"{artifact} '{instance}' differs from RIP, but was updated after the snapshot was built: {deltas}")
+            drift["skipped"] = "updated_after_snapshot"
+            self.metrics = increment_metric(self.metrics, "updated_after_snapshot")
+            return
+
+        logger.info(f"{artifact} '{instance}' drifted from RIP: {deltas}")
+        self.metrics = increment_metric(self.metrics, f"{artifact.lower()}_drift_repaired")
+        self.items_to_update.append((key, deltas, stored_item.get("updated")))
+
+
+    def write_to_dynamo(self):
+        """Save the drifted attributes of each item through its model, unless something else updated it since we read it."""
+        updated = datetime.datetime.utcnow().isoformat()
+        updating_agent = self.get_updating_agent_value().get("updating_agent")
+        items_written = 0
+        for (artifact, instance), deltas, stored_updated in self.items_to_update:
+            # backfilled with the item as it is now, so only the drifted attributes change
+            model = get_model_type(artifact).create_and_backfill(artifact=artifact, instance=instance, **deltas)
+            if model.updated != stored_updated:
+                logger.info(f"{artifact} '{instance}' was updated while reconciling, leaving it alone")
+                self.metrics = increment_metric(self.metrics, "concurrent_update_skipped")
+                continue
+
+            if isinstance(model, BuildablesVersionedItem) and model.updater:
+                model.set_updater_on_version_increment(RECONCILER_UPDATER, updating_agent)
+            else:
+                model.updated, model.updater, model.updating_agent = updated, RECONCILER_UPDATER, updating_agent
+            model.save()
+            items_written += 1
+
+        self.metrics["ddb_items_written"] = items_written
+        self.items_to_update = []
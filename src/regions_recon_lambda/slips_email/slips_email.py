@@ -7,17 +7,24 @@ from boto3.dynamodb.conditions import Key, Attr
 from dateutil import parser
 import pytz
 from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, increment_metric
-from regions_recon_python_common.message_multiplexer_helper import MessageMultiplexerHelper, get_mm_endpoint
 from regions_recon_python_common.utils.constants import BUILDABLES_TABLE_NAME
 from regions_recon_python_common.utils.log import get_logger
 from regions_recon_python_common.utils.misc import get_rip_name_from_instance_field
 from regions_recon_lambda.utils.dynamo_query import DynamoQuery
+from regions_recon_lambda.utils.mm_dispatcher import get_mm_dispatcher
 from regions_recon_lambda.slips_email.slips_email_dao import SlipsEmailDAO
 
 
 MESSAGE_GROUP_NAME = "region-slips"
 CONDENSED_DATE_FORMAT = "%Y-%m-%d"
 SLIP_DELTA = 30
+# How far down every plan's history populate_previous_plans reads at once.  Most plans only changed once or
+# twice since the cutoff, so this is usually the only read.
+PREVIOUS_PLAN_VERSIONS_PER_READ = 4
+# When "true", only plans changed since the last mail are read, and compared with a snapshot taken then
+INCREMENTAL_ENV_KEY = "SLIPS_EMAIL_INCREMENTAL"
+# Deleted items never show up in artifact-updated-index, so every so often everything is read again to drop them
+SNAPSHOT_MAX_AGE_ENV_KEY = "SLIPS_EMAIL_SNAPSHOT_MAX_AGE_DAYS"
 NORMALIZED_DATE_FORMAT = "%Y-%m-%d %H:%M %Z"
 
 logger = get_logger(logging.INFO)
@@ -75,7 +82,18 @@ def send_slips_mail_internal(dao, dryrun, metrics):
     unlaunched_regions = dao.get_unlaunched_regions()
     logger.info("Unlaunched regions: {}".format(unlaunched_regions))
 
-    service_items, plan_items = dao.get_services_and_plans()
+    snapshot = dao.get_snapshot() if is_incremental_enabled() else None
+    if is_snapshot_usable(snapshot, updated_cutoff, now):
+        service_items, plan_items, previous_plans = get_services_and_plans_since_snapshot(dao, snapshot)
+        full_read = snapshot['full_read']
+    else:
+        service_items, plan_items = dao.get_services_and_plans()
+        previous_plans = None
+        full_read = now
+    metrics['incremental'] = 0 if previous_plans is None else 1
+
+    # Everything, unlaunched regions too, so that the next run can start from here
+    snapshot_services, snapshot_plans = service_items, plan_items
 
     # Business Logic
 
@@ -89,7 +107,10 @@ def send_slips_mail_internal(dao, dryrun, metrics):
     logger.info("{} REGIONS: {}".format(len(all_regions), all_regions))
 
 
-    populate_previous_plans(dao, services, all_regions, updated_cutoff)
+    if previous_plans is None:
+        populate_previous_plans(dao, services, all_regions, updated_cutoff)
+    else:
+        populate_snapshot_plans(services, previous_plans)
     populate_noplan(services, all_regions)
     populate_has_notes(services, all_regions)
 
@@ -114,7 +135,13 @@ def send_slips_mail_internal(dao, dryrun, metrics):
 
     if not dryrun:
         send_to_messagemultiplexer(mm_params)
-        dao.set_update_cutoff()
+        try:
+            dao.save_snapshot(snapshot_services, snapshot_plans, now, full_read)
+        except Exception:
+            # the next run reads everything again, like before there were snapshots
+            logger.exception("Could not save the slips snapshot")
+        # as of when the plans were read, so the next run picks up anything which changed while this one ran
+        dao.set_update_cutoff(now)
     else:
         logger.info("DRYRUN, nothing sent to Message Multiplexer, high-water-mark in DDB not updated")
 
@@ -122,6 +149,70 @@ def send_slips_mail_internal(dao, dryrun, metrics):
 
 
 
+def is_incremental_enabled():
+    return os.environ.get(INCREMENTAL_ENV_KEY, "false").lower() == "true"
+
+
+def get_snapshot_max_age():
+    return timedelta(days=int(os.environ.get(SNAPSHOT_MAX_AGE_ENV_KEY, "28")))
+
+
+def is_snapshot_usable(snapshot, updated_cutoff, now):
+    """
+    True if the snapshot was taken at the last mail, and everything was read no longer than
+    SLIPS_EMAIL_SNAPSHOT_MAX_AGE_DAYS ago.  Items deleted since the last full read are still in the snapshot.
+    """
+    if snapshot is None:
+        return False
+    if snapshot['updated'] != updated_cutoff:
+        logger.info("Snapshot from {} isn't from the last mail, reading everything".format(date2str(snapshot['updated'])))
+        return False
+    if now - snapshot['full_read'] > get_snapshot_max_age():
+        logger.info("Snapshot was built up from a full read on {}, reading everything".format(date2str(snapshot['full_read'])))
+        return False
+    return True
+
+
+def get_services_and_plans_since_snapshot(dao, snapshot):
+    """
+    The services and plans as they are now, from the snapshot and only the items changed since it was taken.
+    Also returns instance -> plan from the snapshot, for each plan which changed since.
+    """
+    changed_services, changed_plans, removed = dao.get_services_and_plans_updated_since(snapshot['updated'])
+    logger.info("Since the snapshot from {}: {} services and {} plans changed, {} left the plan index".format(
+        date2str(snapshot['updated']), len(changed_services), len(changed_plans), len(removed)))
+
+    services = { service['instance']: service  for service in snapshot['services'] }
+    plans = { plan['instance']: plan  for plan in snapshot['plans'] }
+    for instance in removed:
+        services.pop(instance, None)
+        plans.pop(instance, None)
+
+    services.update((service['instance'], service) for service in changed_services)
+
+    previous_plans = {}
+    for plan in changed_plans:
+        if plan['instance'] in plans:
+            previous_plans[plan['instance']] = plans[plan['instance']]
+        plans[plan['instance']] = plan
+
+    return (list(services.values()), list(plans.values()), previous_plans)
+
+
+def populate_snapshot_plans(services, previous_plans):
+    """
+    The incremental version of populate_previous_plans: each changed plan is compared with the snapshot of
+    it, added to its updates under the version it had then.
+    """
+    for instance, previous in previous_plans.items():
+        service_key = get_rip_name_from_instance_field(instance)
+        region_key = previous.get('belongs_to_instance')
+        updates = none_safe_get(services, [service_key, "regions", region_key])
+        if updates is not None:
+            # never "0", which is the current plan
+            updates[str(max(int(previous.get('version_latest', 1)), 1))] = previous
+
+
 def remove_unlaunched_regions(plan_items, unlaunched_regions):
     """
     Strip out all entries that have belongs_to_instance value that is in unlaunched_regions.
@@ -200,15 +291,16 @@ def find_lowest_version_added(updates):
         return None
 
 
-def add_updates_based_on_cutoff(dao, updates, service_key, region_key, cutoff):
+def add_updates_based_on_cutoff(updates, history, service_key, region_key, versions, cutoff):
+    """
+    Add the plans in history for each of versions, newest first, that were updated since cutoff to updates.
+    Returns True once a version from before the cutoff (or a missing one) shows older ones aren't worth reading.
+    """
     zero_instance = f"{service_key}:v0:{region_key}"
-    highest_version = none_safe_get(updates, ["0", "version_latest"])
-    logger.debug(f"highest update version is: {highest_version}")
-    current_version = highest_version
 
-    while current_version > 0:
+    for current_version in versions:
         # check to see if it should be added
-        item = dao.get_plan(service_key, current_version, region_key)
+        item = history.get(current_version)
         current_item_updated_date = none_safe_get(item, ["updated"])
         current_updated_date_str = date2str(current_item_updated_date)
 
@@ -218,41 +310,66 @@ def add_updates_based_on_cutoff(dao, updates, service_key, region_key, cutoff):
             logger.debug(f"{zero_instance} -- {current_updated_date_str} >= cut-off ({cutoff}): Grabbed previous version {current_version} !!")
         else:
             logger.debug(f"{zero_instance} -- {current_updated_date_str} != cut-off ({cutoff}) or {current_version} not found!  (ignored)")
-            # not worth checking past items since this version isnt within cutoff - exit loop
-            current_version = 0
+            # not worth checking past items since this version isnt within cutoff
+            return True
 
-        current_version = current_version - 1
+    return False
 
 
 def populate_previous_plans(dao, services, all_regions, cutoff):
+    """
+    Add the versions of each plan updated since cutoff, and the one before them, to its updates.  Every
+    plan's history is walked down together, PREVIOUS_PLAN_VERSIONS_PER_READ versions at a time, so each
+    step is one batched read for all of them.
+    """
+    walks = {}  # (service_key, region_key) -> newest version not read yet
     for service_key, service in services.items():
-        logger.debug(f"Collecting data for service {service_key}")
         for region_key in all_regions:
-            zero_instance = "{}:v0:{}".format(service_key, region_key)
             if region_key in service["regions"]:
-                updates = service["regions"][region_key] # This is the global object where all relevent data found is applied
-                logger.debug(f"Here is updates object before application: {updates}")
-
-                add_updates_based_on_cutoff(dao, updates, service_key, region_key, cutoff)
+                highest_version = int(none_safe_get(service["regions"][region_key], ["0", "version_latest"]))
+                logger.debug(f"highest update version of {service_key} in {region_key} is: {highest_version}")
+                if highest_version > 0:
+                    walks[(service_key, region_key)] = highest_version
+
+    while walks:
+        requests = [
+            (service_key, region_key, range(version, max(version - PREVIOUS_PLAN_VERSIONS_PER_READ, 0), -1))
+            for (service_key, region_key), version in walks.items()
+        ]
+        histories = dao.get_plans(requests)
+
+        for service_key, region_key, versions in requests:
+            updates = services[service_key]["regions"][region_key] # This is the global object where all relevent data found is applied
+            done = add_updates_based_on_cutoff(updates, histories[(service_key, region_key)], service_key, region_key, versions, cutoff)
+            if done or versions[-1] == 1:
+                del walks[(service_key, region_key)]
+            else:
+                walks[(service_key, region_key)] = versions[-1] - 1
 
+    # Add the version before the range for date calculations.  These were almost always read above already.
+    previous_versions = {}
+    for service_key, service in services.items():
+        for region_key in all_regions:
+            if region_key in service["regions"]:
+                updates = service["regions"][region_key]
                 logger.debug(f"Updates object gathered after innitial time window calculations: {updates}")
 
-                # Add the version before the range for date calculations
                 found_lowest = find_lowest_version_added(updates)
                 if found_lowest is not None:
                     logger.debug(f"Found lowest version_instance: {found_lowest} - adding version before it for math")
-                    one_lower = found_lowest - 1
-                    item = dao.get_plan(service_key, one_lower, region_key)
-                    updates[str(one_lower)] = item
+                    previous_versions[(service_key, region_key)] = found_lowest - 1
                 else:
                     # was not able to find a version thats not zero - this means there is only version zero
                     # lets add its cooresponding version_latest for math
-                    highest_version = none_safe_get(updates, ["0", "version_latest"])
+                    highest_version = int(none_safe_get(updates, ["0", "version_latest"]))
                     logger.debug(f"Did not find any revisions - adding highest version: {highest_version}")
-                    item = dao.get_plan(service_key, highest_version, region_key)
-                    updates[str(highest_version)] = item
+                    previous_versions[(service_key, region_key)] = highest_version
 
-                logger.debug(f"Updates object gathered after all modifications: {updates}")
+    histories = dao.get_plans([(service_key, region_key, [version]) for (service_key, region_key), version in previous_versions.items()])
+    for (service_key, region_key), version in previous_versions.items():
+        updates = services[service_key]["regions"][region_key]
+        updates[str(version)] = histories[(service_key, region_key)].get(version)
+        logger.debug(f"Updates object gathered after all modifications: {updates}")
 
 
 def populate_noplan(services, all_regions):
@@ -431,8 +548,8 @@ def send_to_messagemultiplexer(params):
         "message_group_name": MESSAGE_GROUP_NAME,
         "params": json.dumps(params)
     }
-    mm_helper = MessageMultiplexerHelper(endpoint=get_mm_endpoint(mm_stage), own_account_number=acct_num)
-    response = mm_helper.perform_operation(operation="send_message", params=mm_arg, convert_message_group_name=True)
+    mm_dispatcher = get_mm_dispatcher(mm_stage, acct_num)
+    response = mm_dispatcher.perform_operation(operation="send_message", params=mm_arg, convert_message_group_name=True)
     logger.info("sent mail! {}".format(response))
 
 
@@ -2,6 +2,8 @@ import os
 import pprint
 import logging
 import json
+import zlib
+from decimal import Decimal
 from datetime import datetime, timezone, timedelta
 from boto3.dynamodb.conditions import Key, Attr
 from dateutil import parser
@@ -9,11 +11,23 @@ import pytz
 from regions_recon_python_common.utils.cloudwatch_metrics_utils import submit_cloudwatch_metrics, increment_metric
 from regions_recon_python_common.utils.constants import BUILDABLES_TABLE_NAME
 from regions_recon_python_common.utils.log import get_logger
+from regions_recon_lambda.utils.constants import CACHE_GZIP_COMPRESSION_LEVEL
 from regions_recon_lambda.utils.dynamo_query import DynamoQuery
+from regions_recon_lambda.utils.plan_history import PlanHistoryReader
 
 CUTOFF_ARTIFACT = 'NOTIFICATION'
 CUTOFF_INSTANCE = "region-slips"
 NORMALIZED_DATE_FORMAT_WITH_SEC = "%Y-%m-%d %H:%M:%S %Z"
+CONDENSED_DATE_FORMAT = "%Y-%m-%d"
+
+# The services and plans as of the last mail, compressed and split over items small enough for DynamoDB.  They
+# have an artifact of their own, so that they don't weigh down the queries other mailers make for NOTIFICATIONs.
+SNAPSHOT_ARTIFACT = 'SLIPS_SNAPSHOT'
+SNAPSHOT_INSTANCE = "region-slips-snapshot"
+SNAPSHOT_CHUNK_BYTES = 350 * 1024
+SNAPSHOT_SERVICE_ATTRIBUTES = ('instance', 'version_instance', 'plan', 'name_sortable', 'name_sales', 'name_marketing', 'name_long')
+SNAPSHOT_PLAN_ATTRIBUTES = ('instance', 'version_instance', 'version_latest', 'plan', 'belongs_to_artifact', 'belongs_to_instance',
+                            'date', 'status', 'confidence', 'note', 'updated', 'updater')
 
 
 logger = get_logger()
@@ -23,6 +37,7 @@ class SlipsEmailDAO():
     def __init__(self):
         self.buildables = DynamoQuery(BUILDABLES_TABLE_NAME)
         self.should_validate = True   # to help with some tests
+        self.plan_history = None
 
 
     def get_update_cutoff(self, minval):
@@ -41,8 +56,8 @@ class SlipsEmailDAO():
         return minval
 
 
-    def set_update_cutoff(self):
-        now_str = datetime.now(timezone.utc).strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)
+    def set_update_cutoff(self, updated=None):
+        now_str = (updated or datetime.now(timezone.utc)).strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)
         self.buildables.update_item(CUTOFF_ARTIFACT, CUTOFF_INSTANCE, updated=now_str)
         logger.info("Updated high-water-mark to {}".format(now_str))
 
@@ -55,6 +70,23 @@ class SlipsEmailDAO():
         return plan
 
 
+    def get_plans(self, requests):
+        """
+        Many plan versions with batched reads, cached for the run.  requests are (service_key, region_key,
+        versions) tuples.  Returns (service_key, region_key) -> {version: plan}, without missing versions.
+        """
+        if self.plan_history is None:
+            self.plan_history = PlanHistoryReader(self.buildables)
+
+        histories = self.plan_history.get_versions(requests)
+        for history in histories.values():
+            # validating changes the plans, so it's done to copies of the cached ones
+            for version, plan in history.items():
+                history[version] = dict(plan)
+            self.validate_plans(history.values())
+        return histories
+
+
     def get_unlaunched_regions(self):
         now = datetime.now(timezone.utc).isoformat()
         items = self.buildables.query(
@@ -94,6 +126,96 @@ class SlipsEmailDAO():
         return (services, plans)
 
 
+    def get_services_and_plans_updated_since(self, since):
+        """
+        The version 0 SERVICE items updated since `since`, separated like get_services_and_plans does.  The
+        instances of items which no longer have a plan are returned too: they've left artifact-plan-index.
+        """
+        # 'updated' isn't written in one format everywhere, so start at the beginning of the day and compare dates
+        items = self.buildables.query(
+            Key('artifact').eq('SERVICE') & Key('updated').gte(since.strftime(CONDENSED_DATE_FORMAT)),
+            None,
+            'artifact-updated-index',
+            Attr('version_instance').eq(0))
+
+        services = []
+        plans = []
+        removed = []
+        for item in items:
+            try:
+                if parser.parse(item['updated']).replace(tzinfo=pytz.UTC) < since:
+                    continue
+            except (KeyError, TypeError, ValueError):
+                pass
+
+            if 'plan' not in item:
+                removed.append(item['instance'])
+            elif item.get('belongs_to_artifact') == 'REGION':
+                plans.append(item)
+            else:
+                services.append(item)
+
+        self.validate_services(services)
+        self.validate_plans(plans)
+
+        return (services, plans, removed)
+
+
+    def get_snapshot(self):
+        """
+        The services and plans saved by save_snapshot(), with when they were read and when the full read the
+        snapshot was built up from was, or None if there's no usable snapshot.
+        """
+        header = self.buildables.get_item(SNAPSHOT_ARTIFACT, SNAPSHOT_INSTANCE, [ 'updated', 'full_read', 'chunk_count', 'checksum' ])
+        if not header or not all(attr in header for attr in ('updated', 'chunk_count', 'checksum')):
+            logger.info("No slips snapshot in Dynamo (artifact=%s, instance=%s).", SNAPSHOT_ARTIFACT, SNAPSHOT_INSTANCE)
+            return None
+
+        try:
+            keys = [ (SNAPSHOT_ARTIFACT, "{}:{}".format(SNAPSHOT_INSTANCE, chunk))  for chunk in range(int(header['chunk_count'])) ]
+            chunks = self.buildables.batch_get_items(keys, [ 'payload' ])
+            payload = b"".join(chunks[key]['payload'].value for key in keys)
+            if zlib.crc32(payload) != int(header['checksum']):
+                # a save which didn't finish, the chunks are a mix of two snapshots
+                logger.warning("Slips snapshot from %s is incomplete, ignoring it.", header['updated'])
+                return None
+
+            snapshot = json.loads(zlib.decompress(payload).decode('utf-8'))
+            self.validate_services(snapshot['services'])
+            self.validate_plans(snapshot['plans'])
+            snapshot['updated'] = parser.parse(header['updated']).replace(tzinfo=pytz.UTC)
+            snapshot['full_read'] = parser.parse(header.get('full_read', header['updated'])).replace(tzinfo=pytz.UTC)
+            return snapshot
+        except (KeyError, TypeError, ValueError, zlib.error):
+            logger.exception("Could not read the slips snapshot from %s, ignoring it.", header['updated'])
+            return None
+
+
+    def save_snapshot(self, services, plans, updated, full_read=None):
+        """
+        full_read is when the services and plans were last all read, if they were brought up to date from an
+        older snapshot since.  It's `updated` for a snapshot of a full read.
+        """
+        snapshot = {
+            'services': [ get_snapshot_item(service, SNAPSHOT_SERVICE_ATTRIBUTES)  for service in services ],
+            'plans': [ get_snapshot_item(plan, SNAPSHOT_PLAN_ATTRIBUTES)  for plan in plans ]
+        }
+        payload = zlib.compress(json.dumps(snapshot, separators=(',', ':'), default=to_snapshot_value).encode('utf-8'),
+                                CACHE_GZIP_COMPRESSION_LEVEL)
+
+        chunks = [ payload[start:start + SNAPSHOT_CHUNK_BYTES]  for start in range(0, len(payload), SNAPSHOT_CHUNK_BYTES) ]
+        for index, chunk in enumerate(chunks):
+            self.buildables.update_item(SNAPSHOT_ARTIFACT, "{}:{}".format(SNAPSHOT_INSTANCE, index), payload=chunk)
+
+        # the header goes last, and its checksum tells a finished save from one which was cut short
+        updated_str = updated.strftime(NORMALIZED_DATE_FORMAT_WITH_SEC)
+        self.buildables.update_item(SNAPSHOT_ARTIFACT, SNAPSHOT_INSTANCE, updated=updated_str, chunk_count=len(chunks),
+                                    checksum=zlib.crc32(payload),
+                                    full_read=(full_read or updated).strftime(NORMALIZED_DATE_FORMAT_WITH_SEC))
+        logger.info("Saved a slips snapshot of {} services and {} plans as of {} ({} bytes in {} chunks)".format(
+            len(services), len(plans), updated_str, len(payload), len(chunks)))
+
+
     def validate_services(self, services):
         if self.should_validate:
             for service in services:
@@ -137,3 +259,15 @@ class SlipsEmailDAO():
         if val is None or len(str(val)) == 0:
             raise ValueError("Attribute {} was not found or empty in object {}".format(attr_name, obj))
         return val
+
+
+def get_snapshot_item(item, attributes):
+    return { attr: item[attr]  for attr in attributes  if attr in item }
+
+
+def to_snapshot_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError("Can't put {!r} in a slips snapshot".format(value))
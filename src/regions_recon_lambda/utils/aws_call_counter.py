@@ -0,0 +1,59 @@
+import threading
+from collections import Counter
+
+from botocore.client import BaseClient
+
+
+class AwsCallCounter():
+    """
+    Context manager which counts every AWS API call made through botocore while it is active.
+
+    Calls are counted per (service, operation), e.g. ("dynamodb", "BatchGetItem").  This covers boto3
+    clients and resources as well as PynamoDB models, since they all end up in BaseClient._make_api_call.
+    Retries made inside botocore aren't counted separately.
+    """
+    _lock = threading.Lock()
+    _active_counters = []
+    _original_make_api_call = None
+
+    def __init__(self):
+        self.calls = Counter()
+
+    def __enter__(self):
+        with AwsCallCounter._lock:
+            if not AwsCallCounter._active_counters:
+                AwsCallCounter._install()
+            AwsCallCounter._active_counters.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with AwsCallCounter._lock:
+            AwsCallCounter._active_counters.remove(self)
+            if not AwsCallCounter._active_counters:
+                AwsCallCounter._uninstall()
+
+    def count(self, service_name=None):
+        """Total calls, optionally for just one service."""
+        return sum(calls for (service, _), calls in self.calls.items() if service_name in (None, service))
+
+    def _record(self, service_name, operation_name):
+        with AwsCallCounter._lock:
+            self.calls[(service_name, operation_name)] += 1
+
+    @classmethod
+    def _install(cls):
+        original_make_api_call = BaseClient._make_api_call
+        cls._original_make_api_call = original_make_api_call
+
+        def counting_make_api_call(client, operation_name, api_params):
+            service_name = client.meta.service_model.service_name
+            for counter in list(cls._active_counters):
+                counter._record(service_name, operation_name)
+            return original_make_api_call(client, operation_name, api_params)
+
+        BaseClient._make_api_call = counting_make_api_call
+
+    @classmethod
+    def _uninstall(cls):
+        BaseClient._make_api_call = cls._original_make_api_call
+        cls._original_make_api_call = None
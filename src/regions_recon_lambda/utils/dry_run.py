@@ -0,0 +1,109 @@
+import threading
+from collections import Counter
+from types import SimpleNamespace
+
+WRITE_OPERATIONS = ("put_item", "update_item", "delete_item")
+CLIENT_WRITE_OPERATIONS = WRITE_OPERATIONS + ("transact_write_items", "batch_write_item")
+# Message Multiplexer operations which don't change anything, so a dry run can still make them
+MM_READ_OPERATIONS = ("get_message_group",)
+
+
+class DryRunTable():
+    """
+    Wraps a boto3 DynamoDB Table so that reads still go to the table, but writes are only recorded in
+    self.writes as the params they would have been made with, one per item.  Writes made through
+    table.meta.client are recorded too.
+
+    self.write_calls counts the write calls a real run would have made, by operation.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.meta = _DryRunMeta(table.meta, self)
+        self.writes = []
+        self.write_calls = Counter()
+
+
+    def __getattr__(self, name):
+        if name in WRITE_OPERATIONS:
+            return lambda **params: self._record(name, params)
+        return getattr(self.table, name)
+
+
+    def _record(self, operation, params):
+        self.write_calls[operation] += 1
+        if operation == "transact_write_items":
+            for transact_item in params["TransactItems"]:
+                (action, item_params), = transact_item.items()
+                self.writes.append(dict(item_params, operation=operation, action=action))
+        elif operation == "batch_write_item":
+            for table_name, requests in params["RequestItems"].items():
+                for request in requests:
+                    (action, item_params), = request.items()
+                    self.writes.append(dict(item_params, operation=operation, action=action, TableName=table_name))
+        else:
+            self.writes.append(dict(params, operation=operation))
+        return {}
+
+
+class _DryRunMeta():
+    def __init__(self, meta, dry_run_table):
+        self._meta = meta
+        self.client = _DryRunClient(meta.client, dry_run_table)
+
+
+    def __getattr__(self, name):
+        return getattr(self._meta, name)
+
+
+class _DryRunClient():
+    def __init__(self, client, dry_run_table):
+        self._client = client
+        self._dry_run_table = dry_run_table
+
+
+    def __getattr__(self, name):
+        if name in CLIENT_WRITE_OPERATIONS:
+            return lambda **params: self._dry_run_table._record(name, params)
+        return getattr(self._client, name)
+
+
+class DryRunMessageMultiplexer():
+    """
+    Wraps a MessageMultiplexerHelper so that nothing is created, updated or sent.  Those operations are
+    only recorded in self.operations.  Message groups are still looked up, so the MM setup a real run
+    would need is what gets recorded.
+
+    self.calls counts every operation a real run would have made, by operation.  Safe to share between the
+    threads of an MMDispatcher.
+    """
+    def __init__(self, mm_helper):
+        self.mm_helper = mm_helper
+        self.operations = []
+        self.calls = Counter()
+        self.created_message_group_arns = set()
+        self.lock = threading.Lock()
+
+
+    def get_own_message_group_arn(self, message_group_name):
+        return self.mm_helper.get_own_message_group_arn(message_group_name=message_group_name)
+
+
+    def perform_operation(self, operation, params, **kwargs):
+        with self.lock:
+            self.calls[operation] += 1
+            created = operation == "get_message_group" and params["message_group_arn"] in self.created_message_group_arns
+
+        if created:
+            # a group this dry run would have created, which would start out without targets
+            return SimpleNamespace(message_group=SimpleNamespace(targets={}))
+        if operation in MM_READ_OPERATIONS:
+            return self.mm_helper.perform_operation(operation=operation, params=params, **kwargs)
+
+        message_group_arn = None
+        if operation == "create_message_group":
+            message_group_arn = self.get_own_message_group_arn(params["message_group_name"])
+        with self.lock:
+            if message_group_arn:
+                self.created_message_group_arns.add(message_group_arn)
+            self.operations.append({"operation": operation, "params": params})
+        return None
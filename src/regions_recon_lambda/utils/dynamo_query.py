@@ -1,5 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 
+BATCH_GET_ITEM_MAX_KEYS = 100
+BATCH_GET_ITEM_MAX_ATTEMPTS = 5
+BATCH_GET_ITEM_RETRY_BASE_SECONDS = 0.05
+
+
+def batch_get_table_items(table, keys, project_fields=None, consistent_read=False, max_workers=1):
+    """
+    DynamoQuery.batch_get_items for any boto3 Table resource.  With max_workers > 1 the 100 key chunks are
+    fetched in parallel; they share the table's client, which unlike the resource is thread safe.
+    """
+    if project_fields:
+        project_fields = list(dict.fromkeys(['artifact', 'instance', *project_fields]))
+
+    unique_keys = list(dict.fromkeys(keys))  # BatchGetItem rejects duplicate keys
+    chunks = [unique_keys[start:start + BATCH_GET_ITEM_MAX_KEYS] for start in range(0, len(unique_keys), BATCH_GET_ITEM_MAX_KEYS)]
+
+    def get_chunk(chunk):
+        return _batch_get_chunk(table.meta.client, table.name, chunk, project_fields, consistent_read)
+
+    if max_workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            chunk_items = list(executor.map(get_chunk, chunks))
+    else:
+        chunk_items = [get_chunk(chunk) for chunk in chunks]
+
+    items = {}
+    for chunk in chunk_items:
+        for item in chunk:
+            items[(item['artifact'], item['instance'])] = item
+    return items
+
+
+def _batch_get_chunk(client, table_name, keys, project_fields, consistent_read):
+    keys_and_attributes = {
+        'Keys': [ {'artifact': artifact, 'instance': instance} for artifact, instance in keys ],
+        'ConsistentRead': consistent_read,
+    }
+    _add_project_fields_to_dict(keys_and_attributes, project_fields)
+    request_items = {table_name: keys_and_attributes}
+
+    items = []
+    for attempt in range(BATCH_GET_ITEM_MAX_ATTEMPTS):
+        # the resource's client accepts and returns plain python types, just like the table does
+        response = client.batch_get_item(RequestItems=request_items)
+        items.extend(response['Responses'].get(table_name, []))
+
+        request_items = response.get('UnprocessedKeys')
+        if not request_items:
+            return items
+        time.sleep(BATCH_GET_ITEM_RETRY_BASE_SECONDS * (2 ** attempt))
+
+    raise RuntimeError(f"BatchGetItem on {table_name} still had unprocessed keys after {BATCH_GET_ITEM_MAX_ATTEMPTS} attempts")
+
+
+def _add_project_fields_to_dict(dict, project_fields):
+    if project_fields:
+        project_names = [ '#{}'.format(field_name) for field_name in project_fields ] # convert [ 'a', 'b' ] into [ '#a', '#b' ]
+        project_names_str = ", ".join(project_names)
+        project_names_dict = { '#{}'.format(field_name): field_name for field_name in project_fields } # convert [ 'a', 'b' ] into { '#a': 'a', '#b': 'b' }
+        dict['ProjectionExpression'] = project_names_str
+        dict['ExpressionAttributeNames'] = project_names_dict
+
+
 class DynamoQuery():
     def __init__(self, table_name):
         self.table_name = table_name
@@ -29,6 +95,18 @@ class DynamoQuery():
         return items
 
 
+    def query_first(self, key_condition, project_fields=None, index_name=None):
+        """Return the first item matching key_condition (or None), reading at most one item."""
+        query_params = dict(KeyConditionExpression=key_condition, Limit=1)
+        self._add_project_fields_to_dict(query_params, project_fields)
+
+        if index_name:
+            query_params['IndexName'] = index_name
+
+        items = self.table.query(**query_params)[u'Items']
+        return items[0] if items else None
+
+
     def get_item(self, artifact, instance, project_fields=None):
         query_params = {
             'Key': {
@@ -41,6 +119,17 @@ class DynamoQuery():
         return response.get('Item')
 
 
+    def batch_get_items(self, keys, project_fields=None, consistent_read=False, max_workers=1):
+        """
+        Fetch many items with BatchGetItem, 100 keys per call, retrying any UnprocessedKeys.
+
+        keys is an iterable of (artifact, instance) tuples.  Returns a dict of (artifact, instance) -> item;
+        keys which don't exist in the table are not in the returned dict.
+        """
+        return batch_get_table_items(self.table, keys, project_fields=project_fields,
+                                     consistent_read=consistent_read, max_workers=max_workers)
+
+
     def update_item(self, artifact, instance, **kwargs):
         update_parts = [ 'SET {}=:{}'.format(key, key)  for key in kwargs ]
         expr_parts   = { ':{}'.format(key): val  for key,val in kwargs.items() }
@@ -56,9 +145,4 @@ class DynamoQuery():
 
 
     def _add_project_fields_to_dict(self, dict, project_fields):
-        if project_fields:
-            project_names = [ '#{}'.format(field_name) for field_name in project_fields ] # convert [ 'a', 'b' ] into [ '#a', '#b' ]
-            project_names_str = ", ".join(project_names)
-            project_names_dict = { '#{}'.format(field_name): field_name for field_name in project_fields } # convert [ 'a', 'b' ] into { '#a': 'a', '#b': 'b' }
-            dict['ProjectionExpression'] = project_names_str
-            dict['ExpressionAttributeNames'] = project_names_dict
+        _add_project_fields_to_dict(dict, project_fields)
@@ -185,6 +185,65 @@ LAUNCH_PAST_4_DAYS_TEMPLATE = """
 """
 
 
+LAUNCH_DIGEST_TEMPLATE = """
+<p style="font: 11pt Calbri, sans-serif;">Hello,</p>
+
+<p style="font: 11pt Calbri, sans-serif;">The following scheduled launches need your attention. If launch information is no longer correct, please update it in Recon by selecting the radio button next to the applicable region(s) requiring updates. Please provide details on the change, including any blocking services or features by name.</p>
+
+{{#sections}}
+<p style="font: bold 12pt Calbri, sans-serif;"><a href="https://web.recon.region-services.aws.a2z.com/services/{{name_rip}}">{{name_long}}</a></p>
+
+<p style="font: 11pt Calbri, sans-serif;">{{instructions}}</p>
+
+<table style="font: 11pt Calbri, sans-serif; border: 1px solid #ccc; border-collapse: collapse; width: 100%">
+<tbody>
+
+<tr>
+    <th style="padding:0.75pt;border:1pt solid #CCCCCC; width: 19em">
+        <div style="text-align:center;margin:0" align="left">Region</div>
+    </th>
+    <th style="padding:0.75pt;border:1pt solid #CCCCCC; width: 19em">
+        <div style="text-align:center;margin:0" align="left">Date</div>
+    </th>
+    <th style="padding:0.75pt;border:1pt solid #CCCCCC; width: 19em">
+        <div style="text-align:center;margin:0" align="left">Note</div>
+    </th>
+    <th style="padding:0.75pt;border:1pt solid #CCCCCC; width: 19em">
+        <div style="text-align:center;margin:0" align="left">Last updated date</div>
+    </th>
+    <th style="padding:0.75pt;border:1pt solid #CCCCCC; width: 19em">
+        <div style="text-align:center;margin:0" align="left">Last updated by</div>
+    </th>
+</tr>
+
+{{#regions}}
+<tr style="border: 0px">
+    <td style="border: 1px solid #ccc; width: 5em"><a href="https://web.recon.region-services.aws.a2z.com/regions/{{region}}/{{name_rip}}">{{region}}</a></td>
+    <td style="border: 1px solid #ccc;">{{date}}</td>
+    <td style="border: 1px solid #ccc;">{{note}}</td>
+    <td style="border: 1px solid #ccc;">{{updated}}</td>
+    <td style="border: 1px solid #ccc;">{{updater}}</td>
+</tr>
+{{/regions}}
+
+</tbody>
+</table>
+{{/sections}}
+
+</body>
+"""
+
+
+# The paragraph above each service's table in a digest, by notification state value
+DIGEST_INSTRUCTIONS = {
+    1: "Please ensure the following launch information is accurate. If a scheduled launch date passes without update, an escalation will be sent to {l8} > {l10}.",
+    2: "Please ensure the following launch information is accurate. If a scheduled launch date passes without update, an escalation will be sent to {l8} > {l10}.",
+    3: "The following launches are scheduled for today. If your launch is successful, please update the RIP status to GA. If this information is not updated by 4pm UTC, escalations will be sent to {l8} > {l10}.",
+    4: "The following launch information is outdated. If your launch was successful, please update the RIP status to GA. If this information is not updated by 4pm UTC, escalations will be sent to {l8} > {l10}.",
+    5: "The following launch information is outdated. If your launch was successful, please update the RIP status to GA. If this information is not updated by 4pm UTC, escalations will continue to be sent to {l10} every 4 days.",
+}
+
+
 FALLBACK_HEADER = """
 <p style="font: 11pt Calbri, sans-serif;">Global Product Expansion Team,</p>
 
@@ -204,5 +263,11 @@ def get_past_1_days_template():
 def get_past_4_days_template():
     return LAUNCH_PAST_4_DAYS_TEMPLATE
 
+def get_digest_template():
+    return LAUNCH_DIGEST_TEMPLATE
+
+def get_digest_instructions(notif_state, l8, l10):
+    return DIGEST_INSTRUCTIONS[notif_state].format(l8=l8, l10=l10)
+
 def get_fallback_header():
     return FALLBACK_HEADER
\ No newline at end of file
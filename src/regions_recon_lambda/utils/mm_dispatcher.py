@@ -0,0 +1,155 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+import coral
+from regions_recon_python_common.message_multiplexer_helper import MessageMultiplexerHelper, get_mm_endpoint
+from regions_recon_python_common.utils.log import get_logger
+
+from regions_recon_lambda.utils.stage_timings import StageTimings
+
+MM_DISPATCH_WORKERS_ENV_KEY = "MM_DISPATCH_WORKERS"
+DEFAULT_MM_DISPATCH_WORKERS = 4
+MM_SEND_MAX_ATTEMPTS = 3
+MM_SEND_RETRY_BASE_SECONDS = 0.5
+# upper bounds of the send latency histogram buckets, in milliseconds
+SEND_LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000)
+
+logger = get_logger()
+
+# Module scope so that they're reused while the Lambda container stays warm, one per (stage, account)
+_DISPATCHERS: Dict[Tuple[str, str], "MMDispatcher"] = {}
+
+
+def get_mm_dispatcher(mm_stage: str = None, account_id: str = None) -> "MMDispatcher":
+    """The dispatcher for the stage and account, MM_STAGE and ACCOUNT_ID by default, made on first use."""
+    key = (mm_stage or os.environ["MM_STAGE"], account_id or os.environ["ACCOUNT_ID"])
+    if key not in _DISPATCHERS:
+        mm_helper = MessageMultiplexerHelper(endpoint=get_mm_endpoint(key[0]), own_account_number=key[1])
+        _DISPATCHERS[key] = MMDispatcher(mm_helper)
+    return _DISPATCHERS[key]
+
+
+def as_mm_dispatcher(mm_helper) -> "MMDispatcher":
+    """Wrap a helper in a dispatcher, unless it already is one."""
+    return mm_helper if isinstance(mm_helper, MMDispatcher) else MMDispatcher(mm_helper)
+
+
+def get_max_workers() -> int:
+    return max(1, int(os.environ.get(MM_DISPATCH_WORKERS_ENV_KEY, DEFAULT_MM_DISPATCH_WORKERS)))
+
+
+def get_latency_bucket(latency_ms: float) -> str:
+    for upper_bound in SEND_LATENCY_BUCKETS_MS:
+        if latency_ms <= upper_bound:
+            return "mm_send_le_{}ms".format(upper_bound)
+    return "mm_send_gt_{}ms".format(SEND_LATENCY_BUCKETS_MS[-1])
+
+
+class MMDispatcher():
+    """
+    Sends through one MessageMultiplexerHelper, and can be used wherever one is.
+
+    send_message operations are retried with jittered backoff, and their latencies collected for
+    take_timings().  Message group ARNs are cached, they only depend on the group name.
+
+    submit() runs work for a message group on a pool of up to MM_DISPATCH_WORKERS threads.  Work for the
+    same group runs in the order it was submitted, one at a time, so that e.g. a target's template is never
+    changed while a message using the old one is still being sent.
+    """
+    def __init__(self, mm_helper, max_workers=None):
+        self.mm_helper = mm_helper
+        self.max_workers = max_workers or get_max_workers()
+        self.executor = None
+        self.message_group_arns = {}
+        self.group_queues = {}
+        self.timings = StageTimings()
+        self.lock = threading.Lock()
+
+
+    def get_own_message_group_arn(self, message_group_name):
+        if message_group_name not in self.message_group_arns:
+            self.message_group_arns[message_group_name] = self.mm_helper.get_own_message_group_arn(message_group_name=message_group_name)
+        return self.message_group_arns[message_group_name]
+
+
+    def perform_operation(self, operation, params, **kwargs):
+        if operation == "send_message":
+            return self._send_with_retries(params, kwargs)
+        return self.mm_helper.perform_operation(operation=operation, params=params, **kwargs)
+
+
+    def send_message(self, message_group_name, params):
+        return self.perform_operation(operation="send_message", convert_message_group_name=True,
+                                      params={"message_group_name": message_group_name, "params": params})
+
+
+    def submit(self, message_group_name, work: Callable) -> Future:
+        """Run work() on the pool after everything submitted for message_group_name before it."""
+        future = Future()
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            queue = self.group_queues.setdefault(message_group_name, deque())
+            queue.append((work, future))
+            if len(queue) == 1:
+                self.executor.submit(self._run_group, message_group_name)
+        return future
+
+
+    def take_timings(self) -> StageTimings:
+        """Send latencies, retries and failures since the last call, with a histogram of the latencies."""
+        with self.lock:
+            timings, self.timings = self.timings, StageTimings()
+        for latency_ms in timings.durations_ms.get("mm_send", []):
+            timings.count(get_latency_bucket(latency_ms))
+        return timings
+
+
+    def _run_group(self, message_group_name):
+        while True:
+            with self.lock:
+                work, future = self.group_queues[message_group_name][0]
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(work())
+                except Exception as e:
+                    future.set_exception(e)
+
+            with self.lock:
+                queue = self.group_queues[message_group_name]
+                queue.popleft()
+                if not queue:
+                    del self.group_queues[message_group_name]
+                    return
+
+
+    def _send_with_retries(self, params, kwargs):
+        for attempt in range(MM_SEND_MAX_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                response = self.mm_helper.perform_operation(operation="send_message", params=params, **kwargs)
+                with self.lock:
+                    self.timings.add("mm_send", (time.perf_counter() - start) * 1000)
+                return response
+            except coral.exceptions.CoralClientException:
+                # the request itself is wrong, sending it again won't help
+                self._count("mm_send_failures")
+                raise
+            except Exception:
+                if attempt + 1 == MM_SEND_MAX_ATTEMPTS:
+                    self._count("mm_send_failures")
+                    raise
+                logger.warning("Retrying send to {} after attempt {} failed".format(params.get("message_group_name"), attempt + 1))
+                self._count("mm_send_retries")
+                time.sleep(random.uniform(0, MM_SEND_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+    def _count(self, name):
+        with self.lock:
+            self.timings.count(name)
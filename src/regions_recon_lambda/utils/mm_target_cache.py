@@ -0,0 +1,100 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from boto3.dynamodb.conditions import Key
+from regions_recon_python_common.utils.log import get_logger
+
+MM_TARGET_ARTIFACT = "MM_TARGET"
+
+logger = get_logger()
+
+
+def get_target_params_hash(target_params: dict) -> str:
+    """A stable hash of everything that goes into a Message Multiplexer target (endpoint, template...)."""
+    content = json.dumps(target_params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class MMTargetCache():
+    """
+    Remembers which Message Multiplexer target each message group has, and a hash of the params it was last
+    set up with, so that unchanged targets don't need any MM calls before sending.
+
+    Entries are kept in memory for as long as the Lambda container stays warm.  Once use_table() is called
+    they are also kept in the buildables table under the MM_TARGET artifact, one per message group ARN, and
+    all of them are loaded with a single query the first time the cache is read.  Entries can be read and
+    written from an MMDispatcher's threads: they are only changed under self.lock, and the table is written
+    through its low-level client, which unlike the Table resource is thread safe.
+    """
+    def __init__(self, table=None):
+        self.table = table
+        self.entries = {}
+        self.loaded = table is None
+        self.lock = threading.Lock()
+
+
+    def use_table(self, table) -> None:
+        if table is not self.table:
+            self.table = table
+            self.loaded = False
+
+
+    def get(self, message_group_arn: str) -> Optional[dict]:
+        with self.lock:
+            if not self.loaded:
+                self.load()
+        return self.entries.get(message_group_arn)
+
+
+    def put(self, message_group_arn: str, target_name: str, target_arn: Optional[str], params_hash: str) -> None:
+        entry = {"target_name": target_name, "params_hash": params_hash}
+        if target_arn:
+            entry["target_arn"] = target_arn
+        with self.lock:
+            self.entries[message_group_arn] = entry
+
+        if self.table is None:
+            return
+        try:
+            # the resource's client accepts plain python types, just like the table does
+            self.table.meta.client.put_item(TableName=self.table.name, Item=dict(
+                entry,
+                artifact=MM_TARGET_ARTIFACT,
+                instance=message_group_arn,
+                updated=datetime.now(timezone.utc).isoformat(),
+            ))
+        except Exception:
+            # only costs the MM setup calls again next time
+            logger.exception("Unable to save MM target for {}".format(message_group_arn))
+
+
+    def invalidate(self, message_group_arn: str) -> None:
+        """Forget a message group, e.g. after sending to it failed, so that its target is set up again."""
+        with self.lock:
+            entry = self.entries.pop(message_group_arn, None)
+        if entry is None or self.table is None:
+            return
+        try:
+            self.table.meta.client.delete_item(TableName=self.table.name, Key={"artifact": MM_TARGET_ARTIFACT, "instance": message_group_arn})
+        except Exception:
+            logger.exception("Unable to remove MM target for {}".format(message_group_arn))
+
+
+    def load(self) -> None:
+        query_params = {"KeyConditionExpression": Key("artifact").eq(MM_TARGET_ARTIFACT)}
+        try:
+            while True:
+                response = self.table.query(**query_params)
+                for item in response.get("Items", []):
+                    entry = {key: item[key] for key in ("target_name", "target_arn", "params_hash") if key in item}
+                    self.entries.setdefault(item["instance"], entry)
+                if "LastEvaluatedKey" not in response:
+                    break
+                query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        except Exception:
+            # every target is set up from scratch, like before the cache existed
+            logger.exception("Unable to load MM targets")
+        self.loaded = True
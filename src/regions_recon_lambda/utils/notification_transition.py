@@ -0,0 +1,39 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import pytz
+
+# Plan attribute holding the next day on which the delivery date mailer may have mail to send about it
+NEXT_TRANSITION = "next_notification_transition"
+TRANSITION_DATE_FORMAT = "%Y-%m-%d"
+
+
+def get_transition_today() -> date:
+    """Today as the delivery date mailer counts days left, in US/Pacific."""
+    return datetime.now(pytz.timezone('US/Pacific')).date()
+
+
+def get_next_notification_transition(plan_date, today):
+    """
+    The first day after today on which the delivery date mailer works out a different notification state
+    for plan_date, or on which another PAST_4x reminder is due.  As a TRANSITION_DATE_FORMAT string.
+    """
+    launch_date = datetime.strptime(plan_date, TRANSITION_DATE_FORMAT).date()
+    days_left = (launch_date - today).days
+
+    # LEFT_14, LEFT_7, LEFT_0 and PAST_1 start when days_left reaches 14, 7, 0 and -1
+    for threshold in (14, 7, 0, -1):
+        if days_left > threshold:
+            return (launch_date - timedelta(days=threshold)).strftime(TRANSITION_DATE_FORMAT)
+
+    # after that, PAST_4x every 4 days
+    next_days_past = (-days_left // 4 + 1) * 4
+    return (launch_date + timedelta(days=next_days_past)).strftime(TRANSITION_DATE_FORMAT)
+
+
+def get_plan_transition(plan: dict, today) -> Optional[str]:
+    """The next transition of a plan item, or None for one that won't need mail again.  Raises ValueError for a bad date."""
+    if len(plan["instance"].split(":")) != 3 or plan.get("status") in ("GA", "NOT_PLANNED") or \
+            plan.get("confidence") == "Complete" or not plan.get("date"):
+        return None
+    return get_next_notification_transition(plan["date"], today)
@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from regions_recon_python_common.utils.log import get_logger
+
+# BatchGetItem chunks of 100 keys fetched at once
+DEFAULT_HISTORY_MAX_WORKERS = 4
+
+logger = get_logger()
+
+
+def get_plan_key(service_key: str, version: int, region_key: str) -> Tuple[str, str]:
+    return ("SERVICE", "{}:v{}:{}".format(service_key, version, region_key))
+
+
+class PlanHistoryReader():
+    """
+    Reads versions of service plans, the SERVICE svc:vN:REGION items, through a DynamoQuery's
+    batch_get_items.  Each call fetches every key it's asked for at once, in 100 key chunks, up to
+    max_workers of them in parallel.
+
+    Items are cached for the run, and so are versions which turned out not to exist, so no key is read twice.
+    Callers get the cached items, and shouldn't change them.
+    """
+    def __init__(self, buildables, max_workers=DEFAULT_HISTORY_MAX_WORKERS):
+        self.buildables = buildables
+        self.max_workers = max_workers
+        self.items: Dict[Tuple[str, str], Optional[dict]] = {}
+
+
+    def get_versions(self, requests: Iterable[Tuple[str, str, Iterable[int]]]) -> Dict[Tuple[str, str], Dict[int, dict]]:
+        """
+        requests are (service, region, versions) tuples.  Returns (service, region) -> {version: item} for
+        every request, leaving out versions which don't exist.
+        """
+        requests = [(service_key, region_key, list(versions)) for service_key, region_key, versions in requests]
+
+        missing_keys = [
+            get_plan_key(service_key, version, region_key)
+            for service_key, region_key, versions in requests
+            for version in versions
+            if get_plan_key(service_key, version, region_key) not in self.items
+        ]
+        if missing_keys:
+            found = self.buildables.batch_get_items(missing_keys, max_workers=self.max_workers)
+            for key in missing_keys:
+                self.items[key] = found.get(key)
+            logger.debug("Read {} plan versions, {} of them exist".format(len(set(missing_keys)), len(found)))
+
+        histories = {}
+        for service_key, region_key, versions in requests:
+            history = histories.setdefault((service_key, region_key), {})
+            for version in versions:
+                item = self.items[get_plan_key(service_key, version, region_key)]
+                if item is not None:
+                    history[version] = item
+        return histories
+
+
+    def get_version(self, service_key: str, version: int, region_key: str) -> Optional[dict]:
+        return self.get_versions([(service_key, region_key, [version])])[(service_key, region_key)].get(version)
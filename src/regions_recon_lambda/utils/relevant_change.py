@@ -0,0 +1,34 @@
+from typing import Optional
+
+# Plan attribute holding when a change the service update mailer reports on was last made
+RELEVANT_CHANGE_AT = "relevant_change_at"
+# The plan's updated when the ingestor last checked it for a relevant change; other writers leave it behind
+RELEVANT_CHANGE_CHECKED_AT = "relevant_change_checked_at"
+RELEVANT_CHANGE_ATTRIBUTES = ("date", "confidence", "note")
+
+
+def is_relevant_change(current_item: dict, previous_item: Optional[dict]) -> bool:
+    """
+    True if going from previous_item to current_item changed the date, confidence or note of a plan, or
+    made it GA.  Both are plain attribute dicts.  Changes to anything else, e.g. only the category, don't
+    make for a mail with anything in it.
+    """
+    if previous_item is None:
+        return False
+
+    has_relevant_field_change = any(
+        current_item.get(attribute) != previous_item.get(attribute) for attribute in RELEVANT_CHANGE_ATTRIBUTES
+    )
+
+    current_status = current_item.get("status")
+    has_status_change_to_GA = current_status != previous_item.get("status") and current_status == "GA"
+
+    return has_relevant_field_change or has_status_change_to_GA
+
+
+def has_current_relevant_change_stamp(item: dict) -> bool:
+    """
+    True if the plan's relevant_change_at can be trusted, i.e. nothing wrote the plan since the ingestor
+    stamped it.  item is a plain attribute dict.
+    """
+    return RELEVANT_CHANGE_AT in item and RELEVANT_CHANGE_CHECKED_AT in item and item[RELEVANT_CHANGE_CHECKED_AT] == item.get("updated")
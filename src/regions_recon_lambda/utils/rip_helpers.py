@@ -1,12 +1,19 @@
-from typing import Iterable
+import datetime
+import itertools
+import re
+from enum import Enum
+from typing import Dict, Iterable, Optional, Tuple
 from rip_helper.enums import Status, Visibility
 from rip_helper.exceptions import ServiceNotFoundError
 from rip_helper_local import RIPHelperLocal
 from regions_recon_python_common.utils.log import get_logger
 
+RIP_SNAPSHOT_METAPACKAGE = "RIPDataAllSQLite-1.0"
+
+
 def get_internal_services(service_identifiers: Iterable[str]=[]):
     logger = get_logger()
-    helper = RIPHelperLocal(metapackage="RIPDataAllSQLite-1.0")
+    helper = RIPHelperLocal(metapackage=RIP_SNAPSHOT_METAPACKAGE)
     services = []
 
     # Check in case future use involves grabbing all internal services
@@ -18,4 +25,80 @@ def get_internal_services(service_identifiers: Iterable[str]=[]):
             except ServiceNotFoundError:
                 logger.warning(f"The service identifier, \"{identifier}\", could not be found. {ServiceNotFoundError}")
 
-    return services
\ No newline at end of file
+    return services
+
+
+def to_rip_value(value):
+    """Unwrap rip_helper enums (and lists of them) into the plain strings RIP sends over SNS."""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_rip_value(item) for item in value]
+    return value
+
+
+def get_snapshot_new_value(dimension, rip_attribute_names: Iterable[str]) -> dict:
+    """
+    Read a rip_helper dimension into the same shape as the newValue of a RIP change message, so that the
+    attribute maps used by the RIP changes ingestor apply to it.  rip_helper exposes the camelCase RIP
+    attributes as snake_case properties; attributes the dimension doesn't have are left out.
+    """
+    new_value = {}
+    for rip_attribute_name in rip_attribute_names:
+        property_name = re.sub(r"(?<!^)(?=[A-Z])", "_", rip_attribute_name).lower()
+        value = getattr(dimension, property_name, None)
+        if value is not None:
+            new_value[rip_attribute_name] = to_rip_value(value)
+    return new_value
+
+
+def get_rip_snapshot(service_attribute_names: Iterable[str], region_attribute_names: Iterable[str],
+                     helper=None) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Load every service and region from the local RIP snapshot.
+
+    Returns ({service name: newValue}, {region airport code: newValue}).
+    """
+    helper = helper or RIPHelperLocal(metapackage=RIP_SNAPSHOT_METAPACKAGE)
+    services = {
+        service.name: get_snapshot_new_value(service, service_attribute_names)
+        for service in helper.services()
+    }
+    regions = {
+        region.airport_code: get_snapshot_new_value(region, region_attribute_names)
+        for region in helper.regions()
+    }
+    return services, regions
+
+
+def get_rip_snapshot_build_time(helper=None) -> Optional[datetime.datetime]:
+    """
+    When the local RIP snapshot was built, as a naive UTC datetime, or None if the snapshot doesn't say.
+
+    Taken from the snapshot's own data, as the newest approved date of any service or region in it - the data
+    can't have been built before its newest change.  The files deployed with RIPDataAllSQLite only tell when the
+    Lambda was built, which may be long after the data.
+    """
+    helper = helper or RIPHelperLocal(metapackage=RIP_SNAPSHOT_METAPACKAGE)
+    approved_dates = [
+        to_naive_utc(getattr(dimension, "approved_date", None))
+        for dimension in itertools.chain(helper.services(), helper.regions())
+    ]
+    approved_dates = [approved_date for approved_date in approved_dates if approved_date is not None]
+    return max(approved_dates) if approved_dates else None
+
+
+def to_naive_utc(value) -> Optional[datetime.datetime]:
+    """A datetime, epoch milliseconds (as RIP sends them) or ISO string as a naive UTC datetime, or None."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.datetime.utcfromtimestamp(value / 1000)
+    if isinstance(value, str):
+        try:
+            return to_naive_utc(datetime.datetime.fromisoformat(value))
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,99 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+EMF_NAMESPACE = "RegionsReconLambda"
+
+
+def percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list, None if it is empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageTimings():
+    """
+    Collects how long each stage of a job took, every time it ran.
+
+        timings = StageTimings()
+        with timings.time("backfill"):
+            ...
+
+    Durations are kept in milliseconds so that percentiles can be computed once at the end.
+    """
+    def __init__(self):
+        self.durations_ms: Dict[str, List[float]] = {}
+        self.counts: Dict[str, int] = {}
+
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - start) * 1000)
+
+
+    def add(self, stage: str, duration_ms: float) -> None:
+        self.durations_ms.setdefault(stage, []).append(duration_ms)
+
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Count something which isn't a duration, like the number of DynamoDB calls."""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+
+    def merge(self, other: "StageTimings") -> None:
+        for stage, durations in other.durations_ms.items():
+            self.durations_ms.setdefault(stage, []).extend(durations)
+        for name, value in other.counts.items():
+            self.count(name, value)
+
+
+    def summary(self) -> Dict[str, float]:
+        """Flatten into {stage_p50, stage_p99, stage_total, stage_count, ...} plus the counts."""
+        summary = {}
+        for stage, durations in sorted(self.durations_ms.items()):
+            sorted_durations = sorted(durations)
+            summary[f"{stage}_p50"] = round(percentile(sorted_durations, 50), 3)
+            summary[f"{stage}_p99"] = round(percentile(sorted_durations, 99), 3)
+            summary[f"{stage}_total"] = round(sum(sorted_durations), 3)
+            summary[f"{stage}_count"] = len(sorted_durations)
+        summary.update(self.counts)
+        return summary
+
+
+    def to_emf(self, service_name: str, namespace: str = EMF_NAMESPACE) -> dict:
+        """
+        Build a CloudWatch embedded metric format document, which CloudWatch turns into metrics when it is
+        logged as a single JSON line.
+        """
+        summary = self.summary()
+        metric_definitions = [
+            {"Name": name, "Unit": "Count" if name.endswith("_count") or name in self.counts else "Milliseconds"}
+            for name in summary
+        ]
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["ServiceName"]],
+                    "Metrics": metric_definitions,
+                }],
+            },
+            "ServiceName": service_name,
+            **summary,
+        }
+
+
+    def emit(self, service_name: str, namespace: str = EMF_NAMESPACE) -> None:
+        if not self.durations_ms and not self.counts:
+            return
+        # printed rather than logged, EMF lines have to be bare JSON
+        print(json.dumps(self.to_emf(service_name, namespace)), flush=True)
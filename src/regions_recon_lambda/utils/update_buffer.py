@@ -0,0 +1,107 @@
+import random
+import time
+from typing import Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+from regions_recon_python_common.utils.log import get_logger
+
+# TransactWriteItems takes up to 100 items, smaller chunks keep a conflict or throttle from redoing as much
+TRANSACT_WRITE_MAX_ITEMS = 25
+TRANSACT_WRITE_MAX_ATTEMPTS = 5
+TRANSACT_WRITE_RETRY_BASE_SECONDS = 0.1
+RETRYABLE_ERROR_CODES = frozenset((
+    "ThrottlingException", "ProvisionedThroughputExceededException", "RequestLimitExceeded", "InternalServerError",
+))
+RETRYABLE_CANCELLATION_CODES = frozenset(("ThrottlingError", "ProvisionedThroughputExceeded", "TransactionConflict"))
+
+logger = get_logger()
+
+
+def is_retryable_transact_error(error: ClientError) -> bool:
+    code = error.response.get("Error", {}).get("Code")
+    if code in RETRYABLE_ERROR_CODES:
+        return True
+    if code == "TransactionCanceledException":
+        # every item gets a reason, "None" for the ones which were fine
+        reasons = {reason.get("Code") for reason in error.response.get("CancellationReasons", [])} - {"None"}
+        return bool(reasons) and reasons <= RETRYABLE_CANCELLATION_CODES
+    return False
+
+
+def get_update_params(key: dict, attributes: dict) -> dict:
+    """UpdateItem params which set every one of attributes on the item with key."""
+    names = list(attributes)
+    return dict(
+        Key=key,
+        UpdateExpression="set " + ", ".join("#a{0}=:a{0}".format(index) for index in range(len(names))),
+        ExpressionAttributeNames={"#a{}".format(index): name for index, name in enumerate(names)},
+        ExpressionAttributeValues={":a{}".format(index): attributes[name] for index, name in enumerate(names)},
+    )
+
+
+class UpdateBuffer():
+    """
+    Collects attribute updates to items in a table during a run, and writes them at flush() with
+    TransactWriteItems, TRANSACT_WRITE_MAX_ITEMS at a time.
+
+    Updates to the same key are coalesced into one write, later values winning, just as if they had been
+    written one after the other.  BatchWriteItem isn't used because it can only put whole items, which
+    would drop whatever attributes other writers keep on them.
+
+    Throttled or conflicting chunks are retried with backoff.  A chunk which still can't be written is
+    written an item at a time, so one bad item doesn't hold back the rest.
+    """
+    def __init__(self, table, chunk_size=TRANSACT_WRITE_MAX_ITEMS):
+        self.table = table
+        self.chunk_size = chunk_size
+        self.updates: Dict[Tuple[str, str], dict] = {}
+
+
+    def __len__(self):
+        return len(self.updates)
+
+
+    def update(self, key: dict, attributes: dict) -> None:
+        self.updates.setdefault((key["artifact"], key["instance"]), {}).update(attributes)
+
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """Write everything collected so far.  Returns the keys which couldn't be written."""
+        updates = list(self.updates.items())
+        self.updates = {}
+
+        failed_keys = []
+        for start in range(0, len(updates), self.chunk_size):
+            failed_keys += self._write_chunk(updates[start:start + self.chunk_size])
+        if updates:
+            logger.info("Wrote {} buffered updates, {} failed".format(len(updates), len(failed_keys)))
+        return failed_keys
+
+
+    def _write_chunk(self, chunk) -> List[Tuple[str, str]]:
+        transact_items = [
+            {"Update": dict(get_update_params({"artifact": artifact, "instance": instance}, attributes), TableName=self.table.name)}
+            for (artifact, instance), attributes in chunk
+        ]
+
+        for attempt in range(TRANSACT_WRITE_MAX_ATTEMPTS):
+            try:
+                # the resource's client accepts plain python types, just like the table does
+                self.table.meta.client.transact_write_items(TransactItems=transact_items)
+                return []
+            except ClientError as e:
+                if not is_retryable_transact_error(e):
+                    logger.warning("Unable to write {} buffered updates together: {}".format(len(chunk), e))
+                    break
+                # full jitter, so that shards throttled together don't retry together
+                time.sleep(random.uniform(0, TRANSACT_WRITE_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+        failed_keys = []
+        for (artifact, instance), attributes in chunk:
+            params = get_update_params({"artifact": artifact, "instance": instance}, attributes)
+            try:
+                self.table.update_item(**params)
+            except Exception:
+                logger.exception("Unable to write buffered update '{}': ".format(params))
+                failed_keys.append((artifact, instance))
+        return failed_keys
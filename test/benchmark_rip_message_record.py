@@ -0,0 +1,56 @@
+"""
+Micro-benchmark for RipMessageRecord over the RIP messages in test_messages/.
+
+Run from the package root with:  python test/benchmark_rip_message_record.py [iterations]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from regions_recon_lambda.rip_message_record import RipMessageRecord, json_loads  # noqa: E402
+
+TEST_MESSAGES_DIR = os.path.join(os.path.dirname(__file__), '..', 'test_messages')
+
+
+def _sqs_records(change_type):
+    records = []
+    for root, _, files in os.walk(TEST_MESSAGES_DIR):
+        for filename in sorted(files):
+            with open(os.path.join(root, filename), 'r') as input_file:
+                try:
+                    message = json.dumps(json.load(input_file), separators=(',', ':'))
+                except ValueError:
+                    continue  # lambda_test_message.json is a commented template, not a RIP message
+            body = {
+                "Type": "Notification",
+                "Message": message,
+                "MessageAttributes": { "changeType": { "Type": "String", "Value": change_type } },
+            }
+            records.append({ 'messageId': filename, 'receiptHandle': 'handle', 'body': json.dumps(body) })
+    return records
+
+
+def _bench(name, records, read_message, iterations):
+    def run():
+        for record in records:
+            rmr = RipMessageRecord(record)
+            if read_message:
+                rmr.message
+
+    seconds = min(timeit.repeat(run, number=iterations, repeat=5))
+    per_record_us = seconds / (iterations * len(records)) * 1e6
+    print(f"{name:<45} {per_record_us:8.2f} us/record")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"json decoder: {json_loads.__module__}.{json_loads.__name__}")
+    _bench("processed change type (message decoded)", _sqs_records("DimensionChange"), True, iterations)
+    _bench("ignored change type (message never decoded)", _sqs_records("FeatureInstanceChange"), False, iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+from botocore.exceptions import ClientError
+
+from regions_recon_lambda.rip_ingestor.idempotency_ledger import IdempotencyLedger, LEDGER_ARTIFACT
+
+
+@pytest.fixture
+def ledger_query():
+    return Mock()
+
+
+@pytest.fixture
+def ledger(ledger_query):
+    return IdempotencyLedger(ledger_query, ttl_seconds=60)
+
+
+def test_get_applied(ledger, ledger_query):
+    ledger_query.batch_get_items.return_value = {
+        (LEDGER_ARTIFACT, "applied"): {"artifact": LEDGER_ARTIFACT, "instance": "applied", "expires_at": time.time() + 60},
+        (LEDGER_ARTIFACT, "expired"): {"artifact": LEDGER_ARTIFACT, "instance": "expired", "expires_at": time.time() - 60},
+    }
+    assert ledger.get_applied(["applied", "expired", "new"]) == {"applied"}
+    keys, = ledger_query.batch_get_items.call_args[0]
+    assert keys == [(LEDGER_ARTIFACT, "applied"), (LEDGER_ARTIFACT, "expired"), (LEDGER_ARTIFACT, "new")]
+
+
+def test_get_applied_without_keys(ledger, ledger_query):
+    assert ledger.get_applied([]) == set()
+    ledger_query.batch_get_items.assert_not_called()
+
+
+def test_record_applied(ledger, ledger_query):
+    conditional_check_failed = ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+    ledger_query.table.put_item.side_effect = [None, conditional_check_failed]
+    assert ledger.record_applied(["first", "second"]) == 1
+    _, kwargs = ledger_query.table.put_item.call_args
+    assert kwargs["Item"]["artifact"] == LEDGER_ARTIFACT
+    assert kwargs["Item"]["instance"] == "second"
+    assert kwargs["Item"]["expires_at"] > time.time()
+
+
+def test_record_applied_raises_other_errors(ledger, ledger_query):
+    ledger_query.table.put_item.side_effect = ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "PutItem")
+    with pytest.raises(ClientError):
+        ledger.record_applied(["first"])
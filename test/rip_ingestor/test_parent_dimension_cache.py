@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from regions_recon_lambda.rip_ingestor.parent_dimension_cache import ParentDimensionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ParentDimensionCache(positive_ttl_seconds=100, negative_ttl_seconds=10, clock=clock)
+
+
+def test_unknown_parent(cache):
+    assert cache.get("REGION", "IAD") is None
+
+
+@pytest.mark.parametrize("exists", [True, False])
+def test_cached_parent(cache, exists):
+    cache.put("REGION", "IAD", exists)
+    assert cache.get("REGION", "IAD") is exists
+    assert cache.get("SERVICE", "IAD") is None
+
+
+def test_positive_entry_expires(cache, clock):
+    cache.put("SERVICE", "ec2", True)
+    clock.now = 99
+    assert cache.get("SERVICE", "ec2") is True
+    clock.now = 100
+    assert cache.get("SERVICE", "ec2") is None
+
+
+def test_negative_entry_expires_sooner(cache, clock):
+    cache.put("REGION", "TST", False)
+    clock.now = 10
+    assert cache.get("REGION", "TST") is None
+
+
+def test_concurrent_expiry(cache, clock):
+    cache.put("REGION", "IAD", True)
+    clock.now = 100
+    threads = 4
+    barrier = threading.Barrier(threads)
+
+    def clock_after_every_thread_found_the_entry():
+        barrier.wait(timeout=5)
+        return clock.now
+
+    cache.clock = clock_after_every_thread_found_the_entry
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: cache.get("REGION", "IAD"), range(threads)))
+    assert results == [None] * threads
+
+
+def test_clear(cache):
+    cache.put("REGION", "IAD", True)
+    cache.clear()
+    assert cache.get("REGION", "IAD") is None
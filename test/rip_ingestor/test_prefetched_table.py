@@ -0,0 +1,53 @@
+from unittest.mock import Mock
+
+from regions_recon_lambda.rip_ingestor.prefetched_table import PrefetchedTable
+
+
+def _prefetched_table(table):
+    return PrefetchedTable(
+        table=table,
+        prefetched_keys=[("SERVICE", "ec2:v0"), ("SERVICE", "ec2:v0:IAD")],
+        items={("SERVICE", "ec2:v0"): {"artifact": "SERVICE", "instance": "ec2:v0", "plan": "MANDATORY"}},
+    )
+
+
+def test_prefetched_item_is_served_from_memory():
+    table = Mock()
+    prefetched = _prefetched_table(table)
+    response = prefetched.get_item(Key={"artifact": "SERVICE", "instance": "ec2:v0"}, ConsistentRead=False)
+    assert response == {"Item": {"artifact": "SERVICE", "instance": "ec2:v0", "plan": "MANDATORY"}}
+    assert prefetched.hits == 1
+    table.get_item.assert_not_called()
+
+
+def test_prefetched_missing_item():
+    table = Mock()
+    prefetched = _prefetched_table(table)
+    assert prefetched.get_item(Key={"artifact": "SERVICE", "instance": "ec2:v0:IAD"}) == {}
+    table.get_item.assert_not_called()
+
+
+def test_other_keys_go_to_table():
+    table = Mock()
+    prefetched = _prefetched_table(table)
+    key = {"artifact": "REGION", "instance": "IAD:v0"}
+    assert prefetched.get_item(Key=key) is table.get_item.return_value
+    table.get_item.assert_called_once_with(Key=key)
+    assert prefetched.hits == 0
+
+
+def test_everything_else_is_delegated():
+    table = Mock()
+    prefetched = _prefetched_table(table)
+    assert prefetched.batch_writer() is table.batch_writer.return_value
+
+
+def test_added_items_are_served_from_memory():
+    table = Mock()
+    prefetched = _prefetched_table(table)
+    prefetched.add_items([{"artifact": "REGION", "instance": "ARN:v0", "status": "BUILD"},
+                          {"artifact": "SERVICE", "instance": "ec2:v0:IAD", "status": "GA"}])
+    assert prefetched.get_item(Key={"artifact": "REGION", "instance": "ARN:v0"}) == \
+        {"Item": {"artifact": "REGION", "instance": "ARN:v0", "status": "BUILD"}}
+    assert prefetched.get_prefetched_item(("SERVICE", "ec2:v0:IAD")) == {"artifact": "SERVICE", "instance": "ec2:v0:IAD", "status": "GA"}
+    table.get_item.assert_not_called()
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from regions_recon_lambda.rip_ingestor.replay import to_sqs_record, read_sqs_records, batched, replay, parse_args
+from regions_recon_lambda.rip_message_record import RipMessageRecord
+
+os.environ["BUILDABLES_TABLE_NAME"] = "terra is not a good party member"
+os.environ["RIP_CHANGES_QUEUE_URL"] = "http://lol"
+
+RIP_MESSAGE = {"dimension": {"name": "ec2", "type": "SERVICE"}, "status": "APPROVED"}
+
+
+@pytest.mark.parametrize("entry, expected_change_type", [
+    (RIP_MESSAGE, "DimensionChange"),
+    ({"Message": json.dumps(RIP_MESSAGE), "MessageId": "sns-id",
+      "MessageAttributes": {"changeType": {"Type": "String", "Value": "ServiceStatusChange"}}}, "ServiceStatusChange"),
+    ({"Sns": {"Message": json.dumps(RIP_MESSAGE), "MessageId": "sns-id"}}, "DimensionChange"),
+])
+def test_to_sqs_record(entry, expected_change_type):
+    record = RipMessageRecord(to_sqs_record(entry, "file:0"))
+    assert record.message == RIP_MESSAGE
+    assert record.change_type == expected_change_type
+    assert record.message_id in ("file:0", "sns-id")
+
+
+def test_to_sqs_record_keeps_sqs_records():
+    sqs_record = {"messageId": "sqs-id", "body": json.dumps({"Message": RIP_MESSAGE})}
+    assert to_sqs_record(sqs_record, "file:0") == sqs_record
+
+
+def test_read_sqs_records_jsonl_and_dump(tmpdir):
+    jsonl_file = tmpdir.join("changes.jsonl")
+    jsonl_file.write("\n".join(json.dumps(RIP_MESSAGE) for _ in range(3)) + "\n\n")
+    dump_file = tmpdir.join("dump.json")
+    dump_file.write(json.dumps({"Records": [{"Sns": {"Message": json.dumps(RIP_MESSAGE)}}]}))
+
+    records = list(read_sqs_records([str(jsonl_file), str(dump_file)]))
+    assert [record["messageId"] for record in records] == ["changes.jsonl:0", "changes.jsonl:1", "changes.jsonl:2", "dump.json:0"]
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+@patch('regions_recon_lambda.rip_ingestor.replay.AwsCallCounter')
+def test_replay_dry_run(mocked_call_counter):
+    mocked_call_counter.return_value.__enter__.return_value.count.return_value = 6
+    mocked_call_counter.return_value.__enter__.return_value.calls = {}
+    records = [to_sqs_record(RIP_MESSAGE, "file:{}".format(index)) for index in range(3)]
+    output = io.StringIO()
+
+    def process(self, message):
+        self.ddb_items_to_write.append({"artifact": "SERVICE", "instance": "ec2:v0"})
+
+    with patch('regions_recon_lambda.ingest_rip_changes.RipChangesIngestor.process_rip_message', autospec=True, side_effect=process), \
+            patch('regions_recon_lambda.ingest_rip_changes.RipChangesIngestor.prefetch_batch_reads', Mock()):
+        report = replay(records, batch_size=2, workers=1, dry_run=True, output=output)
+
+    assert report["records"] == 3
+    assert report["failed_records"] == 0
+    assert report["dynamodb_calls_per_record"] == 2
+    assert len(output.getvalue().splitlines()) == 3
+
+
+def test_parse_args():
+    args = parse_args(["a.jsonl", "--dry-run", "--workers", "8", "--endpoint-url", "http://localhost:8000"])
+    assert args.files == ["a.jsonl"]
+    assert args.dry_run is True
+    assert args.workers == 8
+    assert args.endpoint_url == "http://localhost:8000"
@@ -277,9 +277,8 @@ def test_create_mm_params():
 
 @patch.dict(os.environ, { 'MM_STAGE': 'beta', 'ACCOUNT_ID': '123' })
 def test_send_to_messagemultiplexer(when):
-    url = slips.get_mm_endpoint('beta')
     mm_mock = mock()
-    when(slips).MessageMultiplexerHelper(endpoint=url, own_account_number='123').thenReturn(mm_mock)
+    when(slips).get_mm_dispatcher('beta', '123').thenReturn(mm_mock)
 
     slips.send_to_messagemultiplexer('params')
 
@@ -321,3 +320,72 @@ def test_find_lowest_version_added():
         "2": {},
     }
     assert slips.find_lowest_version_added(mock_updates) == 2
+
+
+class FakeHistoryDAO():
+    def __init__(self, plans):
+        self.plans = plans
+        self.requests = []
+
+    def get_plans(self, requests):
+        requests = [ (service_key, region_key, list(versions)) for service_key, region_key, versions in requests ]
+        self.requests.append(requests)
+        return {
+            (service_key, region_key): { version: self.plans[version]  for version in versions  if version in self.plans }
+            for service_key, region_key, versions in requests
+        }
+
+
+def test_populate_previous_plans():
+    plans = { version: { 'version_instance': version, 'updated': LOWER_LIMIT + timedelta(days=version - 6) }  for version in range(1, 10) }
+    dao = FakeHistoryDAO(plans)
+    services = { 'svc': { 'regions': { 'ABC': { '0': { 'version_latest': 9 } } } } }
+
+    slips.populate_previous_plans(dao, services, [ 'ABC' ], LOWER_LIMIT)
+
+    # 9 down to 6 were updated since the cut-off, 5 is the one before them
+    assert sorted(services['svc']['regions']['ABC'].keys(), key=int) == [ '0', '5', '6', '7', '8', '9' ]
+    assert dao.requests == [
+        [ ('svc', 'ABC', [ 9, 8, 7, 6 ]) ],
+        [ ('svc', 'ABC', [ 5, 4, 3, 2 ]) ],
+        [ ('svc', 'ABC', [ 5 ]) ],
+    ]
+
+
+@pytest.mark.parametrize("updated, full_read, expected", [
+    ( LOWER_LIMIT, LOWER_LIMIT - timedelta(days=21), True ),
+    ( LOWER_LIMIT - timedelta(days=7), LOWER_LIMIT - timedelta(days=7), False ),
+    # a service the reaper deleted since the full read would still be in it
+    ( LOWER_LIMIT, LOWER_LIMIT - timedelta(days=35), False ),
+])
+def test_is_snapshot_usable(updated, full_read, expected):
+    snapshot = { 'updated': updated, 'full_read': full_read }
+    assert slips.is_snapshot_usable(snapshot, LOWER_LIMIT, LOWER_LIMIT + timedelta(days=7)) is expected
+    assert slips.is_snapshot_usable(None, LOWER_LIMIT, LOWER_LIMIT) is False
+
+
+def test_get_services_and_plans_since_snapshot(when):
+    dao = mock()
+    snapshot = {
+        'updated': LOWER_LIMIT,
+        'services': [ { 'instance': 'svc:v0' }, { 'instance': 'gone:v0' } ],
+        'plans': [ { 'instance': 'svc:v0:ABC', 'date': LOWER_LIMIT }, { 'instance': 'svc:v0:DEF', 'date': LOWER_LIMIT } ]
+    }
+    changed_plan = { 'instance': 'svc:v0:ABC', 'date': LOWER_LIMIT + timedelta(days=40) }
+    new_plan = { 'instance': 'svc:v0:GHI', 'date': LOWER_LIMIT }
+    when(dao).get_services_and_plans_updated_since(LOWER_LIMIT).thenReturn(([], [ changed_plan, new_plan ], [ 'gone:v0' ]))
+
+    services, plans, previous_plans = slips.get_services_and_plans_since_snapshot(dao, snapshot)
+
+    assert services == [ { 'instance': 'svc:v0' } ]
+    assert plans == [ changed_plan, { 'instance': 'svc:v0:DEF', 'date': LOWER_LIMIT }, new_plan ]
+    assert previous_plans == { 'svc:v0:ABC': { 'instance': 'svc:v0:ABC', 'date': LOWER_LIMIT } }
+
+
+def test_populate_snapshot_plans():
+    previous = { 'instance': 'svc:v0:ABC', 'belongs_to_instance': 'ABC', 'version_latest': 3, 'date': LOWER_LIMIT }
+    services = { 'svc': { 'regions': { 'ABC': { '0': { 'version_latest': 5, 'date': LOWER_LIMIT + timedelta(days=40) } } } } }
+
+    slips.populate_snapshot_plans(services, { 'svc:v0:ABC': previous, 'other:v0:ABC': previous })
+
+    assert services['svc']['regions']['ABC']['3'] == previous
@@ -3,6 +3,7 @@ from mockito import mock, ANY, verify
 from dateutil import parser
 import pytz
 from freezegun import freeze_time
+from datetime import timedelta
 from regions_recon_lambda.slips_email.slips_email_dao import SlipsEmailDAO
 from regions_recon_lambda.utils.dynamo_query import DynamoQuery
 
@@ -88,3 +89,61 @@ def test_get_services_and_plans(items, expected_service, expected_plan, when, da
     svc, pln = dao.get_services_and_plans()
     assert svc == expected_service
     assert pln == expected_plan
+
+
+class FakeBinary():
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeBuildables():
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, artifact, instance, **kwargs):
+        self.items.setdefault((artifact, instance), {}).update(kwargs)
+
+    def get_item(self, artifact, instance, project_fields=None):
+        return self.items.get((artifact, instance))
+
+    def batch_get_items(self, keys, project_fields=None):
+        return { key: { 'payload': FakeBinary(self.items[key]['payload']) }  for key in keys  if key in self.items }
+
+
+def test_snapshot_round_trip(monkeypatch):
+    monkeypatch.setattr('regions_recon_lambda.slips_email.slips_email_dao.SNAPSHOT_CHUNK_BYTES', 16)
+    dao = SlipsEmailDAO()
+    dao.buildables = FakeBuildables()
+    services = [ dict(instance='foo:v0', version_instance=0, plan='myplan', name_sales='Foo', description='not kept') ]
+    plans = [ dict(instance='foo:v0:bar', belongs_to_artifact='REGION', belongs_to_instance='bar', plan='myplan',
+                   date=LOWER_LIMIT, updated=LOWER_LIMIT, version_instance=0, version_latest=3) ]
+
+    dao.save_snapshot(services, plans, LOWER_LIMIT)
+    snapshot = dao.get_snapshot()
+
+    assert int(dao.buildables.items[('SLIPS_SNAPSHOT', 'region-slips-snapshot')]['chunk_count']) > 1
+    assert snapshot['updated'] == LOWER_LIMIT
+    assert snapshot['full_read'] == LOWER_LIMIT
+    assert snapshot['services'] == [ dict(instance='foo:v0', version_instance=0, plan='myplan', name_sales='Foo', rip_name='foo', name_pretty='Foo') ]
+    assert snapshot['plans'] == [ dict(plans[0], rip_name='foo') ]
+
+
+def test_snapshot_keeps_full_read():
+    dao = SlipsEmailDAO()
+    dao.buildables = FakeBuildables()
+    full_read = LOWER_LIMIT - timedelta(days=7)
+    dao.save_snapshot([], [], LOWER_LIMIT, full_read)
+
+    snapshot = dao.get_snapshot()
+    assert snapshot['updated'] == LOWER_LIMIT
+    assert snapshot['full_read'] == full_read
+
+
+def test_snapshot_with_mixed_chunks_is_ignored(monkeypatch):
+    monkeypatch.setattr('regions_recon_lambda.slips_email.slips_email_dao.SNAPSHOT_CHUNK_BYTES', 16)
+    dao = SlipsEmailDAO()
+    dao.buildables = FakeBuildables()
+    dao.save_snapshot([], [ dict(instance='foo:v0:bar', belongs_to_instance='bar') ], LOWER_LIMIT)
+    dao.buildables.update_item('SLIPS_SNAPSHOT', 'region-slips-snapshot:0', payload=b'from another save')
+
+    assert dao.get_snapshot() is None
@@ -1,3 +1,4 @@
+import datetime
 import os
 import pytest
 import json
@@ -6,7 +7,9 @@ import unittest.mock
 from regions_recon_python_common.buildables_dao_models.buildables_item import BuildablesItem
 
 from regions_recon_lambda.ingest_rip_changes import ingest_rip_changes, RipChangesIngestor, parent_object_exists, \
-    is_in_list_of_ignored_services, validate_region_item
+    is_in_list_of_ignored_services, validate_region_item, PARENT_DIMENSION_CACHE, coalesce_records, is_noop_change, \
+    partition_records, group_records_by_tier
+from regions_recon_lambda.rip_ingestor.prefetched_table import PrefetchedTable
 from regions_recon_python_common.buildable_item import BuildableService, BuildableRegion
 from regions_recon_lambda.rip_message_record import RipMessageRecord
 from unittest.mock import Mock
@@ -29,6 +32,7 @@ def _create_sns_msg_wrapper(msg, changetype, eventsource):
         }
     }
     return {
+        'messageId': 'msg-{}'.format(hash(msg)),
         'receiptHandle': 'AQEBX2mJ...blahblahblah',
         'body': json.dumps(inner_msg, separators=(',', ':')),   # removes unnecessary whitespace
         'eventSource': eventsource
@@ -108,6 +112,15 @@ def rip_ingestor():
     )
     return ingestor
 
+@pytest.fixture
+def rip_ingestor_batch():
+    ingestor = RipChangesIngestor(
+        event={ 'Records': [ _test_serviceinstance_message(), _test_region_message() ] },
+        metrics_service_name="foo",
+        batch_mode=True,
+    )
+    return ingestor
+
 @pytest.fixture
 def rip_ingestor_integtation():
     ingestor = RipChangesIngestor(
@@ -177,6 +190,28 @@ def test_lambda_entry_point(mocked_class):
     mocked_class.assert_called_with(metrics_service_name=fake_lambda_context.function_name, event=event)
 
 
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_parent_object_exists_uses_cache(mocked_get_buildables_query):
+    PARENT_DIMENSION_CACHE.clear()
+    mocked_get_buildables_query.return_value.query_first.return_value = {"artifact": "REGION", "instance": "IAD:v0"}
+    assert parent_object_exists("REGION", "IAD") is True
+    assert parent_object_exists("REGION", "IAD") is True
+    assert mocked_get_buildables_query.return_value.query_first.call_count == 1
+    PARENT_DIMENSION_CACHE.clear()
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_parent_object_exists_caches_missing_parent(mocked_get_buildables_query):
+    PARENT_DIMENSION_CACHE.clear()
+    mocked_get_buildables_query.return_value.query_first.return_value = None
+    assert parent_object_exists("REGION", "TST") is False
+    assert parent_object_exists("REGION", "TST") is False
+    assert mocked_get_buildables_query.return_value.query_first.call_count == 1
+    _, kwargs = mocked_get_buildables_query.return_value.query_first.call_args
+    assert kwargs["project_fields"] == ["artifact", "instance"]
+    PARENT_DIMENSION_CACHE.clear()
+
+
 def test_get_sqs_client(rip_ingestor):
     with unittest.mock.patch('boto3.client', autospec=True) as mocked_boto_client:
         assert mocked_boto_client.called is False
@@ -195,6 +230,7 @@ def test_delete_sqs_message(rip_ingestor):
 
 @unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
 def test_run_workflow_with_writes(mocked_submit_cloudwatch_metrics, rip_ingestor):
+    rip_ingestor.prefetch_record_reads = unittest.mock.Mock()
     rip_ingestor.write_to_dynamo = unittest.mock.Mock()
     rip_ingestor.process_rip_message = unittest.mock.Mock()
     rip_ingestor.delete_sqs_message = unittest.mock.Mock()
@@ -204,6 +240,7 @@ def test_run_workflow_with_writes(mocked_submit_cloudwatch_metrics, rip_ingestor
     for record in rip_ingestor.records:
         rip_ingestor.delete_sqs_message.assert_any_call(handle=record.receipt_handle)
         rip_ingestor.process_rip_message.assert_any_call(message=record.message)
+        rip_ingestor.prefetch_record_reads.assert_any_call(record)
 
 
 @unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
@@ -248,6 +285,404 @@ def test_run_workflow_titan(mocked_submit_cloudwatch_metrics, rip_ingestor):
     assert 'unknown_dimension_type' not in rip_ingestor.metrics
 
 
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.delete_sqs_message = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": []}
+    assert rip_ingestor_batch.write_to_dynamo.call_count == 1
+    assert mocked_submit_cloudwatch_metrics.call_count == 1
+    assert rip_ingestor_batch.metrics["records_processed"] == 2
+    rip_ingestor_batch.delete_sqs_message.assert_not_called()
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_reports_failed_record(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    failing_record, good_record = rip_ingestor_batch.records
+
+    def process(message):
+        rip_ingestor_batch.service_plan_items_to_write.append(message)
+        if message is failing_record.message:
+            raise ValueError("boom")
+
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock(side_effect=process)
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": [{"itemIdentifier": failing_record.message_id}]}
+    assert rip_ingestor_batch.service_plan_items_to_write == [good_record.message]
+    assert rip_ingestor_batch.metrics["record_processing_failed"] == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_write_failure_fails_records_with_writes(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    with_write, without_write = rip_ingestor_batch.records
+
+    def process(message):
+        if message is with_write.message:
+            rip_ingestor_batch.region_items_to_write.append(message)
+
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock(side_effect=process)
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock(side_effect=Exception("throttled"))
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": [{"itemIdentifier": with_write.message_id}]}
+    assert rip_ingestor_batch.metrics["batch_write_failed"] == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_fails_only_undecodable_record(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    raw_record = _test_serviceinstance_message()
+    body = json.loads(raw_record["body"])
+    body["Message"] = "{ this is not json"
+    raw_record["body"] = json.dumps(body)
+    undecodable = RipMessageRecord(raw_record)
+    good_record = RipMessageRecord(_test_region_message())
+    undecodable.message_id, good_record.message_id = "undecodable", "good"
+    rip_ingestor_batch.records = [undecodable, good_record]
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": [{"itemIdentifier": "undecodable"}]}
+    rip_ingestor_batch.process_rip_message.assert_called_once_with(message=good_record.message)
+    rip_ingestor_batch.prefetch_batch_reads.assert_called_once_with([good_record])
+    assert rip_ingestor_batch.metrics["undecodable_record"] == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_failure_not_from_sqs_raises(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    for record in rip_ingestor_batch.records:
+        record.message_id = None
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock(side_effect=ValueError("boom"))
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    with pytest.raises(RuntimeError):
+        rip_ingestor_batch.run_workflow()
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_prefetch_batch_reads(mocked_get_buildables_query, rip_ingestor_batch):
+    rip_ingestor_batch.get_table = unittest.mock.Mock()
+    metadata = {"artifact": "SERVICE", "instance": "rms-canary-service:v0", "plan": "Globally Expanding - Mandatory"}
+    mocked_get_buildables_query.return_value.batch_get_items.return_value = {("SERVICE", "rms-canary-service:v0"): metadata}
+    rip_ingestor_batch.prefetch_batch_reads(rip_ingestor_batch.records)
+
+    keys, = mocked_get_buildables_query.return_value.batch_get_items.call_args[0]
+    assert ("SERVICE", "rms-canary-service:v0") in keys
+    assert len(keys) == 3  # service instance, its metadata and the region
+    assert rip_ingestor_batch.get_service_metadata("rms-canary-service") == metadata
+    rip_ingestor_batch.get_table.return_value.get_item.assert_not_called()
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_prefetch_batch_reads_failure_falls_back_to_table(mocked_get_buildables_query, rip_ingestor_batch):
+    rip_ingestor_batch.get_table = unittest.mock.Mock()
+    mocked_get_buildables_query.return_value.batch_get_items.side_effect = Exception("throttled")
+    rip_ingestor_batch.prefetch_batch_reads(rip_ingestor_batch.records)
+    assert rip_ingestor_batch.metrics["prefetch_failed"] == 1
+    assert rip_ingestor_batch.get_read_table() is rip_ingestor_batch.get_table.return_value
+
+
+def _record_with_approved_date(message_fn, approved_date):
+    raw_record = message_fn()
+    body = json.loads(raw_record["body"])
+    message = json.loads(body["Message"])
+    message["approvedDate"] = approved_date
+    body["Message"] = json.dumps(message)
+    raw_record["body"] = json.dumps(body)
+    return RipMessageRecord(raw_record)
+
+
+def _record_with_dimension_name(message_fn, name):
+    raw_record = message_fn()
+    body = json.loads(raw_record["body"])
+    message = json.loads(body["Message"])
+    message["dimension"]["name"] = name
+    body["Message"] = json.dumps(message)
+    raw_record["body"] = json.dumps(body)
+    return RipMessageRecord(raw_record)
+
+
+def test_coalesce_records_keeps_newest_per_dimension():
+    older = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    newer = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    region = RipMessageRecord(_test_region_message())
+    to_process, superseded = coalesce_records([newer, region, older])
+    assert to_process == [newer, region]
+    assert superseded == {older: newer}
+
+
+def test_coalesce_records_tie_keeps_last():
+    first = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    second = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    to_process, superseded = coalesce_records([first, second])
+    assert to_process == [second]
+    assert superseded == {first: second}
+
+
+def test_coalesce_records_carries_oldest_previous_value():
+    goes_ga = _record_with_approved_date(_test_serviceinstances_goes_ga_message, 1564454017014)
+    raw_record = _test_serviceinstances_goes_ga_message()
+    body = json.loads(raw_record["body"])
+    message = json.loads(body["Message"])
+    message["approvedDate"] = 1564454017999
+    message["previousValue"]["status"] = "GA"
+    body["Message"] = json.dumps(message)
+    raw_record["body"] = json.dumps(body)
+    stays_ga = RipMessageRecord(raw_record)
+    idempotency_key = stays_ga.idempotency_key
+
+    to_process, superseded = coalesce_records([goes_ga, stays_ga])
+
+    assert to_process == [stays_ga]
+    assert superseded == {goes_ga: stays_ga}
+    assert stays_ga.message["previousValue"]["status"] == "PLANNED"
+    assert stays_ga.message["newValue"]["status"] == "GA"
+    assert stays_ga.idempotency_key == idempotency_key
+
+
+def test_coalesce_records_leaves_unprocessable_records():
+    records = [RipMessageRecord(_test_pending_service_message()), RipMessageRecord(_test_feature_change()),
+               RipMessageRecord(_test_pending_service_message())]
+    to_process, superseded = coalesce_records(records)
+    assert to_process == records
+    assert superseded == {}
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_skips_superseded(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    older = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    newer = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    rip_ingestor_batch.records = [older, newer]
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": []}
+    rip_ingestor_batch.process_rip_message.assert_called_once_with(message=newer.message)
+    assert rip_ingestor_batch.metrics["superseded_change_skipped"] == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_retries_superseded_when_kept_write_fails(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    older = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    newer = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    region = RipMessageRecord(_test_region_message())
+    older.message_id, newer.message_id, region.message_id = "older", "newer", "region"
+    rip_ingestor_batch.records = [older, newer, region]
+    rip_ingestor_batch.ledger = unittest.mock.Mock()
+    rip_ingestor_batch.ledger.get_applied.return_value = set()
+    rip_ingestor_batch.ledger.record_applied.return_value = 0
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+
+    def process(message):
+        if message is newer.message:
+            rip_ingestor_batch.service_plan_items_to_write.append(message)
+
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock(side_effect=process)
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock(side_effect=Exception("throttled"))
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": [{"itemIdentifier": "newer"}, {"itemIdentifier": "older"}]}
+    rip_ingestor_batch.ledger.record_applied.assert_called_once_with([region.idempotency_key])
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_record_workflow_deletes_superseded_after_kept_write(mocked_submit_cloudwatch_metrics, rip_ingestor):
+    older = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    newer = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    rip_ingestor.records = [older, newer]
+    rip_ingestor.prefetch_record_reads = unittest.mock.Mock()
+    rip_ingestor.process_rip_message = unittest.mock.Mock()
+    rip_ingestor.write_to_dynamo = unittest.mock.Mock()
+    rip_ingestor.cleanup_sqs = unittest.mock.Mock()
+    rip_ingestor.run_workflow()
+    rip_ingestor.process_rip_message.assert_called_once_with(message=newer.message)
+    assert rip_ingestor.cleanup_sqs.call_args_list == [unittest.mock.call(newer), unittest.mock.call(older)]
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_record_workflow_keeps_superseded_when_kept_write_fails(mocked_submit_cloudwatch_metrics, rip_ingestor):
+    older = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    newer = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    rip_ingestor.records = [older, newer]
+    rip_ingestor.prefetch_record_reads = unittest.mock.Mock()
+    rip_ingestor.process_rip_message = unittest.mock.Mock()
+    rip_ingestor.write_to_dynamo = unittest.mock.Mock(side_effect=Exception("throttled"))
+    rip_ingestor.cleanup_sqs = unittest.mock.Mock()
+    with pytest.raises(Exception):
+        rip_ingestor.run_workflow()
+    rip_ingestor.cleanup_sqs.assert_not_called()
+
+
+@pytest.mark.parametrize("stored_updated, stored_agent, expected", [
+    ("2099-01-01T00:00:00", "rip", True),
+    ("2000-01-01T00:00:00", "rip", False),
+    ("2099-01-01T00:00:00", "rms", False),
+    ("not a date", "rip", False),
+])
+def test_is_stale_change(stored_updated, stored_agent, expected, rip_ingestor):
+    message = RipMessageRecord(_test_serviceinstance_message()).message
+    key = rip_ingestor.get_prefetch_keys(message)[0]
+    rip_ingestor.read_table = PrefetchedTable(
+        table=Mock(), prefetched_keys=[key], items={key: {"updated": stored_updated, "updating_agent": stored_agent}})
+    rip_ingestor.get_updating_agent_value = Mock(return_value={"updating_agent": "rip"})
+    assert rip_ingestor.is_stale_change(message) is expected
+
+
+def test_is_stale_change_without_prefetch(rip_ingestor):
+    message = RipMessageRecord(_test_serviceinstance_message()).message
+    assert rip_ingestor.is_stale_change(message) is False
+
+
+def test_partition_records_keeps_dimension_together():
+    first = _record_with_approved_date(_test_serviceinstance_message, 1564454017014)
+    second = _record_with_approved_date(_test_serviceinstance_message, 1564454017999)
+    others = [RipMessageRecord(_test_region_message()), RipMessageRecord(_test_new_service_message()),
+              RipMessageRecord(_test_approved_service_message())]
+    partitions = partition_records([first] + others + [second], 3)
+    assert 1 <= len(partitions) <= 3
+    assert sum(len(partition) for partition in partitions) == 5
+    partition_with_first, = [partition for partition in partitions if first in partition]
+    assert partition_with_first.index(first) < partition_with_first.index(second)
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_concurrently(mocked_submit_cloudwatch_metrics):
+    # NewService isn't a change type we process
+    records = [_test_serviceinstance_message(), _test_region_message(), _create_message('new_service.json', 'DimensionChange')]
+    ingestor = RipChangesIngestor(event={'Records': records}, metrics_service_name="foo", batch_mode=True, max_workers=3)
+    ingestor.prefetch_batch_reads = unittest.mock.Mock()
+    ingestor.write_to_dynamo = unittest.mock.Mock()
+
+    def process(self, message):
+        self.service_plan_items_to_write.append(message)
+        self.metrics["service_change"] = self.metrics.get("service_change", 0) + 1
+
+    with unittest.mock.patch.object(RipChangesIngestor, "process_rip_message", autospec=True, side_effect=process):
+        response = ingestor.run_workflow()
+
+    assert response == {"batchItemFailures": []}
+    assert len(ingestor.service_plan_items_to_write) == 3
+    assert ingestor.metrics["service_change"] == 3
+    assert ingestor.write_to_dynamo.call_count == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_batch_workflow_finds_parent_created_in_batch(mocked_submit_cloudwatch_metrics, mocked_get_buildables_query, max_workers):
+    PARENT_DIMENSION_CACHE.clear()
+    mocked_get_buildables_query.return_value.query_first.return_value = None
+    service_in_region = RipMessageRecord(_test_serviceinstance_message())  # rms-canary-service in ARN
+    new_region = _record_with_dimension_name(_test_region_message, "ARN")
+    ingestor = RipChangesIngestor(event={'Records': []}, metrics_service_name="foo", batch_mode=True, max_workers=max_workers)
+    ingestor.records = [service_in_region, new_region]
+    ingestor.prefetch_batch_reads = unittest.mock.Mock()
+    ingestor.get_table = unittest.mock.Mock()
+    ingestor.write_pending_items = unittest.mock.Mock()
+    seen_by_service = []
+
+    def process(self, message):
+        if message["dimension"]["type"] == "REGION":
+            self.pending_read_items.append({"artifact": "REGION", "instance": "ARN:v0", "status": "BUILD"})
+        else:
+            region = self.get_read_table().get_item(Key={"artifact": "REGION", "instance": "ARN:v0"})
+            seen_by_service.append((self.parent_exists("REGION", "ARN"), region["Item"]["status"]))
+
+    with unittest.mock.patch.object(RipChangesIngestor, "process_rip_message", autospec=True, side_effect=process):
+        assert ingestor.run_workflow() == {"batchItemFailures": []}
+
+    assert seen_by_service == [(True, "BUILD")]
+    mocked_get_buildables_query.return_value.query_first.assert_not_called()
+    assert PARENT_DIMENSION_CACHE.get("REGION", "ARN") is True
+    PARENT_DIMENSION_CACHE.clear()
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_parent_exists_does_not_cache_miss_for_parent_in_batch(mocked_get_buildables_query, rip_ingestor_batch):
+    PARENT_DIMENSION_CACHE.clear()
+    mocked_get_buildables_query.return_value.query_first.return_value = None
+    rip_ingestor_batch.batch_dimensions = {("REGION", "ARN")}
+    assert rip_ingestor_batch.parent_exists("REGION", "ARN") is False
+    assert PARENT_DIMENSION_CACHE.get("REGION", "ARN") is None
+    assert rip_ingestor_batch.parent_exists("REGION", "TST") is False
+    assert PARENT_DIMENSION_CACHE.get("REGION", "TST") is False
+    PARENT_DIMENSION_CACHE.clear()
+
+
+def test_group_records_by_tier_puts_parents_first():
+    service_in_region = RipMessageRecord(_test_serviceinstance_message())
+    component_service = RipMessageRecord(_create_message('new_component_service.json', 'DimensionChange'))
+    region = RipMessageRecord(_test_region_message())
+    service = RipMessageRecord(_create_message('new_service.json', 'DimensionChange'))
+    tiers = group_records_by_tier([service_in_region, component_service, region, service])
+    assert tiers == [[region, service], [component_service], [service_in_region]]
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_skips_redelivered_records(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    redelivered, new = rip_ingestor_batch.records
+    rip_ingestor_batch.ledger = unittest.mock.Mock()
+    rip_ingestor_batch.ledger.get_applied.return_value = {redelivered.idempotency_key}
+    rip_ingestor_batch.ledger.record_applied.return_value = 0
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": []}
+    rip_ingestor_batch.process_rip_message.assert_called_once_with(message=new.message)
+    rip_ingestor_batch.ledger.record_applied.assert_called_once_with([new.idempotency_key])
+    assert rip_ingestor_batch.metrics["duplicate_delivery_skipped"] == 1
+
+
+@unittest.mock.patch.dict(os.environ, {"RIP_INGESTOR_IDEMPOTENCY_LEDGER": "true"})
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.DynamoQuery', autospec=True)
+def test_ledger_uses_its_own_table(mocked_dynamo_query):
+    ingestor = RipChangesIngestor(event={'Records': []}, metrics_service_name="foo", batch_mode=True)
+    assert ingestor.ledger.ledger_query is mocked_dynamo_query.return_value
+    mocked_dynamo_query.assert_called_once_with("rip_ingestor_ledger")
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_ledger_failures_are_not_fatal(mocked_submit_cloudwatch_metrics, rip_ingestor_batch):
+    rip_ingestor_batch.ledger = unittest.mock.Mock()
+    rip_ingestor_batch.ledger.get_applied.side_effect = Exception("throttled")
+    rip_ingestor_batch.ledger.record_applied.side_effect = Exception("throttled")
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.write_to_dynamo = unittest.mock.Mock()
+    response = rip_ingestor_batch.run_workflow()
+    assert response == {"batchItemFailures": []}
+    assert rip_ingestor_batch.process_rip_message.call_count == 2
+    assert rip_ingestor_batch.metrics["ledger_read_failed"] == 1
+    assert rip_ingestor_batch.metrics["ledger_write_failed"] == 1
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.submit_cloudwatch_metrics', autospec=True)
+def test_run_batch_workflow_emits_stage_timings_once(mocked_submit_cloudwatch_metrics, rip_ingestor_batch, capsys):
+    rip_ingestor_batch.prefetch_batch_reads = unittest.mock.Mock()
+    rip_ingestor_batch.process_rip_message = unittest.mock.Mock()
+    rip_ingestor_batch.write_pending_items = unittest.mock.Mock()
+    rip_ingestor_batch.run_workflow()
+    emf_lines = [line for line in capsys.readouterr().out.splitlines() if '"_aws"' in line]
+    assert len(emf_lines) == 1
+    document = json.loads(emf_lines[0])
+    for stage in ("parse", "decode", "process_record", "write"):
+        assert f"{stage}_p50" in document
+        assert f"{stage}_p99" in document
+    assert document["records"] == 2
+    assert document["dynamodb_calls"] == 0
+
+
+def test_get_prefetch_keys_ignores_unapproved(rip_ingestor):
+    message = RipMessageRecord(_test_pending_service_message()).message
+    assert rip_ingestor.get_prefetch_keys(message) == []
+
+
 def test_write_to_dynamo(rip_ingestor):
     mock_table = unittest.mock.Mock()
     mock_batch_opener = unittest.mock.Mock()
@@ -286,6 +721,78 @@ def test_process_rip_message_happy_paths(sample_record, expected_metrics, is_pro
     assert mocked_buildable.backfill_item_with_ddb_data.called is is_processable
 
 
+@pytest.mark.parametrize("new_attributes, expected", [
+    ({"status": "GA", "updated": "2021-01-02T00:00:00", "updater": "someone-else"}, True),
+    ({"status": "IA"}, False),
+    ({"status": "GA", "confidence": None}, True),
+    ({"status": "GA", "description": "new"}, False),
+])
+def test_is_noop_change(new_attributes, expected):
+    stored_item = {"status": "GA", "updated": "2021-01-01T00:00:00", "updater": "someone"}
+    assert is_noop_change(new_attributes, stored_item) is expected
+
+
+def test_process_rip_message_skips_noop_write(rip_ingestor):
+    local_item = {"artifact": "SERVICE", "instance": "ec2:v0:IAD", "status": "GA", "updated": "2021-01-02T00:00:00"}
+    mocked_buildable = unittest.mock.Mock()
+    mocked_buildable.local_item = local_item
+    rip_ingestor.get_buildable_service = unittest.mock.Mock(return_value=mocked_buildable)
+    rip_ingestor.read_table = PrefetchedTable(
+        table=Mock(), prefetched_keys=[("SERVICE", "ec2:v0:IAD")],
+        items={("SERVICE", "ec2:v0:IAD"): dict(local_item, updated="2021-01-01T00:00:00")})
+    message = RipMessageRecord(_test_serviceinstance_message()).message
+    rip_ingestor.process_rip_message(message=message)
+    assert rip_ingestor.metrics["noop_write_skipped"] == 1
+    assert mocked_buildable.backfill_item_with_ddb_data.called is False
+    assert rip_ingestor.get_pending_write_counts() == (0, 0, 0, 0)
+
+
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_buildables_query', autospec=True)
+def test_prefetch_record_reads_shares_the_backfill_read(mocked_get_buildables_query, rip_ingestor):
+    record = RipMessageRecord(_test_region_message())
+    key = rip_ingestor.get_prefetch_keys(record.message)[0]
+    local_item = {"artifact": key[0], "instance": key[1], "status": "GA", "updated": "2021-01-02T00:00:00"}
+    mocked_get_buildables_query.return_value.batch_get_items.return_value = {key: dict(local_item, updated="2021-01-01T00:00:00")}
+    rip_ingestor.get_table = unittest.mock.Mock()
+    rip_ingestor.read_table = PrefetchedTable(table=Mock(), prefetched_keys=[], items={})
+    rip_ingestor.prefetch_record_reads(record)
+
+    mocked_buildable = unittest.mock.Mock()
+    mocked_buildable.local_item = local_item
+    assert rip_ingestor.is_noop_write(mocked_buildable) is True
+    assert rip_ingestor.get_read_table().get_item(Key={"artifact": key[0], "instance": key[1]})["Item"]["status"] == "GA"
+    mocked_get_buildables_query.return_value.batch_get_items.assert_called_once_with([key], consistent_read=True)
+    rip_ingestor.get_table.return_value.get_item.assert_not_called()
+
+
+@pytest.mark.parametrize("stored_item, expected", [
+    ({"date": "2021-01-01", "relevant_change_at": "2020-12-01T00:00:00"}, "2021-01-02T00:00:00"),
+    ({"date": "2021-01-02", "relevant_change_at": "2020-12-01T00:00:00"}, "2020-12-01T00:00:00"),
+    (None, "2021-01-02T00:00:00"),
+])
+def test_stamp_relevant_change(stored_item, expected, rip_ingestor):
+    mocked_buildable = unittest.mock.Mock()
+    # backfilled, so the stored stamp is already there
+    mocked_buildable.local_item = {"artifact": "SERVICE", "instance": "ec2:v0:IAD", "date": "2021-01-02",
+                                   "updated": "2021-01-02T00:00:00", "relevant_change_at": "2020-12-01T00:00:00"}
+    rip_ingestor.stamp_relevant_change(mocked_buildable, stored_item)
+    assert mocked_buildable.local_item["relevant_change_at"] == expected
+    assert mocked_buildable.local_item["relevant_change_checked_at"] == "2021-01-02T00:00:00"
+
+
+@pytest.mark.parametrize("status, expected", [
+    ("PLANNED", "2020-02-10"),
+    ("GA", None),
+])
+@unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.get_transition_today', return_value=datetime.date(2020, 2, 3))
+def test_set_next_notification_transition(mocked_get_transition_today, status, expected, rip_ingestor):
+    mocked_buildable = unittest.mock.Mock()
+    mocked_buildable.local_item = {"artifact": "SERVICE", "instance": "ec2:v0:IAD", "date": "2020-02-17", "status": status,
+                                   "next_notification_transition": "2020-02-03"}
+    rip_ingestor.set_next_notification_transition(mocked_buildable)
+    assert mocked_buildable.local_item["next_notification_transition"] == expected
+
+
 @unittest.mock.patch('regions_recon_lambda.ingest_rip_changes.validate_region_item', autospec=True)
 def test_process_rip_message_no_matching_buildable_region(mocked_validate_region_item, rip_ingestor):
     test_message = {
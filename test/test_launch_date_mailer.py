@@ -6,10 +6,12 @@ from regions_recon_python_common.buildables_dao_models.region_metadata import Re
 from regions_recon_lambda.utils.launch_date_mailer_templates import (get_14_days_template, get_0_days_template,
                                                                      get_past_1_days_template, get_past_4_days_template,
                                                                      get_fallback_header)
+from datetime import date
 import os
 import boto3
 import pytest
 import json
+import copy
 import regions_recon_lambda.launch_date_mailer as launch_date_mailer
 
 CONDENSED_DATE_FORMAT = "%Y-%m-%d"
@@ -168,7 +170,8 @@ def test_notification_mailer_internal(mocked_environment_prod):
     context = Context()
     context.function_name = "launch_date_mailer"
 
-    expected_metrics = {"message_send_success": 1, "message_send_failure": 0}
+    # LEFT_14 was sent, so the plan's transition moves on to LEFT_7
+    expected_metrics = {"message_send_success": 1, "message_send_failure": 0, "notification_transitions_updated": 1}
 
     mocked_contacts_return = EXPECTED_SERVICE_ITEM
     mocked_contacts_return["lol"]["contacts"] = {"gm": "Jezos", "vp": "Beff", "notifications": "lol"}
@@ -186,6 +189,61 @@ def test_notification_mailer_internal(mocked_environment_prod):
     EXPECTED_SERVICE_ITEM["lol"]["contacts"] = {}
 
 
+@freeze_time("2020-02-03 14:05:06", tz_offset=0)
+@mock_dynamodb2
+def test_notification_mailer_internal_dry_run(mocked_environment_prod):
+    mocked_environment_prod.start()
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    table = dynamodb.create_table(
+        TableName=os.environ["BUILDABLES_TABLE_NAME"],
+        KeySchema=KEY_SCHEMA,
+        AttributeDefinitions=ATTRIBUTE_DEFINITIONS
+    )
+    service_item = dict(PLAN_ITEM, status="PLANNED", date="2020-02-17", updated="2020-02-10T12:00:30.952587",
+                        updater="me", note="D flat", version_instance=0)
+    table.put_item(Item=NOTIFICATION_ITEM)
+    table.put_item(Item=REGION_ITEM)
+    table.put_item(Item=service_item)
+
+    mocked_mm_helper = Mock()
+    context = Context()
+    context.function_name = "launch_date_mailer"
+    mocked_contacts_return = copy.deepcopy(EXPECTED_SERVICE_ITEM)
+    mocked_contacts_return["lol"]["contacts"] = {"gm": "Jezos", "vp": "Beff", "notifications": "lol"}
+
+    with patch(CLOUDWATCH_PATCH_STRING, autospec=True) as mocked_submit_cloudwatch_metrics:
+        with patch(CONTACT_PATCH_STRING, return_value=mocked_contacts_return):
+            with patch(PREPARE_PATCH_STRING, return_value=None):
+                with patch("regions_recon_lambda.launch_date_mailer.get_recon_managed_regions", return_value=["kek"]):
+                    report = launch_date_mailer.notification_mailer_internal({"dryrun": True}, context, table, mocked_mm_helper)
+
+    mocked_submit_cloudwatch_metrics.assert_not_called()
+    mocked_mm_helper.perform_operation.assert_not_called()
+    assert report["dryrun"]
+    assert report["metrics"]["message_send_success"] == 1
+    assert [message["operation"] for message in report["messages"]] == ["send_message"]
+    assert [update["Key"]["instance"] for update in report["notification_updates"]] == ["delivery-date-lol-kek"]
+    assert report["mm_calls_by_operation"] == {"send_message": 1}
+    assert report["dynamodb_calls"] > 0
+    assert "read_plans_total" in report["stage_timings_ms"]
+    # nothing was written
+    stored_notification = table.get_item(Key={"artifact": "NOTIFICATION", "instance": "delivery-date-lol-kek"})["Item"]
+    assert stored_notification["state"] == "NOT_NOTIFIED"
+    mocked_environment_prod.stop()
+
+
+@patch.object(launch_date_mailer, "simulate_notification_mailer")
+@patch.object(launch_date_mailer, "_notification_mailer")
+def test_notification_mailer_internal_dry_run_false(mocked_notification_mailer, mocked_simulate_notification_mailer):
+    context = Context()
+    context.function_name = "launch_date_mailer"
+    with patch.object(launch_date_mailer, "MM_TARGET_CACHE"), patch.object(launch_date_mailer, "StageTimings"):
+        launch_date_mailer.notification_mailer_internal({"dryrun": False}, context, Mock(), Mock())
+
+    mocked_simulate_notification_mailer.assert_not_called()
+    mocked_notification_mailer.assert_called_once()
+
+
 @mock_dynamodb2
 @patch.object(launch_date_mailer, 'check_date_slip')
 def test_get_notifications(mock_check_date_slip, mocked_environment_prod):
@@ -208,6 +266,24 @@ def test_get_notifications(mock_check_date_slip, mocked_environment_prod):
     assert result == expected
 
 
+@mock_dynamodb2
+def test_get_notification_items_by_plan_instance(mocked_environment_prod):
+    mocked_environment_prod.start()
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    table = dynamodb.create_table(
+        TableName=os.environ["BUILDABLES_TABLE_NAME"],
+        KeySchema=KEY_SCHEMA,
+        AttributeDefinitions=ATTRIBUTE_DEFINITIONS
+    )
+    table.put_item(Item=NOTIFICATION_ITEM)
+    table.put_item(Item=dict(NOTIFICATION_ITEM, instance="delivery-date-rofl-kek"))
+
+    items = launch_date_mailer._get_notification_items_by_plan_instance(table, ["lol:v0:kek", "nope:v0:kek"])
+    mocked_environment_prod.stop()
+
+    assert [item["instance"] for item in items] == ["delivery-date-lol-kek"]
+
+
 @freeze_time("2020-02-03 14:05:06", tz_offset=0)
 @mock_dynamodb2
 def test_get_services(mocked_environment_prod):
@@ -377,8 +453,8 @@ def test_send_mail(mocked_environment_prod):
 
     with patch(MM_PATCH_STRING, return_value=mocked_mm_helper):
         with patch(PREPARE_PATCH_STRING, return_value=None):
-            result = launch_date_mailer._send_mail(conn, notifications, service, state, contact, template, endpoint_params,
-                                                   mocked_mm_helper, metrics)
+            result = launch_date_mailer._send_mail(launch_date_mailer.UpdateBuffer(conn), notifications, service, state, contact,
+                                                   template, endpoint_params, mocked_mm_helper, metrics)
             expected = {"message_send_success": 1, "message_send_failure": 0}
             assert result == expected
 
@@ -410,6 +486,31 @@ def test_send_fallback():
             assert result == expected
 
 
+def _prepare_mm_target_with_cache(cache, template):
+    mocked_mm_helper = Mock()
+    mocked_mm_helper.perform_operation.return_value.message_group.targets = {}
+    mocked_mm_helper.perform_operation.return_value.target_arn = "arn:target"
+    contact = {"TO": ["me"], "CC": []}
+    endpoint_params = {"EMAIL_SUBJECT": "subject", "EMAIL_SHORT_NAME": "Recon"}
+    with patch.object(launch_date_mailer, "MM_TARGET_CACHE", cache):
+        launch_date_mailer._prepare_mm_target("arn:group", contact, endpoint_params, "group", template, mocked_mm_helper)
+    return [call[1]["operation"] for call in mocked_mm_helper.perform_operation.call_args_list]
+
+
+def test_prepare_mm_target_uses_cache():
+    cache = launch_date_mailer.MMTargetCache()
+
+    assert _prepare_mm_target_with_cache(cache, "template") == ["get_message_group", "get_message_group", "create_target"]
+    assert cache.get("arn:group")["target_arn"] == "arn:target"
+
+    # nothing changed, so no MM setup calls at all
+    assert _prepare_mm_target_with_cache(cache, "template") == []
+
+    # a new template only needs the target updated
+    assert _prepare_mm_target_with_cache(cache, "new template") == ["update_target"]
+    assert _prepare_mm_target_with_cache(cache, "new template") == []
+
+
 def test_get_contact_template_endpoint(mocked_environment_prod):
     mocked_environment_prod.start()
 
@@ -471,7 +572,15 @@ def test_update_notification(mocked_environment_prod):
     region = {"region": "kek", "date": "2020-02-17"}
     state = {"name": "LEFT_14"}
 
-    launch_date_mailer._update_notification(conn, service, state, region, 0)
+    notification_writes = launch_date_mailer.UpdateBuffer(conn)
+    launch_date_mailer._update_notification(notification_writes, service, state, region, 0)
+    launch_date_mailer._update_notification(notification_writes, service, state, region, 1)
+    assert notification_writes.flush() == []
+
+    item = table.get_item(Key={"artifact": "NOTIFICATION", "instance": "delivery-date-lol-kek"})["Item"]
+    assert item["state"] == "LEFT_14"
+    assert item["retries"] == 1
+    assert item["last_known_launch_date"] == "2020-02-17"
     mocked_environment_prod.stop()
 
 
@@ -594,8 +703,16 @@ def test_dates_equal_false():
     assert result == False
 
 
+def test_get_corresponding_plan():
+    plans = {PLAN_ITEM["instance"]: PLAN_ITEM}
+    notification_instance = "delivery-date-lol-kek"
+
+    assert launch_date_mailer.get_corresponding_plan(plans, notification_instance) == PLAN_ITEM
+    assert launch_date_mailer.get_corresponding_plan(plans, "delivery-date-lol-kat") == {}
+
+
 @mock_dynamodb2
-def test_get_corresponding_plan(mocked_environment_prod):
+def test_get_plans(mocked_environment_prod):
     mocked_environment_prod.start()
     dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
 
@@ -605,16 +722,18 @@ def test_get_corresponding_plan(mocked_environment_prod):
         AttributeDefinitions=ATTRIBUTE_DEFINITIONS
     )
 
-    table.put_item(Item=PLAN_ITEM)
+    plan = dict(PLAN_ITEM, date="2020-02-17", version_instance=0)
+    table.put_item(Item=plan)
+    table.put_item(Item=dict(PLAN_ITEM, instance="lol:v0:kat", version_instance=0))  # no date
+    table.put_item(Item=dict(PLAN_ITEM, instance="lol:v1:kek", date="2020-02-17", version_instance=1))
+    table.put_item(Item=NOTIFICATION_ITEM)
 
     conn = boto3.resource("dynamodb", region_name='us-east-1').Table(os.environ["BUILDABLES_TABLE_NAME"])
-    notification_instance = "delivery-date-lol-kek"
 
-    result = launch_date_mailer.get_corresponding_plan(conn, notification_instance)
+    result = launch_date_mailer._get_plans(conn)
 
-    expected = PLAN_ITEM
     mocked_environment_prod.stop()
-    assert result == expected
+    assert result == {"lol:v0:kek": plan}
 
 
 @mock_dynamodb2
@@ -628,7 +747,7 @@ def test_check_date_slip_true(mock_update_notification_as_not_notified, mock_get
     plan = PLAN_ITEM
     plan["date"] = "2020-02-18"
     mock_get_corresponding_plan.return_value = plan
-    result = launch_date_mailer.check_date_slip(conn, notification)
+    result = launch_date_mailer.check_date_slip(conn, notification, {})
     mock_update_notification_as_not_notified.assert_called_once_with(conn, "delivery-date-lol-kek", "2020-02-18")
 
     assert result == True
@@ -645,7 +764,7 @@ def test_check_date_slip_false(mock_get_corresponding_plan, mocked_environment_p
     plan = PLAN_ITEM
     plan["date"] = "2020-02-17"
     mock_get_corresponding_plan.return_value = plan
-    result = launch_date_mailer.check_date_slip(conn, notification)
+    result = launch_date_mailer.check_date_slip(conn, notification, {})
 
     assert result == False
     mocked_environment_prod.stop()
@@ -659,7 +778,7 @@ def test_check_date_slip_without_plan_date(mock_get_corresponding_plan, mocked_e
 
     plan = PLAN_ITEM
     mock_get_corresponding_plan.return_value = plan
-    result = launch_date_mailer.check_date_slip(conn, notification)
+    result = launch_date_mailer.check_date_slip(conn, notification, {})
 
     assert result == False
     mocked_environment_prod.stop()
@@ -733,3 +852,239 @@ def test_get_recon_managed_regions(mock_get_region_metadata, mock_get_regions_wi
     ]
 
     assert set(launch_date_mailer.get_recon_managed_regions()) == {"IAD", "CMH", "PDT"}
+
+
+def _services_with_states(states_by_service):
+    return {
+        service: dict(rip=service, name=service, contacts={}, states={
+            state.name: dict(name=state.name, value=state.value, regions={}) for state in states
+        })
+        for service, states in states_by_service.items()
+    }
+
+
+def test_get_work_items_orders_by_urgency():
+    states = launch_date_mailer.NotificationState
+    services = _services_with_states({
+        "a": [states.LEFT_14, states.PAST_1],
+        "b": [states.LEFT_0],
+        "c": [states.PAST_4x, states.LEFT_7],
+    })
+
+    assert launch_date_mailer._get_work_items(services) == [
+        ("c", "PAST_4x"), ("a", "PAST_1"), ("b", "LEFT_0"), ("c", "LEFT_7"), ("a", "LEFT_14")
+    ]
+
+
+def test_filter_services_to_work_items():
+    states = launch_date_mailer.NotificationState
+    services = _services_with_states({"a": [states.LEFT_14, states.PAST_1], "b": [states.LEFT_0]})
+
+    result = launch_date_mailer._filter_services_to_work_items(services, [["a", "LEFT_14"]])
+
+    assert list(result) == ["a"]
+    assert list(result["a"]["states"]) == ["LEFT_14"]
+
+
+def test_is_near_deadline():
+    context = Context()
+    assert not launch_date_mailer._is_near_deadline(context)
+
+    context.get_remaining_time_in_millis = lambda: launch_date_mailer.DEADLINE_MARGIN_MILLIS + 1
+    assert not launch_date_mailer._is_near_deadline(context)
+
+    context.get_remaining_time_in_millis = lambda: launch_date_mailer.DEADLINE_MARGIN_MILLIS - 1
+    assert launch_date_mailer._is_near_deadline(context)
+
+
+@patch.object(launch_date_mailer.boto3, "client")
+def test_invoke_follow_up(mock_client):
+    context = Context()
+    context.invoked_function_arn = "arn:aws:lambda:us-east-1:8675309:function:DeliveryDateMailer"
+
+    launch_date_mailer._invoke_follow_up({"follow_up": {"depth": 1, "work_items": []}}, context, [("a", "LEFT_14")], ["a:v0:kek"], ["kek"])
+
+    invoke_kwargs = mock_client.return_value.invoke.call_args[1]
+    assert invoke_kwargs["FunctionName"] == context.invoked_function_arn
+    assert invoke_kwargs["InvocationType"] == "Event"
+    assert json.loads(invoke_kwargs["Payload"]) == {"follow_up": {"depth": 2, "work_items": [["a", "LEFT_14"]], "plan_instances": ["a:v0:kek"],
+                                                                  "regions": ["kek"]}}
+
+
+@patch.object(launch_date_mailer.boto3, "client")
+def test_invoke_follow_up_stops_chaining(mock_client):
+    event = {"follow_up": {"depth": launch_date_mailer.MAX_FOLLOW_UP_INVOCATIONS, "work_items": []}}
+
+    launch_date_mailer._invoke_follow_up(event, Context(), [("a", "LEFT_14")], ["a:v0:kek"], ["kek"])
+
+    mock_client.return_value.invoke.assert_not_called()
+
+
+def test_get_shard_index_is_stable():
+    assert launch_date_mailer.get_shard_index("lol", 4) == launch_date_mailer.get_shard_index("lol", 4)
+    assert 0 <= launch_date_mailer.get_shard_index("lol", 4) < 4
+    assert launch_date_mailer.get_shard_index("lol", 1) == 0
+
+
+def test_split_into_shards():
+    work_items = [("a", "PAST_4x"), ("b", "PAST_1"), ("a", "LEFT_14"), ("c", "LEFT_7")]
+
+    shards = launch_date_mailer._split_into_shards(work_items, 3)
+
+    assert sorted(work_item for shard in shards for work_item in shard) == sorted(work_items)
+    for shard in shards:
+        # each service lands in exactly one shard, still in urgency order
+        assert shard == [work_item for work_item in work_items if work_item in shard]
+        indexes = {launch_date_mailer.get_shard_index(service, 3) for service, _ in shard}
+        assert len(indexes) == 1
+
+
+@patch.object(launch_date_mailer, "_invoke_shard")
+def test_run_shards_merges_metrics(mock_invoke_shard):
+    context = Context()
+    context.invoked_function_arn = "arn:aws:lambda:us-east-1:8675309:function:DeliveryDateMailer"
+    context.get_remaining_time_in_millis = lambda: 800 * 1000
+    # the second shard fails
+    mock_invoke_shard.side_effect = lambda function_arn, shard_event: \
+        None if shard_event["shard"]["index"] else {"message_send_success": 2, "message_send_failure": 0}
+    metrics = {"message_send_success": 0, "message_send_failure": 0}
+
+    with patch.object(launch_date_mailer, "_split_into_shards", return_value=[[("a", "PAST_1")], [("b", "LEFT_0")]]):
+        services = _services_with_states({"a": [launch_date_mailer.NotificationState.PAST_1],
+                                          "b": [launch_date_mailer.NotificationState.LEFT_0]})
+        services["a"]["states"]["PAST_1"]["regions"] = {"kek": {"region": "kek"}}
+        services["b"]["states"]["LEFT_0"]["regions"] = {"kat": {"region": "kat"}}
+        result, held_back = launch_date_mailer._run_shards(context, services, 2, ["kek"], metrics)
+
+    assert result["message_send_success"] == 2
+    # the failed shard's plans keep their transition dates
+    assert held_back == {"b:v0:kat"}
+    assert result["shards_invoked"] == 2
+    assert result["shard_failed"] == 1
+    shard_events = sorted((call[0][1] for call in mock_invoke_shard.call_args_list), key=lambda shard_event: shard_event["shard"]["index"])
+    assert [shard_event["shard"]["work_items"] for shard_event in shard_events] == [[["a", "PAST_1"]], [["b", "LEFT_0"]]]
+    assert all(shard_event["shard"]["deadline_millis"] is not None for shard_event in shard_events)
+    assert [shard_event["shard"]["plan_instances"] for shard_event in shard_events] == [["a:v0:kek"], ["b:v0:kat"]]
+    assert all(shard_event["shard"]["regions"] == ["kek"] for shard_event in shard_events)
+
+
+def test_is_near_deadline_for_shard():
+    now_millis = launch_date_mailer._now_millis()
+    assert launch_date_mailer._is_near_deadline(Context(), now_millis + launch_date_mailer.DEADLINE_MARGIN_MILLIS - 1000)
+    assert not launch_date_mailer._is_near_deadline(Context(), now_millis + 2 * launch_date_mailer.DEADLINE_MARGIN_MILLIS)
+
+
+@patch.object(launch_date_mailer, "_get_plans")
+@patch.object(launch_date_mailer, "_query_ddb")
+def test_get_due_plans_falls_back_to_every_plan_without_index(mock_query_ddb, mock_get_plans):
+    mock_query_ddb.side_effect = Exception("The table does not have the specified index")
+    mock_get_plans.return_value = {"lol:v0:kek": {"instance": "lol:v0:kek"}}
+
+    assert launch_date_mailer._get_due_plans(Mock(), date(2020, 2, 3)) == (mock_get_plans.return_value, [])
+
+
+@patch.object(launch_date_mailer, "_query_ddb")
+def test_get_due_plans_returns_history_versions_apart(mock_query_ddb):
+    due_plan = {"instance": "lol:v0:kek", "version_instance": 0, "date": "2020-02-10"}
+    history_version = {"instance": "lol:v3:kek", "version_instance": 3, "date": "2020-01-10"}
+    updated_plan = {"instance": "rofl:v0:kek", "version_instance": 0, "date": "2020-02-17"}
+    mock_query_ddb.side_effect = [[due_plan, history_version], [updated_plan]]
+
+    plans, history_instances = launch_date_mailer._get_due_plans(Mock(), date(2020, 2, 3))
+
+    assert plans == {"lol:v0:kek": due_plan, "rofl:v0:kek": updated_plan}
+    assert history_instances == ["lol:v3:kek"]
+
+
+def test_remove_history_transitions():
+    ddb = Mock()
+    ddb.update_item.side_effect = [None, Exception("ConditionalCheckFailedException")]
+
+    metrics = launch_date_mailer._remove_history_transitions(ddb, ["lol:v3:kek", "lol:v4:kek"], {})
+
+    assert metrics["history_transitions_removed"] == 1
+    params = ddb.update_item.call_args_list[0][1]
+    assert params["Key"] == {"artifact": "SERVICE", "instance": "lol:v3:kek"}
+    assert params["UpdateExpression"] == "remove #n"
+
+
+def test_update_notification_transitions_only_writes_changes():
+    today = date(2020, 2, 3)
+    ddb = Mock()
+    plans = {
+        "a:v0:kek": {"instance": "a:v0:kek", "status": "PLANNED", "date": "2020-02-17", "next_notification_transition": "2020-02-10"},
+        "b:v0:kek": {"instance": "b:v0:kek", "status": "PLANNED", "date": "2020-02-17", "next_notification_transition": "2020-02-03"},
+        "c:v0:kek": {"instance": "c:v0:kek", "status": "GA", "date": "2020-02-17", "next_notification_transition": "2020-02-03"},
+        "d:v0:kek": {"instance": "d:v0:kek", "status": "GA", "date": "2020-02-17"},
+    }
+
+    metrics = launch_date_mailer._update_notification_transitions(ddb, plans, today, {})
+
+    assert metrics["notification_transitions_updated"] == 2
+    updates = {call[1]["Key"]["instance"]: call[1] for call in ddb.update_item.call_args_list}
+    assert updates["b:v0:kek"]["UpdateExpression"] == "set #n=:n"
+    assert updates["b:v0:kek"]["ExpressionAttributeValues"] == {":n": "2020-02-10"}
+    assert updates["c:v0:kek"]["UpdateExpression"] == "remove #n"
+
+
+def test_update_notification_transitions_leaves_held_back_plans():
+    today = date(2020, 2, 3)
+    ddb = Mock()
+    plans = {
+        "a:v0:kek": {"instance": "a:v0:kek", "status": "PLANNED", "date": "2020-02-10", "next_notification_transition": "2020-02-03"},
+        "b:v0:kek": {"instance": "b:v0:kek", "status": "PLANNED", "date": "2020-02-17", "next_notification_transition": "2020-02-03"},
+    }
+
+    metrics = launch_date_mailer._update_notification_transitions(ddb, plans, today, {}, {"a:v0:kek"})
+
+    assert metrics["notification_transitions_held_back"] == 1
+    assert [call[1]["Key"]["instance"] for call in ddb.update_item.call_args_list] == ["b:v0:kek"]
+
+
+def test_get_retry_plan_instances():
+    notification_items = [
+        {"instance": "delivery-date-lol-kek", "retries": 1},
+        {"instance": "delivery-date-lol-kat", "retries": 0},
+        {"instance": "delivery-date-rofl-kek", "retries": 2},
+    ]
+    plans = {"rofl:v0:kek": {}}
+
+    assert launch_date_mailer._get_retry_plan_instances(notification_items, plans) == ["lol:v0:kek"]
+
+
+def test_group_into_digests_by_contact():
+    states = launch_date_mailer.NotificationState
+    services = _services_with_states({
+        "a": [states.LEFT_14, states.PAST_1],
+        "b": [states.LEFT_0],
+        "c": [states.LEFT_7],
+    })
+    services["a"]["contacts"] = {"notifications": "lol", "gm": "Jezos", "vp": "Beff"}
+    services["b"]["contacts"] = {"notifications": "kek", "gm": "Jezos", "vp": "Beff"}
+    work_items = launch_date_mailer._get_work_items(services)
+
+    result = launch_date_mailer._group_into_digests(services, work_items)
+
+    # PAST_1 goes to the GM and LEFT_14 to the notifications alias, c has nobody to mail
+    assert result == [[("a", "PAST_1")], [("b", "LEFT_0")], [("a", "LEFT_14")]]
+
+
+@patch("regions_recon_lambda.launch_date_mailer._update_notification")
+@patch(PREPARE_PATCH_STRING)
+def test_send_digest_sends_one_mail_per_group(mock_prepare, mock_update_notification, mocked_environment_prod):
+    mocked_environment_prod.start()
+    states = launch_date_mailer.NotificationState
+    services = _services_with_states({"a": [states.LEFT_14], "b": [states.LEFT_7]})
+    for service in services.values():
+        service["contacts"] = {"notifications": "lol"}
+        service["states"][next(iter(service["states"]))]["regions"] = {"kek": dict(region="kek", date="2020-02-17")}
+    mm_helper = Mock()
+
+    metrics = launch_date_mailer._send_digest(None, {}, services, [("b", "LEFT_7"), ("a", "LEFT_14")], mm_helper, {})
+
+    mocked_environment_prod.stop()
+    assert mm_helper.perform_operation.call_count == 1
+    sections = json.loads(mm_helper.perform_operation.call_args[1]["params"]["params"])["sections"]
+    assert [section["name_rip"] for section in sections] == ["b", "a"]
+    assert mock_update_notification.call_count == 2
+    assert metrics == {"message_send_success": 1, "digest_notifications_sent": 2}
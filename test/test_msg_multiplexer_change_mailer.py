@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+from mock import Mock, patch
+import os
+
+# read when the module is imported
+os.environ.setdefault("TIME_HORIZON", "24")
+os.environ.setdefault("MM_STAGE", "beta")
+
+import regions_recon_lambda.msg_multiplexer_change_mailer as change_mailer
+
+NOTIFICATIONS = {
+    "IAD": {"instance": "update-IAD", "updated": datetime(2020, 1, 2, tzinfo=timezone.utc), "region": "IAD", "type": "update"}
+}
+
+
+def service_update(instance, region=None, updated="2020-01-03T00:00:00+00:00"):
+    item = {"instance": {"S": instance}, "updated": {"S": updated}}
+    if region:
+        item["belongs_to_instance"] = {"S": region}
+    return item
+
+
+def test_classify_update():
+    categorized = {"ec2"}
+    assert change_mailer.classify_update(service_update("s3:v0:IAD", "IAD"), categorized, NOTIFICATIONS) == change_mailer.UPDATE_NOT_CATEGORIZED
+    assert change_mailer.classify_update(service_update("ec2:v0"), categorized, NOTIFICATIONS) == change_mailer.UPDATE_SERVICE_SPECIFIC
+    assert change_mailer.classify_update(service_update("ec2:v0:PDX", "PDX"), categorized, NOTIFICATIONS) == change_mailer.UPDATE_UNCONFIGURED_REGION
+    assert change_mailer.classify_update(service_update("ec2:v0:IAD", "IAD", "2020-01-01T00:00:00+00:00"),
+                                         categorized, NOTIFICATIONS) == change_mailer.UPDATE_ALREADY_NOTIFIED
+    assert change_mailer.classify_update(service_update("ec2:v0:IAD", "IAD"), categorized, NOTIFICATIONS) == change_mailer.UPDATE_TRIGGERED
+
+    stale_relevant_change = dict(service_update("ec2:v0:IAD", "IAD"), relevant_change_at={"S": "2020-01-01T00:00:00"},
+                                 relevant_change_checked_at={"S": "2020-01-03T00:00:00+00:00"})
+    assert change_mailer.classify_update(stale_relevant_change, categorized, NOTIFICATIONS) == change_mailer.UPDATE_NOT_RELEVANT
+
+    # written before the ingestor recorded what it checked the stamp against
+    unchecked_relevant_change = dict(service_update("ec2:v0:IAD", "IAD"), relevant_change_at={"S": "2020-01-01T00:00:00"})
+    assert change_mailer.classify_update(unchecked_relevant_change, categorized, NOTIFICATIONS) == change_mailer.UPDATE_TRIGGERED
+
+
+def test_classify_update_distrusts_stamp_left_behind_by_another_writer():
+    # the ingestor stamped the plan on 2020-01-01, then another writer updated it on 2020-01-03 and kept the old stamp
+    item = dict(service_update("ec2:v0:IAD", "IAD"), relevant_change_at={"S": "2020-01-01T00:00:00"},
+                relevant_change_checked_at={"S": "2020-01-01T00:00:00"})
+    assert change_mailer.classify_update(item, {"ec2"}, NOTIFICATIONS) == change_mailer.UPDATE_TRIGGERED
+
+
+def test_get_update_notifications_reads_every_page():
+    ddb = Mock()
+    ddb.query.side_effect = [
+        {"Items": [], "LastEvaluatedKey": {"k": "1"}},
+        {"Items": [{"instance": {"S": "update-IAD"}}]},
+    ]
+
+    assert change_mailer.get_update_notifications(ddb, "buildables") == [{"instance": {"S": "update-IAD"}}]
+    assert ddb.query.call_args_list[1][1]["ExclusiveStartKey"] == {"k": "1"}
+
+
+def test_get_triggered_changes_reads_every_page():
+    ddb = Mock()
+    ddb.query.side_effect = [
+        {"Items": [service_update("ec2:v0:IAD", "IAD"), service_update("s3:v0:IAD", "IAD")], "LastEvaluatedKey": {"k": "1"}},
+        {"Items": [service_update("lambda:v0:IAD", "IAD", "2020-01-04T00:00:00+00:00")]},
+    ]
+
+    changes = change_mailer.get_triggered_changes(ddb, "buildables", {"ec2", "lambda"}, NOTIFICATIONS,
+                                                  NOTIFICATIONS["IAD"]["updated"], datetime(2020, 1, 5, tzinfo=timezone.utc))
+
+    assert changes == {
+        ("ec2", "IAD"): datetime(2020, 1, 3, tzinfo=timezone.utc),
+        ("lambda", "IAD"): datetime(2020, 1, 4, tzinfo=timezone.utc),
+    }
+    assert ddb.query.call_args_list[1][1]["ExclusiveStartKey"] == {"k": "1"}
+
+
+@patch("regions_recon_lambda.utils.dynamo_query.time.sleep")
+def test_get_service_names_retries_unprocessed_keys(mocked_sleep):
+    table = Mock()
+    table.name = "buildables"
+    unprocessed = {"buildables": {"Keys": [{"artifact": "SERVICE", "instance": "s3:v0"}]}}
+    table.meta.client.batch_get_item.side_effect = [
+        {"Responses": {"buildables": [{"artifact": "SERVICE", "instance": "ec2:v0", "name_sortable": "Amazon EC2"}]}, "UnprocessedKeys": unprocessed},
+        {"Responses": {"buildables": [{"artifact": "SERVICE", "instance": "s3:v0", "name_sortable": "Amazon S3"}]}, "UnprocessedKeys": {}},
+    ]
+
+    assert change_mailer.get_service_names(table, {"ec2", "s3"}) == {"ec2": "Amazon EC2", "s3": "Amazon S3"}
+    assert table.meta.client.batch_get_item.call_args_list[1][1]["RequestItems"] == unprocessed
+    mocked_sleep.assert_called_once()
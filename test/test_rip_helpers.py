@@ -1,3 +1,4 @@
+import datetime
 import unittest
 import pytest
 from mock_logger import MockLogger
@@ -66,4 +67,56 @@ def test_get_internal_services_externalonly_list(rip_helper, mock_logger):
     ]
     expected_services = []
     assert rip.get_internal_services(mocked_service_identifiers) == expected_services
-    
\ No newline at end of file
+    
+
+class MockRegion:
+    def __init__(self):
+        self.airport_code = "IAD"
+        self.status = Status.GA
+        self.region_name = "N. Virginia"
+        self.accessibility_attributes = []
+        self.arn_partition = None
+
+
+def test_get_snapshot_new_value():
+    new_value = rip.get_snapshot_new_value(MockRegion(), ["status", "regionName", "accessibilityAttributes", "arnPartition", "tags"])
+    assert new_value == {"status": "GA", "regionName": "N. Virginia", "accessibilityAttributes": []}
+
+
+def test_get_rip_snapshot():
+    helper = Mock()
+    service = Mock(spec=["name", "status", "visibility"])
+    service.name = "ecytu"
+    service.status = Status.GA
+    service.visibility = Visibility.INTERNAL
+    helper.services.return_value = [service]
+    helper.regions.return_value = [MockRegion()]
+
+    services, regions = rip.get_rip_snapshot(["status", "visibility", "longName"], ["status"], helper=helper)
+    assert services == {"ecytu": {"status": "GA", "visibility": "INTERNAL"}}
+    assert regions == {"IAD": {"status": "GA"}}
+
+
+def test_get_rip_snapshot_build_time():
+    helper = Mock()
+    helper.services.return_value = [Mock(approved_date=1622505600000), Mock(approved_date=None)]
+    helper.regions.return_value = [Mock(approved_date=datetime.datetime(2021, 6, 2, 2, tzinfo=datetime.timezone(datetime.timedelta(hours=2))))]
+    assert rip.get_rip_snapshot_build_time(helper=helper) == datetime.datetime(2021, 6, 2)
+
+
+def test_get_rip_snapshot_build_time_unknown():
+    helper = Mock()
+    helper.services.return_value = [Mock(spec=["name"])]
+    helper.regions.return_value = []
+    assert rip.get_rip_snapshot_build_time(helper=helper) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    (1622505600000, datetime.datetime(2021, 6, 1)),
+    ("2021-06-01T02:00:00+02:00", datetime.datetime(2021, 6, 1)),
+    (datetime.datetime(2021, 6, 1), datetime.datetime(2021, 6, 1)),
+    ("not a date", None),
+    (None, None),
+])
+def test_to_naive_utc(value, expected):
+    assert rip.to_naive_utc(value) == expected
@@ -1,3 +1,6 @@
+import hashlib
+import unittest.mock
+
 import pytest
 from regions_recon_lambda.rip_message_record import RipMessageRecord
 
@@ -64,3 +67,65 @@ def test_full_string_body():
     assert rmr.message == { 'dimension': { 'name': 'myDim' }, 'receiptHandle': 'blahblahblah' }
     assert rmr.change_type == 'myCT'
     assert rmr.rip_name == 'myDim'
+
+
+def test_message_id():
+    rmr = RipMessageRecord({ "messageId": "abc-123", "body": { "Message": {} } })
+    assert rmr.message_id == "abc-123"
+
+
+def test_message_is_decoded_lazily():
+    rmr = RipMessageRecord({
+        "body": {
+            "Message": "this is not json",
+            "MessageAttributes": { "changeType" : { "Value": "FeatureInstanceChange" } }
+        }
+    })
+    assert rmr.change_type == 'FeatureInstanceChange'
+    with pytest.raises(ValueError):
+        rmr.message
+
+
+def test_message_is_decoded_once():
+    rmr = RipMessageRecord({ "body": { "Message": '{ "dimension": { "name": "myDim" }, "status": "APPROVED" }' } })
+    assert rmr.message is rmr.message
+    assert rmr.status == 'APPROVED'
+
+
+def test_record_has_no_dict():
+    rmr = RipMessageRecord({ "body": { "Message": {} } })
+    with pytest.raises(AttributeError):
+        rmr.something_else = 1
+
+
+def test_idempotency_key_is_sns_message_id():
+    rmr = RipMessageRecord({ "body": { "MessageId": "sns-id", "Message": {} } })
+    assert rmr.idempotency_key == "sns-id"
+
+
+def test_idempotency_key_falls_back_to_content_hash():
+    first = RipMessageRecord({ "body": { "Message": '{"a": 1, "b": 2}' } })
+    second = RipMessageRecord({ "body": { "Message": { "b": 2, "a": 1 } } })
+    other = RipMessageRecord({ "body": { "Message": { "a": 2 } } })
+    assert first.idempotency_key.startswith("sha256:")
+    assert first.idempotency_key == second.idempotency_key
+    assert first.idempotency_key != other.idempotency_key
+
+
+def test_idempotency_key_is_hashed_once():
+    rmr = RipMessageRecord({ "body": { "Message": '{"a": 1}' } })
+    with unittest.mock.patch("regions_recon_lambda.rip_message_record.hashlib.sha256", wraps=hashlib.sha256) as sha256:
+        assert rmr.idempotency_key == rmr.idempotency_key
+    assert sha256.call_count == 1
+
+
+def test_replace_previous_value_keeps_idempotency_key():
+    message = { "previousValue": { "status": "GA" }, "newValue": { "status": "GA" } }
+    rmr = RipMessageRecord({ "body": { "Message": message } })
+    idempotency_key = rmr.idempotency_key
+    rmr.replace_previous_value({ "status": "BUILD" })
+    assert rmr.message["previousValue"] == { "status": "BUILD" }
+    assert message["previousValue"] == { "status": "GA" }
+    assert rmr.idempotency_key == idempotency_key
+    rmr.replace_previous_value(None)
+    assert "previousValue" not in rmr.message
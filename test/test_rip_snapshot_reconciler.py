@@ -0,0 +1,200 @@
+import datetime
+import os
+import unittest.mock
+from unittest.mock import Mock
+
+import pytest
+from regions_recon_python_common.buildables_dao_models.region_metadata import RegionMetadata
+from regions_recon_python_common.buildables_dao_models.service_metadata import ServiceMetadata
+
+from regions_recon_lambda.rip_snapshot_reconciler import RipSnapshotReconciler, get_attribute_deltas, \
+    is_tracked_region, map_attributes, is_updated_after, reconcile_rip_snapshot
+from regions_recon_lambda.rip_ingestor.attributes_to_buildables_map import get_service_attributes_to_buildables_map
+
+os.environ["BUILDABLES_TABLE_NAME"] = "terra is not a good party member"
+
+
+def test_map_attributes_skips_attributes_rip_does_not_have():
+    new_value = {"status": "GA", "longName": "Some Service", "somethingElse": 1}
+    assert map_attributes(get_service_attributes_to_buildables_map(), new_value) == {"status": "GA", "name_long": "Some Service"}
+
+
+def test_get_attribute_deltas():
+    stored_item = {"status": "BUILD", "name_long": "Some Service", "tags": {"b", "a"}, "updater": "someone"}
+    new_attributes = {"status": "GA", "name_long": "Some Service", "tags": ["a", "b"], "updater": "someone else"}
+    assert get_attribute_deltas(new_attributes, stored_item) == {"status": "GA"}
+
+
+def test_get_attribute_deltas_new_attribute():
+    assert get_attribute_deltas({"visibility": "EXTERNAL"}, {"status": "GA"}) == {"visibility": "EXTERNAL"}
+
+
+def test_is_tracked_region():
+    assert is_tracked_region("IAD", {"accessibilityAttributes": []})
+    assert is_tracked_region("IAD", {})
+    assert not is_tracked_region("LUX", {})
+    assert not is_tracked_region("XYZ", {"accessibilityAttributes": ["RETAIL"]})
+
+
+SNAPSHOT_BUILT_AT = datetime.datetime(2021, 6, 1)
+
+
+def test_is_updated_after():
+    assert is_updated_after({"updated": "2021-06-02T00:00:00"}, SNAPSHOT_BUILT_AT)
+    assert not is_updated_after({"updated": "2021-05-31T00:00:00"}, SNAPSHOT_BUILT_AT)
+    assert is_updated_after({"updated": "2021-06-01T00:00:00-04:00"}, SNAPSHOT_BUILT_AT)
+    assert is_updated_after({"updated": "not a date"}, SNAPSHOT_BUILT_AT)
+    assert not is_updated_after({}, SNAPSHOT_BUILT_AT)
+
+
+@pytest.mark.parametrize("event, env, expected", [
+    ({}, {}, True),
+    ({}, {"RIP_RECONCILER_DRY_RUN": "false"}, False),
+    ({"dryrun": True}, {"RIP_RECONCILER_DRY_RUN": "false"}, True),
+    ({"dryrun": False}, {}, False),
+])
+def test_reconcile_rip_snapshot_dry_run(event, env, expected):
+    with unittest.mock.patch.dict(os.environ, env), \
+            unittest.mock.patch("regions_recon_lambda.rip_snapshot_reconciler.RipSnapshotReconciler") as reconciler:
+        reconcile_rip_snapshot(event, Mock(function_name="test"))
+    assert reconciler.call_args[1]["dry_run"] is expected
+
+
+def _stored_model(model_type, stored_item):
+    model = Mock(spec=model_type)
+    model.updated = stored_item.get("updated")
+    model.updater = stored_item.get("updater")
+    return model
+
+
+def _patch_models(stored_items):
+    """create_and_backfill hands back a model backfilled with the item as it is stored now."""
+    def create_and_backfill(model_type):
+        return lambda artifact, instance, **attributes: _stored_model(model_type, stored_items.get((artifact, instance), {}))
+    models = Mock()
+    models.service = unittest.mock.patch.object(ServiceMetadata, "create_and_backfill", side_effect=create_and_backfill(ServiceMetadata))
+    models.region = unittest.mock.patch.object(RegionMetadata, "create_and_backfill", side_effect=create_and_backfill(RegionMetadata))
+    return models
+
+
+def _run_reconciler(snapshot, stored_items, dry_run=False, snapshot_built_at=SNAPSHOT_BUILT_AT):
+    buildables_query = Mock()
+    buildables_query.batch_get_items.return_value = stored_items
+    models = _patch_models(stored_items)
+    with unittest.mock.patch("regions_recon_lambda.rip_snapshot_reconciler.get_buildables_query", return_value=buildables_query), \
+            unittest.mock.patch("regions_recon_lambda.rip_snapshot_reconciler.submit_cloudwatch_metrics"), \
+            unittest.mock.patch("regions_recon_lambda.rip_snapshot_reconciler.get_rip_snapshot_build_time", return_value=None), \
+            models.service as service_create_and_backfill, models.region as region_create_and_backfill, \
+            unittest.mock.patch.object(RipSnapshotReconciler, "get_updating_agent_value", return_value={"updating_agent": "recon"}):
+        reconciler = RipSnapshotReconciler(metrics_service_name="test", dry_run=dry_run, snapshot=snapshot,
+                                           snapshot_built_at=snapshot_built_at)
+        response = reconciler.run_workflow()
+    return response, buildables_query, {"SERVICE": service_create_and_backfill, "REGION": region_create_and_backfill}
+
+
+def test_reconciler_writes_only_drifted_attributes():
+    snapshot = (
+        {"svc": {"status": "GA", "longName": "Service"}, "other": {"status": "GA"}, "recon-integ": {"status": "GA"}},
+        {"IAD": {"status": "GA"}, "LUX": {"status": "GA"}},
+    )
+    stored_items = {
+        ("SERVICE", "svc:v0"): {"artifact": "SERVICE", "instance": "svc:v0", "status": "BUILD", "name_long": "Service",
+                                "updated": "2021-05-01T00:00:00", "updater": "rip"},
+        ("SERVICE", "other:v0"): {"artifact": "SERVICE", "instance": "other:v0", "status": "GA"},
+        ("REGION", "IAD:v0"): {"artifact": "REGION", "instance": "IAD:v0", "status": "GA"},
+    }
+
+    response, buildables_query, create_and_backfill = _run_reconciler(snapshot, stored_items)
+
+    keys = buildables_query.batch_get_items.call_args[0][0]
+    assert sorted(keys) == [("REGION", "IAD:v0"), ("SERVICE", "other:v0"), ("SERVICE", "svc:v0")]
+
+    # saved through the versioned model, which writes the history row
+    create_and_backfill["SERVICE"].assert_called_once_with(artifact="SERVICE", instance="svc:v0", status="GA")
+    create_and_backfill["REGION"].assert_not_called()
+    assert response["metrics"]["items_checked"] == 3
+    assert response["metrics"]["items_drifted"] == 1
+    assert response["metrics"]["item_in_sync"] == 2
+    assert response["metrics"]["ddb_items_written"] == 1
+    assert response["drift"] == [{"artifact": "SERVICE", "instance": "svc:v0", "changes": {"status": {"buildables": "BUILD", "rip": "GA"}}}]
+
+
+def test_reconciler_saves_with_reconciler_as_updater():
+    stored_item = {"artifact": "SERVICE", "instance": "svc:v0", "status": "BUILD", "updated": "2021-05-01T00:00:00", "updater": "rip"}
+    model = _stored_model(ServiceMetadata, stored_item)
+    region_model = _stored_model(RegionMetadata, {})
+
+    reconciler = RipSnapshotReconciler(metrics_service_name="test", dry_run=False, snapshot=({}, {}), snapshot_built_at=SNAPSHOT_BUILT_AT)
+    reconciler.reconcile_item(("SERVICE", "svc:v0"), {"status": "GA"}, stored_item)
+    reconciler.reconcile_item(("REGION", "IAD:v0"), {"status": "GA"}, {"artifact": "REGION", "instance": "IAD:v0", "status": "BUILD"})
+    with unittest.mock.patch.object(ServiceMetadata, "create_and_backfill", return_value=model), \
+            unittest.mock.patch.object(RegionMetadata, "create_and_backfill", return_value=region_model), \
+            unittest.mock.patch.object(RipSnapshotReconciler, "get_updating_agent_value", return_value={"updating_agent": "recon"}):
+        reconciler.write_to_dynamo()
+
+    model.set_updater_on_version_increment.assert_called_once_with("RipSnapshotReconciler", "recon")
+    model.save.assert_called_once_with()
+    assert region_model.updater == "RipSnapshotReconciler"
+    assert region_model.updating_agent == "recon"
+    region_model.save.assert_called_once_with()
+    assert reconciler.metrics["ddb_items_written"] == 2
+
+
+def test_reconciler_only_reports_items_updated_after_snapshot():
+    snapshot = ({"svc": {"status": "BUILD"}}, {})
+    stored_items = {("SERVICE", "svc:v0"): {"artifact": "SERVICE", "instance": "svc:v0", "status": "GA",
+                                            "updated": "2021-06-02T00:00:00"}}
+
+    response, _, create_and_backfill = _run_reconciler(snapshot, stored_items)
+
+    create_and_backfill["SERVICE"].assert_not_called()
+    assert response["metrics"]["updated_after_snapshot"] == 1
+    assert response["drift"][0]["skipped"] == "updated_after_snapshot"
+
+
+def test_reconciler_only_reports_when_snapshot_build_time_unknown():
+    snapshot = ({"svc": {"status": "GA"}}, {})
+    stored_items = {("SERVICE", "svc:v0"): {"artifact": "SERVICE", "instance": "svc:v0", "status": "BUILD",
+                                            "updated": "2000-01-01T00:00:00"}}
+
+    response, _, create_and_backfill = _run_reconciler(snapshot, stored_items, snapshot_built_at=None)
+
+    create_and_backfill["SERVICE"].assert_not_called()
+    assert response["metrics"]["snapshot_build_time_unknown"] == 1
+    assert response["drift"][0]["skipped"] == "snapshot_build_time_unknown"
+
+
+def test_reconciler_leaves_items_updated_concurrently():
+    stored_item = {"artifact": "REGION", "instance": "IAD:v0", "status": "BUILD"}
+    # written by the ingestor between our read and the backfill
+    model = _stored_model(RegionMetadata, {"updated": "2021-06-01T00:00:01"})
+
+    reconciler = RipSnapshotReconciler(metrics_service_name="test", dry_run=False, snapshot=({}, {}), snapshot_built_at=SNAPSHOT_BUILT_AT)
+    reconciler.reconcile_item(("REGION", "IAD:v0"), {"status": "GA"}, stored_item)
+    with unittest.mock.patch.object(RegionMetadata, "create_and_backfill", return_value=model), \
+            unittest.mock.patch.object(RipSnapshotReconciler, "get_updating_agent_value", return_value={}):
+        reconciler.write_to_dynamo()
+
+    model.save.assert_not_called()
+    assert reconciler.metrics["concurrent_update_skipped"] == 1
+    assert reconciler.metrics["ddb_items_written"] == 0
+
+
+def test_reconciler_counts_missing_items():
+    snapshot = ({"svc": {"status": "GA"}}, {})
+
+    response, _, create_and_backfill = _run_reconciler(snapshot, {})
+
+    create_and_backfill["SERVICE"].assert_not_called()
+    assert response["metrics"]["missing_in_buildables"] == 1
+
+
+def test_reconciler_dry_run_does_not_write():
+    snapshot = ({}, {"IAD": {"status": "GA"}})
+    stored_items = {("REGION", "IAD:v0"): {"artifact": "REGION", "instance": "IAD:v0", "status": "BUILD"}}
+
+    response, _, create_and_backfill = _run_reconciler(snapshot, stored_items, dry_run=True)
+
+    create_and_backfill["REGION"].assert_not_called()
+    assert response["dryrun"] is True
+    assert response["metrics"]["items_drifted"] == 1
@@ -0,0 +1,38 @@
+from unittest.mock import Mock
+
+from botocore.client import BaseClient
+
+from regions_recon_lambda.utils.aws_call_counter import AwsCallCounter
+
+
+def _fake_client(service_name):
+    client = Mock()
+    client.meta.service_model.service_name = service_name
+    return client
+
+
+def test_counts_calls_while_active(monkeypatch):
+    original = Mock(return_value={"Items": []})
+    monkeypatch.setattr(BaseClient, "_make_api_call", original)
+
+    with AwsCallCounter() as counter:
+        assert BaseClient._make_api_call(_fake_client("dynamodb"), "Query", {}) == {"Items": []}
+        BaseClient._make_api_call(_fake_client("dynamodb"), "Query", {})
+        BaseClient._make_api_call(_fake_client("sqs"), "DeleteMessage", {})
+
+    assert counter.calls[("dynamodb", "Query")] == 2
+    assert counter.count("dynamodb") == 2
+    assert counter.count() == 3
+    assert BaseClient._make_api_call is original
+
+
+def test_nested_counters(monkeypatch):
+    monkeypatch.setattr(BaseClient, "_make_api_call", Mock())
+
+    with AwsCallCounter() as outer:
+        BaseClient._make_api_call(_fake_client("dynamodb"), "GetItem", {})
+        with AwsCallCounter() as inner:
+            BaseClient._make_api_call(_fake_client("dynamodb"), "GetItem", {})
+
+    assert outer.count() == 2
+    assert inner.count() == 1
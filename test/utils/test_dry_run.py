@@ -0,0 +1,51 @@
+from unittest.mock import Mock
+
+from regions_recon_lambda.utils.dry_run import DryRunTable, DryRunMessageMultiplexer
+
+
+def test_dry_run_table_reads_but_records_writes():
+    table = Mock()
+    table.query.return_value = {"Items": []}
+    dry_run_table = DryRunTable(table)
+
+    assert dry_run_table.query(KeyConditionExpression="lol") == {"Items": []}
+    dry_run_table.update_item(Key={"artifact": "NOTIFICATION", "instance": "kek"}, UpdateExpression="set a=:a")
+    dry_run_table.put_item(Item={"artifact": "MM_TARGET", "instance": "arn"})
+
+    table.update_item.assert_not_called()
+    table.put_item.assert_not_called()
+    assert dry_run_table.writes == [
+        {"operation": "update_item", "Key": {"artifact": "NOTIFICATION", "instance": "kek"}, "UpdateExpression": "set a=:a"},
+        {"operation": "put_item", "Item": {"artifact": "MM_TARGET", "instance": "arn"}},
+    ]
+
+
+def test_dry_run_message_multiplexer_records_changes():
+    mm_helper = Mock()
+    mm_helper.get_own_message_group_arn.side_effect = lambda message_group_name: "arn:" + message_group_name
+    dry_run_mm_helper = DryRunMessageMultiplexer(mm_helper)
+
+    dry_run_mm_helper.perform_operation(operation="get_message_group", params={"message_group_arn": "arn:lol"})
+    dry_run_mm_helper.perform_operation(operation="create_message_group", params={"message_group_name": "kek"})
+    created_group = dry_run_mm_helper.perform_operation(operation="get_message_group", params={"message_group_arn": "arn:kek"})
+    dry_run_mm_helper.perform_operation(operation="send_message", params={"message_group_name": "kek"}, convert_message_group_name=True)
+
+    # only the lookup of a group which exists goes to MM
+    mm_helper.perform_operation.assert_called_once_with(operation="get_message_group", params={"message_group_arn": "arn:lol"})
+    assert created_group.message_group.targets == {}
+    assert [operation["operation"] for operation in dry_run_mm_helper.operations] == ["create_message_group", "send_message"]
+    assert dry_run_mm_helper.calls == {"get_message_group": 2, "create_message_group": 1, "send_message": 1}
+
+
+def test_dry_run_table_records_client_writes_per_item():
+    table = Mock()
+    dry_run_table = DryRunTable(table)
+
+    dry_run_table.meta.client.transact_write_items(TransactItems=[
+        {"Update": {"TableName": "buildables", "Key": {"artifact": "NOTIFICATION", "instance": "lol"}}},
+        {"Update": {"TableName": "buildables", "Key": {"artifact": "NOTIFICATION", "instance": "kek"}}},
+    ])
+
+    table.meta.client.transact_write_items.assert_not_called()
+    assert [write["Key"]["instance"] for write in dry_run_table.writes] == ["lol", "kek"]
+    assert dry_run_table.write_calls == {"transact_write_items": 1}
@@ -0,0 +1,69 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from regions_recon_lambda.utils import dynamo_query
+from regions_recon_lambda.utils.dynamo_query import batch_get_table_items
+
+
+def _table(responses):
+    table = Mock()
+    table.name = "buildables"
+    table.meta.client.batch_get_item.side_effect = responses
+    return table
+
+
+def _item(instance):
+    return {"artifact": "SERVICE", "instance": instance}
+
+
+def test_batch_get_table_items_chunks_and_dedupes_keys():
+    keys = [("SERVICE", "svc{}:v0".format(index)) for index in range(150)] + [("SERVICE", "svc0:v0")]
+    table = _table([
+        {"Responses": {"buildables": [_item("svc0:v0")]}},
+        {"Responses": {"buildables": [_item("svc149:v0")]}},
+    ])
+
+    items = batch_get_table_items(table, keys)
+
+    assert items == {("SERVICE", "svc0:v0"): _item("svc0:v0"), ("SERVICE", "svc149:v0"): _item("svc149:v0")}
+    chunk_sizes = [len(call[1]["RequestItems"]["buildables"]["Keys"]) for call in table.meta.client.batch_get_item.call_args_list]
+    assert sorted(chunk_sizes) == [50, 100]
+
+
+def test_batch_get_table_items_in_parallel():
+    keys = [("SERVICE", "svc{}:v0".format(index)) for index in range(300)]
+    table = Mock()
+    table.name = "buildables"
+    table.meta.client.batch_get_item.side_effect = lambda RequestItems: {
+        "Responses": {"buildables": RequestItems["buildables"]["Keys"]}
+    }
+
+    items = batch_get_table_items(table, keys, max_workers=3)
+
+    assert len(items) == 300
+    assert table.meta.client.batch_get_item.call_count == 3
+
+
+@patch.object(dynamo_query.time, "sleep")
+def test_batch_get_table_items_retries_unprocessed_keys(mock_sleep):
+    unprocessed = {"buildables": {"Keys": [{"artifact": "SERVICE", "instance": "b:v0"}]}}
+    table = _table([
+        {"Responses": {"buildables": [_item("a:v0")]}, "UnprocessedKeys": unprocessed},
+        {"Responses": {"buildables": [_item("b:v0")]}, "UnprocessedKeys": {}},
+    ])
+
+    items = batch_get_table_items(table, [("SERVICE", "a:v0"), ("SERVICE", "b:v0")])
+
+    assert set(items) == {("SERVICE", "a:v0"), ("SERVICE", "b:v0")}
+    assert table.meta.client.batch_get_item.call_args_list[1][1]["RequestItems"] == unprocessed
+    mock_sleep.assert_called_once()
+
+
+@patch.object(dynamo_query.time, "sleep")
+def test_batch_get_table_items_gives_up(mock_sleep):
+    unprocessed = {"buildables": {"Keys": [{"artifact": "SERVICE", "instance": "a:v0"}]}}
+    table = _table([{"Responses": {}, "UnprocessedKeys": unprocessed}] * dynamo_query.BATCH_GET_ITEM_MAX_ATTEMPTS)
+
+    with pytest.raises(RuntimeError):
+        batch_get_table_items(table, [("SERVICE", "a:v0")])
@@ -0,0 +1,95 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from regions_recon_lambda.utils.mm_dispatcher import MMDispatcher, as_mm_dispatcher, get_latency_bucket
+
+
+def test_as_mm_dispatcher_wraps_helpers_once():
+    dispatcher = as_mm_dispatcher(Mock())
+    assert isinstance(dispatcher, MMDispatcher)
+    assert as_mm_dispatcher(dispatcher) is dispatcher
+
+
+def test_caches_message_group_arns():
+    mm_helper = Mock()
+    mm_helper.get_own_message_group_arn.return_value = "arn:lol"
+    dispatcher = MMDispatcher(mm_helper)
+
+    assert dispatcher.get_own_message_group_arn(message_group_name="lol") == "arn:lol"
+    assert dispatcher.get_own_message_group_arn(message_group_name="lol") == "arn:lol"
+    mm_helper.get_own_message_group_arn.assert_called_once_with(message_group_name="lol")
+
+
+def test_runs_work_for_a_group_in_order():
+    dispatcher = MMDispatcher(Mock(), max_workers=4)
+    release_first = threading.Event()
+    order = []
+
+    def first():
+        release_first.wait(5)
+        order.append("first")
+
+    first_future = dispatcher.submit("lol", first)
+    second_future = dispatcher.submit("lol", lambda: order.append("second"))
+    other_group_future = dispatcher.submit("kek", lambda: order.append("other group"))
+
+    # work for another group doesn't wait for "lol"
+    other_group_future.result(5)
+    assert order == ["other group"]
+
+    release_first.set()
+    second_future.result(5)
+    assert first_future.done()
+    assert order == ["other group", "first", "second"]
+
+
+def test_submit_passes_on_failures():
+    dispatcher = MMDispatcher(Mock(), max_workers=1)
+
+    def fail():
+        raise ValueError("lol")
+
+    with pytest.raises(ValueError):
+        dispatcher.submit("lol", fail).result(5)
+    assert dispatcher.submit("lol", lambda: "kek").result(5) == "kek"
+
+
+@patch("regions_recon_lambda.utils.mm_dispatcher.time.sleep")
+def test_retries_sends(mock_sleep):
+    mm_helper = Mock()
+    mm_helper.perform_operation.side_effect = [Exception("throttled"), "sent"]
+    dispatcher = MMDispatcher(mm_helper)
+
+    assert dispatcher.send_message("lol", "{}") == "sent"
+    assert mm_helper.perform_operation.call_count == 2
+    mm_helper.perform_operation.assert_called_with(operation="send_message", convert_message_group_name=True,
+                                                   params={"message_group_name": "lol", "params": "{}"})
+
+    timings = dispatcher.take_timings()
+    assert timings.counts["mm_send_retries"] == 1
+    assert len(timings.durations_ms["mm_send"]) == 1
+    assert sum(count for name, count in timings.counts.items() if name.startswith("mm_send_le_")) == 1
+    # taking them starts over
+    assert dispatcher.take_timings().summary() == {}
+
+
+def test_other_operations_are_not_retried():
+    mm_helper = Mock()
+    mm_helper.perform_operation.side_effect = Exception("missing")
+    dispatcher = MMDispatcher(mm_helper)
+
+    with pytest.raises(Exception):
+        dispatcher.perform_operation(operation="get_message_group", params={"message_group_arn": "arn:lol"})
+    assert mm_helper.perform_operation.call_count == 1
+
+
+@pytest.mark.parametrize("latency_ms, expected", [
+    (50, "mm_send_le_100ms"),
+    (100, "mm_send_le_100ms"),
+    (300, "mm_send_le_500ms"),
+    (9000, "mm_send_gt_5000ms"),
+])
+def test_get_latency_bucket(latency_ms, expected):
+    assert get_latency_bucket(latency_ms) == expected
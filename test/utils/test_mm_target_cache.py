@@ -0,0 +1,63 @@
+from unittest.mock import Mock
+
+from regions_recon_lambda.utils.mm_target_cache import MMTargetCache, get_target_params_hash, MM_TARGET_ARTIFACT
+
+
+def test_get_target_params_hash_is_stable():
+    assert get_target_params_hash({"a": 1, "b": {"c": 2}}) == get_target_params_hash({"b": {"c": 2}, "a": 1})
+    assert get_target_params_hash({"a": 1}) != get_target_params_hash({"a": 2})
+
+
+def test_in_memory_cache():
+    cache = MMTargetCache()
+    assert cache.get("arn:group") is None
+
+    cache.put("arn:group", "target", "arn:target", "hash")
+    assert cache.get("arn:group") == {"target_name": "target", "target_arn": "arn:target", "params_hash": "hash"}
+
+    cache.invalidate("arn:group")
+    assert cache.get("arn:group") is None
+
+
+def test_loads_once_from_table():
+    table = Mock()
+    table.query.side_effect = [
+        {"Items": [{"artifact": MM_TARGET_ARTIFACT, "instance": "arn:one", "target_name": "one", "params_hash": "h1"}],
+         "LastEvaluatedKey": {"artifact": MM_TARGET_ARTIFACT, "instance": "arn:one"}},
+        {"Items": [{"artifact": MM_TARGET_ARTIFACT, "instance": "arn:two", "target_name": "two", "target_arn": "arn:t", "params_hash": "h2"}]},
+    ]
+    cache = MMTargetCache()
+    cache.use_table(table)
+
+    assert cache.get("arn:one") == {"target_name": "one", "params_hash": "h1"}
+    assert cache.get("arn:two") == {"target_name": "two", "target_arn": "arn:t", "params_hash": "h2"}
+    assert table.query.call_count == 2
+
+
+def test_put_and_invalidate_persist_to_table():
+    table = Mock()
+    table.query.return_value = {"Items": []}
+    cache = MMTargetCache(table=table)
+
+    cache.put("arn:group", "target", None, "hash")
+    table.put_item.assert_not_called()
+    assert table.meta.client.put_item.call_args[1]["TableName"] == table.name
+    item = table.meta.client.put_item.call_args[1]["Item"]
+    assert item["artifact"] == MM_TARGET_ARTIFACT
+    assert item["instance"] == "arn:group"
+    assert item["params_hash"] == "hash"
+    assert "target_arn" not in item
+
+    cache.invalidate("arn:group")
+    table.meta.client.delete_item.assert_called_once_with(TableName=table.name, Key={"artifact": MM_TARGET_ARTIFACT, "instance": "arn:group"})
+
+
+def test_table_errors_are_not_fatal():
+    table = Mock()
+    table.query.side_effect = Exception("throttled")
+    table.meta.client.put_item.side_effect = Exception("throttled")
+    cache = MMTargetCache(table=table)
+
+    assert cache.get("arn:group") is None
+    cache.put("arn:group", "target", None, "hash")
+    assert cache.get("arn:group")["params_hash"] == "hash"
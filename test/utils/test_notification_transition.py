@@ -0,0 +1,29 @@
+from datetime import date
+
+import pytest
+
+from regions_recon_lambda.utils.notification_transition import get_next_notification_transition, get_plan_transition
+
+
+@pytest.mark.parametrize("plan_date, expected", [
+    ("2020-02-28", "2020-02-14"),  # 25 days left, LEFT_14 starts at 14 days left
+    ("2020-02-17", "2020-02-10"),  # LEFT_14 now, LEFT_7 next
+    ("2020-02-10", "2020-02-10"),  # LEFT_7 now, LEFT_0 on the day
+    ("2020-02-03", "2020-02-04"),  # LEFT_0 now, PAST_1 tomorrow
+    ("2020-02-02", "2020-02-06"),  # PAST_1 now, PAST_4x 4 days after launch
+    ("2020-01-30", "2020-02-07"),  # PAST_4x now, next reminder 8 days after launch
+    ("2020-01-29", "2020-02-06"),
+])
+def test_get_next_notification_transition(plan_date, expected):
+    today = date(2020, 2, 3)
+    assert get_next_notification_transition(plan_date, today) == expected
+
+
+def test_get_plan_transition_skips_plans_which_wont_need_mail():
+    today = date(2020, 2, 3)
+    plan = {"instance": "lol:v0:kek", "status": "PLANNED", "date": "2020-02-17"}
+
+    assert get_plan_transition(plan, today) == "2020-02-10"
+    assert get_plan_transition(dict(plan, status="GA"), today) is None
+    assert get_plan_transition(dict(plan, confidence="Complete"), today) is None
+    assert get_plan_transition(dict(plan, instance="lol:v0"), today) is None
@@ -0,0 +1,27 @@
+from unittest.mock import Mock
+
+from regions_recon_lambda.utils.plan_history import PlanHistoryReader
+
+
+def plan(service_key, version, region_key):
+    return {"artifact": "SERVICE", "instance": "{}:v{}:{}".format(service_key, version, region_key), "version_instance": version}
+
+
+def test_get_versions_reads_exact_keys_once():
+    buildables = Mock()
+    buildables.batch_get_items.return_value = {
+        ("SERVICE", "ec2:v1:IAD"): plan("ec2", 1, "IAD"),
+        ("SERVICE", "ec2:v2:IAD"): plan("ec2", 2, "IAD"),
+    }
+    reader = PlanHistoryReader(buildables, max_workers=2)
+
+    histories = reader.get_versions([("ec2", "IAD", [2, 1]), ("s3", "PDX", [1])])
+
+    assert histories == {("ec2", "IAD"): {1: plan("ec2", 1, "IAD"), 2: plan("ec2", 2, "IAD")}, ("s3", "PDX"): {}}
+    buildables.batch_get_items.assert_called_once_with(
+        [("SERVICE", "ec2:v2:IAD"), ("SERVICE", "ec2:v1:IAD"), ("SERVICE", "s3:v1:PDX")], max_workers=2)
+
+    # found and missing versions are both cached
+    assert reader.get_version("ec2", 1, "IAD") == plan("ec2", 1, "IAD")
+    assert reader.get_version("s3", 1, "PDX") is None
+    assert buildables.batch_get_items.call_count == 1
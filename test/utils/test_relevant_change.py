@@ -0,0 +1,25 @@
+import pytest
+
+from regions_recon_lambda.utils.relevant_change import has_current_relevant_change_stamp, is_relevant_change
+
+
+@pytest.mark.parametrize("current_item, previous_item, expected", [
+    ({"date": "2021-02-01", "status": "BUILD"}, {"date": "2021-01-01", "status": "BUILD"}, True),
+    ({"date": "2021-01-01", "note": "slipped"}, {"date": "2021-01-01"}, True),
+    ({"date": "2021-01-01", "status": "GA"}, {"date": "2021-01-01", "status": "BUILD"}, True),
+    ({"date": "2021-01-01", "status": "BUILD", "plan": "new"}, {"date": "2021-01-01", "status": "BUILD", "plan": "old"}, False),
+    ({"date": "2021-01-01", "status": "GA"}, {"date": "2021-01-01", "status": "GA"}, False),
+    ({"date": "2021-01-01"}, None, False),
+])
+def test_is_relevant_change(current_item, previous_item, expected):
+    assert is_relevant_change(current_item, previous_item) is expected
+
+
+@pytest.mark.parametrize("item, expected", [
+    ({"updated": "2021-01-02", "relevant_change_at": "2021-01-01", "relevant_change_checked_at": "2021-01-02"}, True),
+    ({"updated": "2021-01-03", "relevant_change_at": "2021-01-01", "relevant_change_checked_at": "2021-01-02"}, False),
+    ({"updated": "2021-01-02", "relevant_change_at": "2021-01-01"}, False),
+    ({"updated": "2021-01-02", "relevant_change_checked_at": "2021-01-02"}, False),
+])
+def test_has_current_relevant_change_stamp(item, expected):
+    assert has_current_relevant_change_stamp(item) is expected
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from regions_recon_lambda.utils.stage_timings import StageTimings, percentile
+
+
+@pytest.mark.parametrize("values, percent, expected", [
+    ([], 50, None),
+    ([5], 99, 5),
+    ([1, 2, 3, 4], 50, 2),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 100, 100),
+])
+def test_percentile(values, percent, expected):
+    assert percentile(values, percent) == expected
+
+
+def test_time_records_duration():
+    timings = StageTimings()
+    with timings.time("backfill"):
+        pass
+    with pytest.raises(ValueError):
+        with timings.time("backfill"):
+            raise ValueError()
+    assert len(timings.durations_ms["backfill"]) == 2
+
+
+def test_summary_and_merge():
+    first = StageTimings()
+    second = StageTimings()
+    for duration in (1, 2, 3):
+        first.add("write", duration)
+    second.add("write", 10)
+    second.count("dynamodb_calls", 4)
+    first.merge(second)
+    assert first.summary() == {
+        "write_p50": 2,
+        "write_p99": 10,
+        "write_total": 16,
+        "write_count": 4,
+        "dynamodb_calls": 4,
+    }
+
+
+def test_emit_prints_one_emf_line(capsys):
+    timings = StageTimings()
+    timings.add("parse", 0.5)
+    timings.count("dynamodb_calls", 3)
+    timings.emit(service_name="IngestRipChanges")
+    line, = capsys.readouterr().out.splitlines()
+    document = json.loads(line)
+    assert document["ServiceName"] == "IngestRipChanges"
+    assert document["parse_p99"] == 0.5
+    metric_units = {metric["Name"]: metric["Unit"] for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert metric_units["parse_p50"] == "Milliseconds"
+    assert metric_units["parse_count"] == "Count"
+    assert metric_units["dynamodb_calls"] == "Count"
+
+
+def test_emit_nothing_when_empty(capsys):
+    StageTimings().emit(service_name="IngestRipChanges")
+    assert capsys.readouterr().out == ""
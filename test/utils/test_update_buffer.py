@@ -0,0 +1,87 @@
+from unittest.mock import Mock, patch
+
+from botocore.exceptions import ClientError
+
+from regions_recon_lambda.utils.update_buffer import UpdateBuffer, get_update_params, is_retryable_transact_error
+
+
+def _client_error(code, cancellation_codes=None):
+    response = {"Error": {"Code": code}}
+    if cancellation_codes is not None:
+        response["CancellationReasons"] = [{"Code": cancellation_code} for cancellation_code in cancellation_codes]
+    return ClientError(response, "TransactWriteItems")
+
+
+def _table():
+    table = Mock()
+    table.name = "buildables"
+    return table
+
+
+def test_get_update_params():
+    assert get_update_params({"artifact": "NOTIFICATION", "instance": "lol"}, {"state": "LEFT_14", "retries": 0}) == {
+        "Key": {"artifact": "NOTIFICATION", "instance": "lol"},
+        "UpdateExpression": "set #a0=:a0, #a1=:a1",
+        "ExpressionAttributeNames": {"#a0": "state", "#a1": "retries"},
+        "ExpressionAttributeValues": {":a0": "LEFT_14", ":a1": 0},
+    }
+
+
+def test_is_retryable_transact_error():
+    assert is_retryable_transact_error(_client_error("ThrottlingException"))
+    assert is_retryable_transact_error(_client_error("TransactionCanceledException", ["None", "TransactionConflict"]))
+    assert not is_retryable_transact_error(_client_error("TransactionCanceledException", ["None", "ValidationError"]))
+    assert not is_retryable_transact_error(_client_error("ValidationException"))
+
+
+def test_coalesces_updates_to_the_same_key():
+    table = _table()
+    buffer = UpdateBuffer(table)
+
+    buffer.update({"artifact": "NOTIFICATION", "instance": "lol"}, {"state": "NOT_NOTIFIED", "last_known_launch_date": "2020-02-17"})
+    buffer.update({"artifact": "NOTIFICATION", "instance": "lol"}, {"state": "LEFT_14", "retries": 0})
+    buffer.update({"artifact": "NOTIFICATION", "instance": "kek"}, {"state": "LEFT_7"})
+
+    assert len(buffer) == 2
+    assert buffer.flush() == []
+    assert len(buffer) == 0
+
+    transact_items = table.meta.client.transact_write_items.call_args[1]["TransactItems"]
+    assert [item["Update"]["Key"]["instance"] for item in transact_items] == ["lol", "kek"]
+    assert transact_items[0]["Update"]["TableName"] == "buildables"
+    assert transact_items[0]["Update"]["ExpressionAttributeValues"] == {":a0": "LEFT_14", ":a1": "2020-02-17", ":a2": 0}
+
+
+def test_flushes_in_chunks():
+    table = _table()
+    buffer = UpdateBuffer(table, chunk_size=2)
+    for instance in ("a", "b", "c"):
+        buffer.update({"artifact": "NOTIFICATION", "instance": instance}, {"state": "LEFT_14"})
+
+    buffer.flush()
+
+    assert [len(call[1]["TransactItems"]) for call in table.meta.client.transact_write_items.call_args_list] == [2, 1]
+
+
+@patch("regions_recon_lambda.utils.update_buffer.time.sleep")
+def test_retries_throttled_chunks(mock_sleep):
+    table = _table()
+    table.meta.client.transact_write_items.side_effect = [_client_error("ThrottlingException"), {}]
+    buffer = UpdateBuffer(table)
+    buffer.update({"artifact": "NOTIFICATION", "instance": "lol"}, {"state": "LEFT_14"})
+
+    assert buffer.flush() == []
+    assert table.meta.client.transact_write_items.call_count == 2
+    table.update_item.assert_not_called()
+
+
+def test_falls_back_to_single_writes():
+    table = _table()
+    table.meta.client.transact_write_items.side_effect = _client_error("TransactionCanceledException", ["None", "ValidationError"])
+    table.update_item.side_effect = [{}, Exception("bad item")]
+    buffer = UpdateBuffer(table)
+    buffer.update({"artifact": "NOTIFICATION", "instance": "lol"}, {"state": "LEFT_14"})
+    buffer.update({"artifact": "NOTIFICATION", "instance": "kek"}, {"state": "LEFT_14"})
+
+    assert buffer.flush() == [("NOTIFICATION", "kek")]
+    assert table.update_item.call_count == 2